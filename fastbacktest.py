@@ -0,0 +1,4 @@
+#!/usr/bin/env python
+
+from market_maker import fastbacktest
+fastbacktest.run()
\ No newline at end of file
@@ -1,4 +1,4 @@
 #!/usr/bin/env python
 
 from market_maker import market_maker
-market_maker.findBestParameterForRBreaker()
\ No newline at end of file
+market_maker.findBestParameter()
@@ -0,0 +1,4 @@
+#!/usr/bin/env python
+
+from market_maker import dumpimport
+dumpimport.run()
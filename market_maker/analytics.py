@@ -0,0 +1,152 @@
+"""Comparative analytics of many backtest runs
+
+The equity curves of all runs are one (points x runs) array, a column per run, and the
+parameters one (runs x parameters) array. metrics.performance() computes every figure of every run
+in one pass over that array, so comparing thousands of runs costs a few array operations, not a
+Python loop over runs.
+
+The curves come from a sweep (sweepCurves(), the batch engines fill their columns directly) or
+from result files like grafic2.res (loadRuns()). analyze.py sweeps the SEARCH_SPACE of
+SEARCH_STRATEGY, prints the best runs and a heatmap of one figure over two parameters.
+"""
+from __future__ import absolute_import
+import numpy as np
+from market_maker.settings import settings
+from market_maker.utils.dotdict import dotdict
+from market_maker import sweep, metrics, resultwriter
+
+# the run figures of a sweep that are kept next to the curves, as arrays
+RUN_FIGURES = ("finalUSDBenifit", "totalprofit", "numberPostiveTrade", "numberNegativTrade", "bankrupt")
+
+
+def curveMatrix(curves):
+    """The curves as one (points x runs) array. A shorter curve keeps its last value, an empty one is NaN"""
+    curves = [np.asarray(curve, dtype = float) for curve in curves]
+    length = max([len(curve) for curve in curves] + [0])
+    matrix = np.full((length, len(curves)), np.nan)
+    for k, curve in enumerate(curves):
+        if len(curve):
+            matrix[:len(curve), k] = curve
+            matrix[len(curve):, k] = curve[-1]
+    return matrix
+
+
+def sweepCurves(grid, strategy = None, datafilename = None, startdate = None, enddate = None, workers = None):
+    """Run every parameter set of grid and return the runs with their daily equity as arrays"""
+    startdate = startdate or settings.START_DATE
+    enddate = enddate or settings.END_DATE
+    results = sweep.runJobs([(params, startdate, enddate, True) for params in grid], strategy, datafilename, workers)
+    names = sorted(set(name for params in grid for name in params))
+    runs = dotdict(names = names, params = np.array([[params.get(name, np.nan) for name in names] for params in grid],
+                                                    dtype = float).reshape(len(grid), len(names)),
+                   error = [r.get("error") for r in results], dates = [])
+    for r in results:
+        if len(r.get("dates", [])) > len(runs.dates):
+            runs.dates = r["dates"]
+    # the curves go into the matrix one by one, the results don't keep a second copy
+    runs.equity = curveMatrix([r.pop("equity", ()) for r in results])
+    for name in RUN_FIGURES:
+        runs[name] = np.array([r.get(name, np.nan) for r in results], dtype = float)
+    return runs
+
+
+def loadRuns(filenames, column = "totalUSDbenifit", columns = resultwriter.GRAFIC2_COLUMNS):
+    """The runs of result files (.res or text, see resultwriter.readResults()) with column as their equity"""
+    curves = []
+    bases = []
+    dates = []
+    for filename in filenames:
+        results = resultwriter.readResults(filename, columns)
+        curves.append(results[column])
+        bases.append(results.baseBenifit)
+        if "time" in results and len(results.time) > len(dates):
+            dates = results.time
+    return dotdict(names = [], params = np.zeros((len(filenames), 0)), files = list(filenames), dates = dates,
+                   equity = curveMatrix(curves), base = curveMatrix(bases))
+
+
+def analyze(runs, periodsPerYear = 365, riskFree = None):
+    """Every figure of every run as arrays by name, NaN for the runs without a curve"""
+    riskFree = settings.RISK_FREE_RATE if riskFree is None else riskFree
+    equity = runs.equity
+    failed = np.isnan(equity).all(axis = 0) if len(equity) else np.ones(equity.shape[1], bool)
+    # a failed run is a flat curve for the computation, its figures are NaN afterwards
+    figures = metrics.performance(np.nan_to_num(equity), runs.get("base"), periodsPerYear, riskFree)
+    figures = dotdict((name, np.asarray(values, dtype = float)) for name, values in figures.items())
+    figures.finalUSDBenifit = equity[-1].copy() if len(equity) else np.full(equity.shape[1], np.nan)
+    for name in RUN_FIGURES:
+        if name in runs:
+            figures[name] = runs[name]
+    for values in figures.values():
+        values[failed] = np.nan
+    return figures
+
+
+def rankRuns(figures, key = None):
+    """Indices of the runs, best first by the figure key (SEARCH_RANK_BY by default), the failed ones last"""
+    key = key or settings.SEARCH_RANK_BY
+    values = figures[key] if key in metrics.LOWER_IS_BETTER else -figures[key]
+    return np.argsort(values, kind = "stable")
+
+
+def printSummary(runs, figures, order, top = 20):
+    names = runs.names
+    shown = [k for k in order[:top] if not np.isnan(figures.finalUSDBenifit[k])]
+    if not shown:
+        print("no successful run")
+        return
+    print("rank " + " ".join("%12s" % name for name in names) + "   benifit% drawdown  sharpe sortino  calmar")
+    for i, k in enumerate(shown):
+        print("%4d " % (i + 1) + " ".join("%12.4g" % value for value in runs.params[k]) +
+              " %10.2f %7.1f%% %7.2f %7.2f %7.2f" % (figures.finalUSDBenifit[k], figures.maxDrawdown[k] * 100,
+                                                     figures.sharpe[k], figures.sortino[k], figures.calmar[k]))
+    failed = int(np.count_nonzero(np.isnan(figures.finalUSDBenifit)))
+    print("%d runs, %d failed" % (len(order), failed))
+
+
+def heatmap(runs, values, xName, yName, lowerIsBetter = False):
+    """(xs, ys, grid) of values over the parameters xName and yName.
+
+    grid[i, j] is the best value of the runs with yName = ys[i] and xName = xs[j], whatever their
+    other parameters: the largest, or with lowerIsBetter the smallest; NaN where there is no successful run.
+    """
+    x = runs.params[:, runs.names.index(xName)]
+    y = runs.params[:, runs.names.index(yName)]
+    xs, xIndex = np.unique(x, return_inverse = True)
+    ys, yIndex = np.unique(y, return_inverse = True)
+    worst = np.inf if lowerIsBetter else -np.inf
+    grid = np.full((len(ys), len(xs)), worst)
+    # fmax and fmin skip the NaN of the failed runs
+    (np.fmin if lowerIsBetter else np.fmax).at(grid, (yIndex.ravel(), xIndex.ravel()), values)
+    grid[grid == worst] = np.nan
+    return xs, ys, grid
+
+
+def printHeatmap(xs, ys, grid, xName, yName, title = ""):
+    print("%s, %s down, %s across" % (title, yName, xName))
+    print("%10s " % "" + " ".join("%9.4g" % x for x in xs))
+    for y, row in zip(ys, grid):
+        print("%10.4g " % y + " ".join("%9s" % ("" if np.isnan(value) else "%.3g" % value) for value in row))
+
+
+def drawHeatmap(xs, ys, grid, xName, yName, title = ""):
+    import plotly
+    from plotly.graph_objs import Heatmap, Layout
+    data = [Heatmap(x = xs.tolist(), y = ys.tolist(), z = grid.tolist())]
+    plotly.offline.plot({"data": data, "layout": Layout(title = title, xaxis = dict(title = xName),
+                                                         yaxis = dict(title = yName))}, filename = "heatmap.html")
+
+
+def run():
+    strategy = settings.SEARCH_STRATEGY
+    runs = sweepCurves(sweep.spaceGrid(settings.SEARCH_SPACE[strategy]), strategy)
+    figures = analyze(runs)
+    key = settings.ANALYTICS_FIGURE or settings.SEARCH_RANK_BY
+    printSummary(runs, figures, rankRuns(figures, key))
+    axes = settings.ANALYTICS_AXES or runs.names[:2]
+    if len(axes) < 2:
+        return
+    xs, ys, grid = heatmap(runs, figures[key], axes[0], axes[1], key in metrics.LOWER_IS_BETTER)
+    printHeatmap(xs, ys, grid, axes[0], axes[1], "best " + key)
+    if settings.ANALYTICS_PLOT:
+        drawHeatmap(xs, ys, grid, axes[0], axes[1], "best " + key)
@@ -10,7 +10,6 @@ import logging
 from market_maker.auth import AccessTokenAuth, APIKeyAuthWithExpires
 from market_maker.utils import constants, errors
 from market_maker.ws.ws_thread import BitMEXWebsocket
-import symbol
 
 
 # https://www.bitmex.com/api/explorer/
@@ -67,7 +66,7 @@ class BitMEX(object):
         """Get an instrument's details."""
         return self.ws.get_instrument(symbol)
 
-    def quoteBucketed(self, symbol, binSize, startdate, reverse = 'false'):
+    def quoteBucketed(self, symbol, binSize, startdate, reverse = 'false', count = None):
         endpoint = "quote/bucketed"
         # Generate a unique clOrdID with our prefix so we can identify it.
         if binSize == 5:
@@ -81,10 +80,10 @@ class BitMEX(object):
             countnumber = 1
             
         postdict = {
-            'symbol': self.symbol,
+            'symbol': symbol,
             'binSize': postdict_binSize,
             'reverse': reverse,
-            'count': countnumber,
+            'count': count or countnumber,
             'startTime':startdate
         }
         return self._curl_bitmex(api=endpoint, postdict=postdict, verb="GET")
@@ -122,7 +121,7 @@ class BitMEX(object):
         }
         return self._curl_bitmex(api=endpoint, postdict=postdict, verb="GET")
     
-    def tradeBucketed(self, symbol, binSize, startdate):
+    def tradeBucketed(self, symbol, binSize, startdate, count = None):
         endpoint = "trade/bucketed"
         # Generate a unique clOrdID with our prefix so we can identify it.
         if binSize == 5:
@@ -136,10 +135,10 @@ class BitMEX(object):
             countnumber = 1
             
         postdict = {
-            'symbol': self.symbol,
+            'symbol': symbol,
             'binSize': postdict_binSize,
             #'reverse': reverse,
-            'count': countnumber,
+            'count': count or countnumber,
             'startTime':startdate
         }
         return self._curl_bitmex(api=endpoint, postdict=postdict, verb="GET")
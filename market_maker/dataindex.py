@@ -0,0 +1,149 @@
+"""Date -> byte offset sidecar index of the backtest data
+
+The index sits next to the data file ("backtestingdata.csv" -> "backtestingdata.idx") and holds
+one line per day with the byte offset of the day's first line and its number of lines:
+
+    # 3252480 1508659200.5 ascending
+    2017-08-01 0 288
+    2017-08-02 16416 288
+
+The header is the size and the modification time of the data file when the index was written, so
+an index that no longer matches its data file is ignored, and whether its lines are in ascending
+time order with every timestamp once ("unsorted" otherwise, see datasort.py). Blank lines are not counted, readers skip them.
+"""
+from __future__ import absolute_import
+import os
+from market_maker.settings import settings
+
+
+def indexPath(datafilename):
+    return os.path.splitext(datafilename)[0] + ".idx"
+
+
+class IndexWriter:
+    """Collects the index while a data file is written or scanned, one addLine() per line"""
+    def __init__(self, datafilename):
+        self.datafilename = datafilename
+        self.entries = [] # [date, offset, count]
+        self.offset = 0
+        self.seen = set()
+        self.grouped = True
+        self.ascending = True
+        self.last = ""
+
+    def addLine(self, line, size = None):
+        date = line[:10]
+        if line[:19] <= self.last:
+            self.ascending = False
+        self.last = line[:19]
+        if not self.entries or self.entries[-1][0] != date:
+            if date in self.seen:
+                self.grouped = False
+            self.seen.add(date)
+            self.entries.append([date, self.offset, 0])
+        self.entries[-1][2] += 1
+        self.offset += len(line) if size is None else size
+
+    def save(self):
+        indexfile = open(indexPath(self.datafilename), "w")
+        indexfile.write("# %d %r %s\n" % (self.offset, os.path.getmtime(self.datafilename),
+                                          "ascending" if self.ascending else "unsorted"))
+        for date, offset, count in self.entries:
+            indexfile.write("%s %d %d\n" % (date, offset, count))
+        indexfile.close()
+
+
+def buildIndex(datafilename):
+    """Scan a data file and write its index, returns the IndexWriter"""
+    writer = IndexWriter(datafilename)
+    datafile = open(datafilename, "rb")
+    for line in datafile:
+        if line.strip():
+            writer.addLine(line.decode(), len(line))
+        else:
+            writer.offset += len(line)
+    datafile.close()
+    writer.save()
+    return writer
+
+
+def openIndex(datafilename):
+    """IndexWriter holding the days of a data file so far, to go on with the lines appended to it"""
+    if not isUpToDate(datafilename):
+        return buildIndex(datafilename)
+    writer = IndexWriter(datafilename)
+    indexfile = open(indexPath(datafilename), "r")
+    writer.offset, mtime, writer.ascending = _readHeader(indexfile)
+    for line in indexfile:
+        date, offset, count = line.split()
+        if date in writer.seen:
+            writer.grouped = False
+        writer.seen.add(date)
+        writer.entries.append([date, int(offset), int(count)])
+    indexfile.close()
+    if writer.entries:
+        # the time of the last line is not in the index, its date is all addLine() compares to
+        writer.last = writer.entries[-1][0]
+    return writer
+
+
+def _readHeader(indexfile):
+    """(size, modification time of the data file, whether it is ascending), a size of -1 for an index
+    of an older format"""
+    header = indexfile.readline().split()
+    if len(header) != 4:
+        return -1, 0.0, False
+    return int(header[1]), float(header[2]), header[3] == "ascending"
+
+
+def _matches(header, datafilename):
+    size, mtime, ascending = header
+    return size == os.path.getsize(datafilename) and mtime == os.path.getmtime(datafilename)
+
+
+def isUpToDate(datafilename):
+    indexfilename = indexPath(datafilename)
+    if not os.path.isfile(indexfilename):
+        return False
+    indexfile = open(indexfilename, "r")
+    header = _readHeader(indexfile)
+    indexfile.close()
+    return _matches(header, datafilename)
+
+
+def isAscending(datafilename):
+    """Whether the lines of a data file with an up to date index are in ascending time order, every timestamp once"""
+    indexfile = open(indexPath(datafilename), "r")
+    size, mtime, ascending = _readHeader(indexfile)
+    indexfile.close()
+    return ascending
+
+
+def loadIndex(datafilename):
+    """{date: (offset, count)} of a data file, or None if there is no usable index.
+
+    An index is unusable if it is stale or if a day is split over several places in the file.
+    """
+    indexfilename = indexPath(datafilename)
+    if not os.path.isfile(indexfilename):
+        return None
+    indexfile = open(indexfilename, "r")
+    if not _matches(_readHeader(indexfile), datafilename):
+        indexfile.close()
+        return None
+    index = {}
+    for line in indexfile:
+        date, offset, count = line.split()
+        if date in index:
+            indexfile.close()
+            return None
+        index[date] = (int(offset), int(count))
+    indexfile.close()
+    return index
+
+
+def run():
+    writer = buildIndex(settings.BACKTESTFILE)
+    print("%d days indexed in %s" % (len(writer.entries), indexPath(settings.BACKTESTFILE)))
+    if not writer.grouped:
+        print("warning: days are split over several places in the file, the backtest can't seek with this index")
@@ -0,0 +1,198 @@
+"""Time order of the backtest data files
+
+The backtest reads the ticks of a data file in time order. Files written by run_loop_back() are
+newest first, and files pieced together from several recordings can be in any order. lineOrder()
+tells ascending, descending and unsorted files apart in one pass, sortedLines() gives the lines of
+any of them in ascending order with bounded memory:
+
+    descending - the file is read backwards in blocks
+    unsorted   - external merge sort: runs of SORT_CHUNK_LINES lines are sorted in memory and
+                 written to temporary files next to the data file, then merged with heapq.merge
+
+Lines with the same timestamp are one bucket that was recorded more than once (backtestingdata2017.csv
+has 40 of some); sortedLines() keeps the last of them in the file, the recording that came last.
+The tick store converts through sortedLines(), the text loader reads the sorted copy normalizedFile()
+writes once.
+"""
+from __future__ import absolute_import
+import os
+import heapq
+import itertools
+import tempfile
+from market_maker.settings import settings
+from market_maker import dataindex
+
+ASCENDING = "ascending"
+DESCENDING = "descending"
+UNSORTED = "unsorted"
+
+BLOCK_SIZE = 1 << 20
+
+
+def _key(line):
+    # "2017-08-01T00:00:00", the time the backtest sees
+    return line[:19]
+
+
+def lineOrder(datafilename):
+    """(order, number of lines) of a data file, order by the timestamps of its lines"""
+    ascending = descending = True
+    previous = None
+    rows = 0
+    with open(datafilename, "r") as datafile:
+        for line in datafile:
+            if not line.strip():
+                continue
+            rows += 1
+            key = _key(line)
+            if previous is not None:
+                if key < previous:
+                    ascending = False
+                elif key > previous:
+                    descending = False
+            previous = key
+    return (ASCENDING if ascending else DESCENDING if descending else UNSORTED), rows
+
+
+def _lines(datafile):
+    for line in datafile:
+        if line.strip():
+            yield line if line.endswith("\n") else line + "\n"
+
+
+def reversedLines(datafilename, blockSize = BLOCK_SIZE):
+    """The lines of a file from the last to the first, reading it backwards in blocks"""
+    with open(datafilename, "rb") as datafile:
+        position = datafile.seek(0, os.SEEK_END)
+        rest = b""
+        while position > 0:
+            size = min(blockSize, position)
+            position -= size
+            datafile.seek(position)
+            lines = (datafile.read(size) + rest).split(b"\n")
+            # the first line of the block may start in the block before
+            rest = lines[0]
+            for line in reversed(lines[1:]):
+                if line.strip():
+                    yield line.rstrip(b"\r").decode() + "\n"
+        if rest.strip():
+            yield rest.rstrip(b"\r").decode() + "\n"
+
+
+def _chunks(lines, size):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def mergeSortedLines(datafilename, chunkLines = None):
+    """The lines of a file in time order by an external merge sort"""
+    chunkLines = chunkLines or settings.SORT_CHUNK_LINES
+    with open(datafilename, "r") as datafile:
+        chunks = _chunks(_lines(datafile), chunkLines)
+        first = next(chunks, [])
+        second = next(chunks, None)
+        if second is None:
+            # it fits into one run, no temporary files
+            for line in sorted(first, key = _key):
+                yield line
+            return
+        # the runs go next to the data, the temporary directory may be too small for them
+        with tempfile.TemporaryDirectory(dir = os.path.dirname(os.path.abspath(datafilename))) as directory:
+            runs = [_writeRun(directory, number, chunk) for number, chunk in enumerate(itertools.chain([first, second], chunks))]
+            runFiles = [open(run, "r") for run in runs]
+            try:
+                for line in heapq.merge(*runFiles, key = _key):
+                    yield line
+            finally:
+                for runFile in runFiles:
+                    runFile.close()
+
+
+def _writeRun(directory, number, chunk):
+    chunk.sort(key = _key)
+    run = os.path.join(directory, "run%d" % number)
+    with open(run, "w", newline = "\n") as runFile:
+        runFile.write("".join(chunk))
+    return run
+
+
+def _tiesInFileOrder(lines):
+    """reversedLines() with the lines of every timestamp back in the order of the file"""
+    tie = []
+    for line in lines:
+        if tie and _key(line) != _key(tie[0]):
+            for kept in reversed(tie):
+                yield kept
+            tie = []
+        tie.append(line)
+    for kept in reversed(tie):
+        yield kept
+
+
+def lastOfEveryTimestamp(lines):
+    """The last line of every timestamp of lines in time order"""
+    previous = None
+    for line in lines:
+        if previous is not None and _key(line) != _key(previous):
+            yield previous
+        previous = line
+    if previous is not None:
+        yield previous
+
+
+def sortedLines(datafilename, order = None):
+    """The lines of a data file in ascending time order and every timestamp once, the last line of it
+    in the file. order is its lineOrder() if known"""
+    order = order or lineOrder(datafilename)[0]
+    if order == DESCENDING:
+        # sorting and merging keep the lines of a timestamp in file order, reading backwards doesn't
+        lines = _tiesInFileOrder(reversedLines(datafilename))
+    elif order == UNSORTED:
+        lines = mergeSortedLines(datafilename)
+    else:
+        lines = _ascendingLines(datafilename)
+    return lastOfEveryTimestamp(lines)
+
+
+def _ascendingLines(datafilename):
+    with open(datafilename, "r") as datafile:
+        for line in _lines(datafile):
+            yield line
+
+
+def sortedPath(datafilename):
+    base, extension = os.path.splitext(datafilename)
+    return base + ".sorted" + extension
+
+
+def normalize(datafilename, target = None, order = None):
+    """Write the lines of a data file in time order to target with its index, returns target"""
+    target = target or sortedPath(datafilename)
+    index = dataindex.IndexWriter(target)
+    with open(target + ".tmp", "w", newline = "\n") as targetfile:
+        for chunk in _chunks(sortedLines(datafilename, order), 100000):
+            targetfile.write("".join(chunk))
+            for line in chunk:
+                index.addLine(line)
+    os.replace(target + ".tmp", target)
+    index.save()
+    return target
+
+
+def normalizedFile(datafilename):
+    """The data file if it is in time order with every timestamp once, else its sorted copy, written if
+    it is older than the data"""
+    if not dataindex.isUpToDate(datafilename):
+        dataindex.buildIndex(datafilename)
+    if dataindex.isAscending(datafilename):
+        return datafilename
+    target = sortedPath(datafilename)
+    if not (os.path.isfile(target) and os.path.getmtime(target) >= os.path.getmtime(datafilename)):
+        normalize(datafilename, target)
+    return target
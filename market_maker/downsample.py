@@ -0,0 +1,51 @@
+"""Downsampling of long series for the charts
+
+A year of grafic2 records is far more points than a chart can show. lttb() picks the points of a
+series with Largest-Triangle-Three-Buckets: the first and the last point stay, the rest is cut
+into equal buckets and from every bucket the point that spans the largest triangle with the point
+picked before and the mean of the next bucket is kept. Peaks and troughs survive, flat stretches
+don't cost points. downsample() adds the highest and the lowest point and the ranges shown in
+full, and takes them out of the budget.
+"""
+from __future__ import absolute_import
+import numpy as np
+
+
+def lttb(y, budget, x = None):
+    """Indices of at most budget points of the series y (over x, the index by default), ascending"""
+    y = np.asarray(y, dtype = float)
+    n = len(y)
+    if budget >= n:
+        return np.arange(n)
+    if budget < 3:
+        # no bucket between the first and the last point
+        return np.array([0, n - 1][:max(budget, 0)], np.int64)
+    x = np.arange(n, dtype = float) if x is None else np.asarray(x, dtype = float)
+    # bucket k holds the points edges[k] .. edges[k + 1], without the first and the last point
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    picked = np.zeros(budget, np.int64)
+    a = 0
+    for k in range(budget - 2):
+        start, end = edges[k], max(edges[k + 1], edges[k] + 1)
+        nextStart, nextEnd = edges[k + 1], edges[k + 2] if k + 2 < len(edges) else n
+        if nextEnd <= nextStart:
+            nextEnd = min(nextStart + 1, n)
+        meanX = x[nextStart:nextEnd].mean()
+        meanY = y[nextStart:nextEnd].mean()
+        # twice the triangle area of point a, every point of the bucket and the mean of the next one
+        areas = np.abs((x[a] - meanX) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (meanY - y[a]))
+        a = start + int(np.argmax(areas))
+        picked[k + 1] = a
+    picked[-1] = n - 1
+    return np.unique(picked)
+
+
+def downsample(y, budget, keep = None, x = None):
+    """Indices of at most budget points of y: the highest and the lowest point, every point where
+    the mask keep is set (the ranges shown in full) and lttb() of y with the rest of the budget.
+    Where those of keep alone take the budget, only they and the extremes are left"""
+    y = np.asarray(y, dtype = float)
+    if budget >= len(y):
+        return np.arange(len(y))
+    extra = np.union1d([np.argmax(y), np.argmin(y)], np.nonzero(keep)[0] if keep is not None else [])
+    return np.union1d(lttb(y, budget - len(extra), x), extra).astype(np.int64)
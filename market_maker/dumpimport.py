@@ -0,0 +1,231 @@
+"""Importer of the public BitMEX data dumps
+
+BitMEX publishes the trades and the quotes of every day as gzipped CSV files (trade/20170801.csv.gz
+and quote/20170801.csv.gz on public.bitmex.com):
+
+    timestamp,symbol,side,size,price,tickDirection,trdMatchID,grossValue,homeNotional,foreignNotional
+    2017-08-01D00:00:01.227421000,XBTUSD,Buy,500,2854.7,PlusTick,...
+
+    timestamp,symbol,bidSize,bidPrice,askPrice,askSize
+    2017-08-01D00:00:00.473617000,XBTUSD,28547,2854.7,2859,28448
+
+importDumps() streams such files IMPORT_CHUNK_ROWS rows at a time, so the memory it needs does not
+grow with the dumps. The trades give the close of every day; the quotes become bars of every
+period of IMPORT_PERIODS, in the lines of the recorder:
+
+    2017-08-01T00:05:00.000Z 28547 2854.7 2859 28448 2854.7
+
+A bar holds the last quote up to and including its time, like quoteBucketed(), and the close of
+the day before its day, like tradeBucketed(symbol, 1440, day)[0]. A bar without a quote repeats
+the one before it, for gaps shorter than a day. The bars of the days before the first close are
+left out, they have no close of a day before them. Along the way every trade and every quote goes to
+columnar .res files (see resultwriter.py), readResults() reads them back.
+"""
+from __future__ import absolute_import
+import os
+import csv
+import glob
+import gzip
+import itertools
+import numpy as np
+from market_maker.settings import settings
+from market_maker import dataindex, resultwriter
+
+MICROSECONDS_PER_MINUTE = 60 * 10 ** 6
+MICROSECONDS_PER_DAY = 1440 * MICROSECONDS_PER_MINUTE
+
+# times in microseconds since the epoch, the size of a trade is negative for a sell
+TRADE_COLUMNS = [("time", "<i8", "%d"), ("size", "<i8", "%d"), ("price", "<f8", "%.10g")]
+QUOTE_COLUMNS = [("time", "<i8", "%d"), ("bidSize", "<i8", "%d"), ("bidPrice", "<f8", "%.10g"),
+                 ("askPrice", "<f8", "%.10g"), ("askSize", "<i8", "%d")]
+
+BIN_SIZES = {1: "1m", 5: "5m", 60: "1h", 1440: "1d"}
+
+
+def barFile(directory, symbol, period):
+    """File of the bars of period minutes of symbol, e.g. import/XBTUSD-5m.csv"""
+    return os.path.join(directory, "%s-%s.csv" % (symbol, BIN_SIZES.get(period, "%dm" % period)))
+
+
+def readDump(filename, chunkRows = None):
+    """The rows of a dump, gzipped or not, as {column name: values}, chunkRows rows at a time"""
+    chunkRows = chunkRows or settings.IMPORT_CHUNK_ROWS
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rt", newline = "") as dumpfile:
+        reader = csv.reader(dumpfile)
+        names = next(reader, None)
+        if names is None:
+            return
+        while True:
+            rows = list(itertools.islice(reader, chunkRows))
+            if not rows:
+                return
+            yield dict(zip(names, zip(*rows)))
+
+
+def _times(stamps):
+    """Microseconds since the epoch of dump timestamps like 2017-08-01D00:00:01.227421000"""
+    return np.array([stamp[:26].replace("D", "T") for stamp in stamps], dtype = "datetime64[us]").astype(np.int64)
+
+
+def _numbers(values, dtype, missing):
+    # an empty field is a side of the book without an order
+    return np.array([value or missing for value in values]).astype(dtype)
+
+
+def _stamp(time):
+    return str(np.datetime64(time // 1000, "ms")) + "Z"
+
+
+def _price(price):
+    return "None" if price != price else repr(float(price))
+
+
+class DayCloses:
+    """Close of every day, the last trade price up to and including midnight"""
+    def __init__(self):
+        self.closes = {}
+        self.sorted = None
+
+    def add(self, time, price):
+        """Add trades in time order, arrays"""
+        priced = price == price
+        time, price = time[priced], price[priced]
+        ends = -(-time // MICROSECONDS_PER_DAY) * MICROSECONDS_PER_DAY
+        last = np.flatnonzero(np.r_[ends[1:] != ends[:-1], True])
+        self.closes.update(zip(ends[last].tolist(), price[last].tolist()))
+        self.sorted = None
+
+    def before(self, time):
+        """Close of the day before the day of time; the last one known before it if that day had
+        no trade, None if there is none before"""
+        if self.sorted is None:
+            ends = sorted(self.closes)
+            self.sorted = (np.array(ends), [self.closes[end] for end in ends])
+        ends, closes = self.sorted
+        k = int(np.searchsorted(ends, time // MICROSECONDS_PER_DAY * MICROSECONDS_PER_DAY, side = "right"))
+        return closes[k - 1] if k else None
+
+
+class BarWriter:
+    """Bars of period minutes of one symbol, written to a data file as the quotes come in"""
+    def __init__(self, filename, period, closes):
+        self.filename = filename
+        self.period = period * MICROSECONDS_PER_MINUTE
+        self.closes = closes
+        self.file = open(filename, "w", newline = "\n")
+        self.index = dataindex.IndexWriter(filename)
+        self.end = None # time of the bar that is still open
+        self.quote = None # its last quote, (bidSize, bidPrice, askPrice, askSize)
+        self.bars = 0
+
+    def _line(self, end):
+        """The line of the bar at end, None if its day has no close before it"""
+        close = self.closes.before(end)
+        if close is None:
+            return None
+        bidSize, bidPrice, askPrice, askSize = self.quote
+        return "%s %d %s %s %d %s\n" % (_stamp(end), bidSize, _price(bidPrice), _price(askPrice), askSize,
+                                        _price(close))
+
+    def _closeBar(self, nextEnd):
+        """The lines of the open bar and of the empty ones up to nextEnd"""
+        lines = [self._line(self.end)]
+        if nextEnd - self.end <= MICROSECONDS_PER_DAY:
+            lines.extend(self._line(end) for end in range(self.end + self.period, nextEnd, self.period))
+        return lines
+
+    def add(self, time, bidSize, bidPrice, askPrice, askSize):
+        """Add quotes in time order, arrays"""
+        if not len(time):
+            return
+        ends = -(-time // self.period) * self.period
+        if self.end is not None and ends[0] < self.end:
+            raise ValueError("the quotes of %s are not in time order at %s" % (self.filename, _stamp(int(time[0]))))
+        lines = []
+        # only the last quote of a bar counts
+        for k in np.flatnonzero(np.r_[ends[1:] != ends[:-1], True]).tolist():
+            end = int(ends[k])
+            if self.end is not None and end != self.end:
+                lines.extend(self._closeBar(end))
+            self.end = end
+            self.quote = (int(bidSize[k]), float(bidPrice[k]), float(askPrice[k]), int(askSize[k]))
+        self._write(lines)
+
+    def _write(self, lines):
+        lines = [line for line in lines if line is not None]
+        self.file.write("".join(lines))
+        for line in lines:
+            self.index.addLine(line)
+        self.bars += len(lines)
+
+    def close(self):
+        if self.end is not None:
+            self._write([self._line(self.end)])
+        self.file.close()
+        self.index.save()
+
+
+def importDumps(tradeFiles, quoteFiles, symbols = None, periods = None, directory = None):
+    """Import the dumps of every symbol, returns {symbol: {period: number of bars}}.
+
+    Both lists of files are read in the order of their names, the dates of the dumps.
+    """
+    symbols = symbols or settings.RECORD_SYMBOLS or [settings.SYMBOL]
+    periods = periods or settings.IMPORT_PERIODS
+    directory = directory or settings.IMPORT_DIRECTORY
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    closes = dict((symbol, DayCloses()) for symbol in symbols)
+    trades = dict((symbol, resultwriter.ResultWriter(os.path.join(directory, symbol + "-trades.res"), TRADE_COLUMNS,
+                                                     enabled = True)) for symbol in symbols)
+    for filename in sorted(tradeFiles):
+        for rows in readDump(filename):
+            symbolOf = np.array(rows["symbol"])
+            for symbol in symbols:
+                rowsOf = np.flatnonzero(symbolOf == symbol)
+                if not len(rowsOf):
+                    continue
+                time = _times([rows["timestamp"][k] for k in rowsOf])
+                size = _numbers([rows["size"][k] for k in rowsOf], np.int64, "0")
+                size[np.array([rows["side"][k] for k in rowsOf]) == "Sell"] *= -1
+                price = _numbers([rows["price"][k] for k in rowsOf], np.float64, "nan")
+                closes[symbol].add(time, price)
+                trades[symbol].extend(time, size, price)
+    for writer in trades.values():
+        writer.close()
+
+    quotes = dict((symbol, resultwriter.ResultWriter(os.path.join(directory, symbol + "-quotes.res"), QUOTE_COLUMNS,
+                                                     enabled = True)) for symbol in symbols)
+    bars = dict((symbol, [BarWriter(barFile(directory, symbol, period), period, closes[symbol]) for period in periods])
+                for symbol in symbols)
+    for filename in sorted(quoteFiles):
+        for rows in readDump(filename):
+            symbolOf = np.array(rows["symbol"])
+            for symbol in symbols:
+                rowsOf = np.flatnonzero(symbolOf == symbol)
+                if not len(rowsOf):
+                    continue
+                columns = [_times([rows["timestamp"][k] for k in rowsOf])]
+                for name, dtype, missing in [("bidSize", np.int64, "0"), ("bidPrice", np.float64, "nan"),
+                                             ("askPrice", np.float64, "nan"), ("askSize", np.int64, "0")]:
+                    columns.append(_numbers([rows[name][k] for k in rowsOf], dtype, missing))
+                quotes[symbol].extend(*columns)
+                for writer in bars[symbol]:
+                    writer.add(*columns)
+    result = {}
+    for symbol in symbols:
+        quotes[symbol].close()
+        for writer in bars[symbol]:
+            writer.close()
+        result[symbol] = dict((period, writer.bars) for period, writer in zip(periods, bars[symbol]))
+    return result
+
+
+def run():
+    tradeFiles = glob.glob(settings.IMPORT_TRADE_FILES)
+    quoteFiles = glob.glob(settings.IMPORT_QUOTE_FILES)
+    print("importing %d trade and %d quote dumps" % (len(tradeFiles), len(quoteFiles)))
+    for symbol, counts in importDumps(tradeFiles, quoteFiles).items():
+        print("%s: %s" % (symbol, ", ".join("%d bars of %s" % (count, BIN_SIZES.get(period, "%dm" % period))
+                                            for period, count in sorted(counts.items()))))
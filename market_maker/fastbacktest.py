@@ -0,0 +1,1289 @@
+"""Array based backtest engines
+
+These engines give the same results as OrderManager.run_backtesting() for a strategy, but work
+on the numpy columns of a tickstore.TickStore instead of calling a handler for every tick.
+Everything that doesn't depend on the position (price filters, moving average, daily high/low,
+ATR) is computed as whole arrays up front; only the position bookkeeping runs as a tight loop.
+The moving average, ATR and Donchian channel come from the classes of indicators.py, fed the
+same values as the handlers feed them, so both give the same numbers to the last bit.
+
+Parameters default to settings and can be overridden per run with a dict, so the parameter
+sweeps can run many backtests in one process without touching settings.
+"""
+from __future__ import absolute_import
+import numpy as np
+from market_maker.settings import settings
+from market_maker.utils.dotdict import dotdict
+from market_maker import tickstore
+from market_maker import indicators
+from market_maker import resultwriter
+try:
+    # optional, compiles the Turtle kernel
+    from numba import njit
+except ImportError:
+    njit = None
+
+SECONDS_PER_DAY = 86400
+STEP_BLOCK = 4096 # ticks checked at once by the price step filter
+QUIET_TICKS = 2 # ticks without a trade before the rest of the day is searched as an array
+
+
+# every setting an engine reads through getParams(); its runs depend on nothing else (see resultcache.runKey())
+ENGINE_SETTINGS = {
+    "MovingAverage": ("START_BTCOIN", "ATRN", "ATR_WILDER", "DonchianN", "ADDTIME", "ZHIYINGUSD", "AVERAGENUMPERIORD",
+                      "AVERGAGEDAY", "RESONABLE_PRICE_GAP", "RESONABLE_PRICE_STEP", "STOP_DRAWDOWN"),
+    "R_Breaker": ("START_BTCOIN", "POSITION_SIZE", "ZHISHUN_PROZENT", "R_BREAKER_F1", "R_BREAKER_F2", "R_BREAKER_F3",
+                  "RESONABLE_PRICE_GAP", "STOP_DRAWDOWN"),
+    "Turtle": ("START_BTCOIN", "ATRN", "ATR_WILDER", "DonchianN", "ADDTIME", "ZHIYINGUSD", "RESONABLE_PRICE_GAP",
+               "RESONABLE_PRICE_STEP", "STOP_DRAWDOWN"),
+}
+
+
+def getParams(params = None):
+    """settings, overridden by the entries of params"""
+    p = dotdict(settings)
+    if params:
+        p.update(params)
+    return p
+
+
+def loadTicks(store, startdate, enddate, copy = True):
+    """Columns of the ticks in [startdate, enddate) of a TickStore, as the handlers see them.
+
+    With copy=False the columns stay read-only views of the memmap, so processes that open the same
+    store share its pages instead of holding their own copy.
+    """
+    first, last = store.window(startdate, enddate)
+    column = np.array if copy else (lambda array: array)
+    ticks = dotdict()
+    ticks.startdate = startdate
+    # row of the first tick in the whole store
+    ticks.first = store.firstRow + first
+    ticks.timestamp = column(store.timestamp[first:last])
+    ticks.bidPrice = column(store.bidPrice[first:last])
+    ticks.askPrice = column(store.askPrice[first:last])
+    ticks.bidSize = column(store.bidSize[first:last])
+    ticks.askSize = column(store.askSize[first:last])
+    ticks.closePrice = column(store.closePrice[first:last])
+    ticks.hasNone = (np.array(store.noneMask[first:last]) & tickstore.NONE_QUOTE) != 0
+    return ticks
+
+
+def dayStarts(ticks):
+    """Index of the first tick of every day, and whether that tick starts a new day for is_newDay()"""
+    days = ticks.timestamp // SECONDS_PER_DAY
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(days)) + 1)) if len(days) else np.zeros(0, np.int64)
+    newDay = np.ones(len(starts), bool)
+    if len(starts):
+        # the backtest starts with prevDayBacktest = START_DATE
+        newDay[0] = tickstore.dateToEpoch(ticks.startdate) // SECONDS_PER_DAY != days[0]
+    return starts, newDay
+
+
+def newResult():
+    """Final state and daily records of a run.
+
+    The daily lists are the columns of grafic.txt, the dates and the equity: the USD benifit in
+    percent, marked to the last price of the day.
+    """
+    return dotdict(totalprofit = 0.0, finalUSDBenifit = 0.0, numberPostiveTrade = 0, numberNegativTrade = 0,
+                   dynamic_position = 0, bankrupt = False, pruned = False, dates = [], totalUSDbenifit = [], position = [],
+                   movingAveragePrice = [], baseBenifit = [], prevClosePrice = [], equity = [])
+
+
+class DrawdownStop:
+    """Tells a run to stop once its daily equity falls more than limit (a fraction, STOP_DRAWDOWN) below
+    its peak, like metrics.maxDrawdown() of the daily equity. A limit of None never stops"""
+    def __init__(self, limit):
+        self.limit = limit
+        self.peak = None
+
+    def passed(self, equity):
+        if self.limit is None:
+            return False
+        wealth = max(1 + equity / 100, 0.0)
+        self.peak = wealth if self.peak is None else max(self.peak, wealth)
+        if self.peak <= 0:
+            return 1 > self.limit
+        return (self.peak - wealth) / self.peak > self.limit
+
+
+def filterPrices(ticks, p, valid = None):
+    """Mid prices of the ticks and the indices of the ticks a handler accepts.
+
+    Like the handlers, a tick is skipped if it isn't valid (by default: if it has a None field), if
+    bid and ask are more than RESONABLE_PRICE_GAP apart or if its mid price jumps more than
+    RESONABLE_PRICE_STEP away from the price before the current one. Note the handlers swap bid and ask.
+    """
+    lastAskPrice = ticks.bidPrice
+    lastBidPrice = ticks.askPrice
+    mid = (lastAskPrice + lastBidPrice) / 2
+    if valid is None:
+        valid = ~ticks.hasNone
+    candidates = np.flatnonzero(valid & ~(np.abs(lastAskPrice - lastBidPrice) > p.RESONABLE_PRICE_GAP))
+    if not len(candidates):
+        return mid, candidates
+    price = mid[candidates]
+    step = p.RESONABLE_PRICE_STEP
+    accepted = np.ones(len(price), bool)
+    preCurrentPrice = currentPrice = price[0]
+    k = 0
+    while k < len(price):
+        # while every tick is accepted a price is compared with the one two ticks before it
+        block = price[k:k + STEP_BLOCK]
+        reference = np.concatenate(([preCurrentPrice, currentPrice], block[:-2]))[:len(block)]
+        jumps = np.flatnonzero(np.abs(block - reference) > step)
+        n = jumps[0] if len(jumps) else len(block)
+        if n < 16:
+            # the price is jumping around, go tick by tick through the block
+            for i, lastPrice in enumerate(block.tolist()):
+                if abs(lastPrice - preCurrentPrice) > step:
+                    accepted[k + i] = False
+                    continue
+                preCurrentPrice = currentPrice
+                currentPrice = lastPrice
+            k += len(block)
+            continue
+        if n >= 2:
+            preCurrentPrice, currentPrice = block[n - 2], block[n - 1]
+        if len(jumps):
+            accepted[k + n] = False
+            n += 1
+        k += n
+    return mid, candidates[accepted]
+
+
+def dayExtremes(mid, accepted, starts):
+    """The highest and the lowest accepted mid price of every day, -inf/inf on a day without one"""
+    if not len(starts):
+        return np.zeros(0), np.zeros(0)
+    highs = np.full(len(mid), -np.inf)
+    lows = np.full(len(mid), np.inf)
+    highs[accepted] = mid[accepted]
+    lows[accepted] = mid[accepted]
+    return np.maximum.reduceat(highs, starts), np.minimum.reduceat(lows, starts)
+
+
+def dailyHighLow(ticks, mid, accepted, starts, newDay, extremes = None):
+    """todayHighPrice/todayLowPrice of every day at its end, as the handlers track them.
+
+    extremes are the dayExtremes() of the days, if they are known already.
+    """
+    first = accepted[0] if len(accepted) else len(mid)
+    highStart = np.where(starts > first, ticks.closePrice[starts], 0.0)
+    lowStart = np.where(starts > first, ticks.closePrice[starts], 10000.0)
+    if len(starts):
+        # on the tick that is accepted first the handlers reset the day before the new day opens it
+        atFirst = (starts == first) & newDay
+        highStart[atFirst] = ticks.closePrice[first]
+        lowStart[atFirst] = ticks.closePrice[first]
+    if len(starts):
+        dayHigh, dayLow = dayExtremes(mid, accepted, starts) if extremes is None else extremes
+        highStart = np.maximum(highStart, dayHigh)
+        lowStart = np.minimum(lowStart, dayLow)
+    return highStart, lowStart
+
+
+def appendedHighLows(highs, lows, newDay):
+    """The high and low the handlers append to their day indicators on every new day"""
+    # the day before the first day is the firstTime day, still at 0/10000
+    prevHigh = np.concatenate(([0.0], highs[:-1]))
+    prevLow = np.concatenate(([10000.0], lows[:-1]))
+    return prevHigh[newDay].tolist(), prevLow[newDay].tolist()
+
+
+def averageTrueRange(highs, lows, newDay, p):
+    """calcATR() after every new day"""
+    ATR = indicators.AverageTrueRange(p.ATRN, p.DonchianN, p.ATR_WILDER)
+    return np.array([ATR.append(high - low) for high, low in zip(*appendedHighLows(highs, lows, newDay))])
+
+
+def donchianChannel(highs, lows, newDay, length):
+    """The upper and lower Donchian channel after every new day"""
+    channel = indicators.DonchianChannel(length)
+    bands = []
+    for high, low in zip(*appendedHighLows(highs, lows, newDay)):
+        channel.append(high, low)
+        bands.append((channel.upper, channel.lower))
+    return np.array(bands).reshape(-1, 2).T
+
+
+def movingAverages(initPrice, mid, accepted, p):
+    """movingAveragePrice after every AVERAGENUMPERIORD-th accepted tick"""
+    average = indicators.MovingAverage(p.AVERGAGEDAY, initPrice)
+    return np.array([average.append(price) for price in mid[accepted[::p.AVERAGENUMPERIORD]].tolist()])
+
+
+def cachedIndicator(ticks, key, compute):
+    """compute(), done once per key and window if the ticks carry an indicatorcache.IndicatorCache"""
+    if ticks.indicators is None:
+        return compute()
+    return ticks.indicators.get(key, compute, window = True)
+
+
+def validTicks(ticks, kind):
+    """kind "quote" skips the ticks with a None field like the MovingAverage handler, "price" only
+    the ticks without any price like the Turtle handler"""
+    return ~ticks.hasNone if kind == "quote" else (ticks.bidPrice >= 0) & (ticks.askPrice >= 0)
+
+
+def storeTicks(store):
+    """The columns of every tick of a store"""
+    return loadTicks(store, "1970-01-01", "2200-01-01", copy = False)
+
+
+def storeAccepted(cache, p, kind):
+    """The accepted ticks of the whole store of an indicatorcache.IndicatorCache, the same for every window"""
+    def compute():
+        ticks = storeTicks(cache.store)
+        return filterPrices(ticks, p, validTicks(ticks, kind))[1]
+    return cache.get(("accepted", kind, p.RESONABLE_PRICE_GAP, p.RESONABLE_PRICE_STEP), compute)
+
+
+def windowAccepted(ticks, p, valid, whole):
+    """The accepted ticks of a window, taken from whole, the accepted rows of the whole store.
+
+    The filter of a window starts afresh on its first tick. Once it accepts the same two ticks in a row
+    as the filter of the whole store, both compare the next ticks with the same prices and go on alike.
+    """
+    inWindow = whole[np.searchsorted(whole, ticks.first):np.searchsorted(whole, ticks.first + len(ticks.timestamp))]
+    inWindow = inWindow - ticks.first
+    n = STEP_BLOCK
+    while True:
+        head = dotdict(bidPrice = ticks.bidPrice[:n], askPrice = ticks.askPrice[:n])
+        local = filterPrices(head, p, valid[:n])[1]
+        if n >= len(ticks.timestamp):
+            return local
+        position = np.minimum(np.searchsorted(inWindow, local), max(len(inWindow) - 1, 0))
+        shared = (inWindow[position] == local) if len(inWindow) else np.zeros(len(local), bool)
+        pairs = np.flatnonzero(shared[:-1] & shared[1:] & (position[1:] == position[:-1] + 1))
+        if len(pairs):
+            j = pairs[0] + 1
+            return np.concatenate((local[:j + 1], inWindow[position[j] + 1:]))
+        n *= 4
+
+
+def acceptedPrices(ticks, p, kind = "quote"):
+    """Mid prices and the accepted ticks of filterPrices(), with the validity check of a handler (see validTicks())"""
+    mid = (ticks.bidPrice + ticks.askPrice) / 2
+    valid = validTicks(ticks, kind)
+    if ticks.indicators is None:
+        return mid, filterPrices(ticks, p, valid)[1]
+    whole = storeAccepted(ticks.indicators, p, kind)
+    return mid, ticks.indicators.remember(("accepted", kind, p.RESONABLE_PRICE_GAP, p.RESONABLE_PRICE_STEP),
+                                          lambda: windowAccepted(ticks, p, valid, whole))
+
+
+def windowExtremes(ticks, p, kind, mid, accepted, starts):
+    """dayExtremes() of the days of a window, sliced from those of the whole store.
+
+    Only the days on which the window accepts other ticks than the whole store are done again.
+    """
+    cache = ticks.indicators
+    whole = storeAccepted(cache, p, kind)
+
+    def compute():
+        ticks = storeTicks(cache.store)
+        storeStarts = dayStarts(ticks)[0]
+        return np.array((storeStarts,) + dayExtremes((ticks.bidPrice + ticks.askPrice) / 2, whole, storeStarts))
+    storeStarts, dayHigh, dayLow = cache.get(("dayextremes", kind, p.RESONABLE_PRICE_GAP, p.RESONABLE_PRICE_STEP),
+                                             compute)
+    day = np.searchsorted(storeStarts, ticks.first)
+    dayHigh = np.array(dayHigh[day:day + len(starts)])
+    dayLow = np.array(dayLow[day:day + len(starts)])
+    inWindow = whole[np.searchsorted(whole, ticks.first):np.searchsorted(whole, ticks.first + len(mid))] - ticks.first
+    ends = np.append(starts[1:], len(mid))
+    for d in np.unique(np.searchsorted(starts, np.setxor1d(accepted, inWindow), "right") - 1):
+        dayAccepted = accepted[np.searchsorted(accepted, starts[d]):np.searchsorted(accepted, ends[d])]
+        dayHigh[d] = mid[dayAccepted].max() if len(dayAccepted) else -np.inf
+        dayLow[d] = mid[dayAccepted].min() if len(dayAccepted) else np.inf
+    return dayHigh, dayLow
+
+
+def dayHighLow(ticks, p, kind, mid, accepted, starts, newDay):
+    """dailyHighLow() of the accepted ticks of kind, see acceptedPrices()"""
+    if ticks.indicators is None:
+        return np.array(dailyHighLow(ticks, mid, accepted, starts, newDay))
+    return ticks.indicators.remember(("highlow", kind, p.RESONABLE_PRICE_GAP, p.RESONABLE_PRICE_STEP), lambda: np.array(
+        dailyHighLow(ticks, mid, accepted, starts, newDay, windowExtremes(ticks, p, kind, mid, accepted, starts))))
+
+
+def dayATR(ticks, p, kind, highs, lows, newDay):
+    """The ATR of every new day, 0 on the other days"""
+    def compute():
+        ATRs = np.zeros(len(newDay))
+        ATRs[newDay] = averageTrueRange(highs, lows, newDay, p)
+        return ATRs
+    return cachedIndicator(ticks, ("atr", kind, p.RESONABLE_PRICE_GAP, p.RESONABLE_PRICE_STEP, p.DonchianN, p.ATRN,
+                                   p.ATR_WILDER), compute)
+
+
+def dayDonchian(ticks, p, kind, highs, lows, newDay):
+    """getPreNMaxMinPrice() of every new day, 0/10000 on the other days"""
+    def compute():
+        upper, lower = donchianChannel(highs, lows, newDay, p.DonchianN)
+        maxPreNhighPrices = np.zeros(len(newDay))
+        minPreNlowPrices = np.full(len(newDay), 10000.0)
+        maxPreNhighPrices[newDay] = np.maximum(upper, 0.0)
+        minPreNlowPrices[newDay] = np.minimum(lower, 10000.0)
+        return np.array([maxPreNhighPrices, minPreNlowPrices])
+    return cachedIndicator(ticks, ("donchian", kind, p.RESONABLE_PRICE_GAP, p.RESONABLE_PRICE_STEP, p.DonchianN), compute)
+
+
+def runMovingAverage(ticks, params = None):
+    """handle_movingaverage_5_backtest() over the ticks, returns the final state and the daily records"""
+    p = getParams(params)
+    START_BTCOIN = p.START_BTCOIN
+    ATRN = p.ATRN
+    ADDTIME = p.ADDTIME
+    ZHIYINGUSD = p.ZHIYINGUSD
+    AVERAGENUMPERIORD = p.AVERAGENUMPERIORD
+    stop = DrawdownStop(p.STOP_DRAWDOWN)
+
+    mid, accepted = acceptedPrices(ticks, p)
+    starts, newDay = dayStarts(ticks)
+    result = newResult()
+    if not len(accepted):
+        return result
+    highs, lows = dayHighLow(ticks, p, "quote", mid, accepted, starts, newDay)
+    ATRs = dayATR(ticks, p, "quote", highs, lows, newDay).tolist()
+    closes = ticks.closePrice[starts].tolist()
+    first = int(accepted[0])
+    initBitcoinPrice = float(ticks.closePrice[first])
+    # everything below is indexed by accepted tick
+    MAs = cachedIndicator(ticks, ("movingaverage", p.RESONABLE_PRICE_GAP, p.RESONABLE_PRICE_STEP, p.AVERGAGEDAY, p.AVERAGENUMPERIORD),
+                          lambda: movingAverages(initBitcoinPrice, mid, accepted, p))
+    curArray = mid[accepted]
+    MAArray = MAs[np.arange(len(accepted)) // AVERAGENUMPERIORD]
+    belowMA = curArray < MAArray
+    aboveMA = curArray > MAArray
+    # only some ticks are looked at one by one, memoryviews give them as python numbers without a tolist() of everything
+    curs = memoryview(curArray)
+    movingAveragePrices = memoryview(MAArray)
+    lastAskPrices = memoryview(ticks.bidPrice[accepted])
+    lastBidPrices = memoryview(ticks.askPrice[accepted])
+    lastAskSizes = memoryview(ticks.askSize[accepted])
+    lastBidSizes = memoryview(ticks.bidSize[accepted])
+    dayOfAccepted = np.searchsorted(starts, accepted, side = "right") - 1
+    dayEnds = np.searchsorted(dayOfAccepted, np.arange(len(starts)), side = "right").tolist()
+
+    # OrderManager state touched by the trades
+    totalprofit = 0.0
+    finalUSDBenifit = 0.0
+    numberPostiveTrade = 0
+    numberNegativTrade = 0
+    dynamic_position = 0
+    startPrice_profit = 0.0
+    bankrupt = False
+    trades = 0
+    lastAskPrice = lastBidPrice = 0.0
+    lastAskSize = lastBidSize = 0
+
+    def benifitCaculatePos(pos, price):
+        nonlocal totalprofit, finalUSDBenifit, numberPostiveTrade, numberNegativTrade, bankrupt
+        if startPrice_profit == 0:
+            return 0
+        pricealpha = (price - startPrice_profit) / startPrice_profit
+        eachtimebenifit = pricealpha / (1+pricealpha) * pos / startPrice_profit
+        if eachtimebenifit > 0:
+            numberPostiveTrade += 1
+        if eachtimebenifit < 0:
+            numberNegativTrade += 1
+        totalprofit += eachtimebenifit
+        nowBitcoin = START_BTCOIN + totalprofit
+        if nowBitcoin < 0:
+            bankrupt = True
+        USDBenifit = nowBitcoin * price - START_BTCOIN * initBitcoinPrice
+        finalUSDBenifit = USDBenifit / (START_BTCOIN * initBitcoinPrice) * 100
+
+    def tradeTheRest(pos):
+        nonlocal dynamic_position, startPrice_profit, trades
+        trades += 1
+        if pos > 0:
+            tradePrice = lastAskPrice
+        else:
+            tradePrice = lastBidPrice
+        posBeforeTrade = dynamic_position
+        # backtest_trade_rest()
+        if pos > 0:
+            successTradeNum = pos if lastAskSize >= pos else lastAskSize
+        elif pos < 0:
+            successTradeNum = pos if lastBidSize >= abs(pos) else lastBidSize * (-1)
+        else:
+            successTradeNum = 0
+        dynamic_position += successTradeNum
+        if posBeforeTrade * successTradeNum > 0.1 or posBeforeTrade == 0:
+            # updateStartPriceProfit()
+            if dynamic_position != 0:
+                startPrice_profit = (startPrice_profit * (dynamic_position - successTradeNum) + tradePrice * successTradeNum) / (dynamic_position)
+        elif posBeforeTrade * successTradeNum < -0.1:
+            benifitCaculatePos(successTradeNum * (-1), tradePrice)
+        return pos - successTradeNum
+
+    currentPrice = 0.0
+    movingAveragePrice = 0.0
+    unrealisedBitcoinBenifit = 0.0
+    unrealisedbenifit = 0.0
+    totalUSDbenifit = 0.0
+    baseBenifit = 0.0
+    ATR = 0
+    UnitPosition = 0
+    UPPERLIMITPOS = 0.0
+    UNTERLIMITPOS = 0.0
+    TurtlePos = 0
+    AddPrice = [0] * ADDTIME
+    traderest = 0.0
+    simulateDayNumbers = 0
+    n = 0 # accepted ticks so far
+    dates = np.datetime_as_string((ticks.timestamp[starts] // SECONDS_PER_DAY).astype("datetime64[D]")).tolist()
+    # until the first accepted tick the handler keeps resetting prevClosePrice to the tick's close
+    lastTicks = np.append(starts[1:], len(mid)) - 1
+    prevCloses = np.where(starts > first, ticks.closePrice[starts], ticks.closePrice[np.minimum(first, lastTicks)]).tolist()
+
+    for day in range(len(starts)):
+        prevClosePrice = prevCloses[day]
+        if newDay[day]:
+            prevClosePrice = closes[day]
+            simulateDayNumbers += 1
+            ATR = ATRs[day]
+            # CalcUnit()
+            X = START_BTCOIN + totalprofit
+            if ATR != 0:
+                UnitPosition = int(abs(0.02 * X * prevClosePrice * (prevClosePrice + ATR) / ATR))
+            # updatePositionLimit()
+            nowbitcoin = START_BTCOIN + totalprofit + unrealisedBitcoinBenifit
+            if nowbitcoin > 0:
+                UPPERLIMITPOS = nowbitcoin * currentPrice * 2
+                UNTERLIMITPOS = nowbitcoin * currentPrice * (-4)
+            traderest = 0.0
+        trading = simulateDayNumbers > ATRN
+
+        j = n
+        end = dayEnds[day]
+        quiet = 0
+        while j < end:
+            canTrade = abs(traderest) < 0.01 and trading
+            if quiet >= QUIET_TICKS and not (abs(traderest) > 0.01 or canTrade and TurtlePos == 0) and \
+                    (dynamic_position == 0 or abs(startPrice_profit) > 0.01):
+                # nothing but the unrealised benifit changes until the next tick that trades, find it at once
+                cur = curArray[j:end]
+                skip = len(cur)
+                zhiyingPossible = bankruptPossible = False
+                if dynamic_position != 0:
+                    # nowBitcoin is monotonic and the unrealised benifit is linear in the price, so they
+                    # only need to be computed tick by tick if their value at an extreme price comes close
+                    bounds = []
+                    for price in (float(cur.min()), float(cur.max())):
+                        pricealpha = (price - startPrice_profit) / startPrice_profit
+                        nowBitcoin = pricealpha / (1+pricealpha) * dynamic_position / startPrice_profit + START_BTCOIN + totalprofit
+                        bounds.append((nowBitcoin, (nowBitcoin * price) / (START_BTCOIN * initBitcoinPrice) * 100 - 100.0 - finalUSDBenifit))
+                    zhiyingPossible = canTrade and max(bounds[0][1], bounds[1][1]) >= ZHIYINGUSD - 1e-6
+                    bankruptPossible = min(bounds[0][0], bounds[1][0]) < 1e-9
+                if zhiyingPossible or bankruptPossible:
+                    pricealpha = (cur - startPrice_profit) / startPrice_profit
+                    nowBitcoins = pricealpha / (1+pricealpha) * dynamic_position / startPrice_profit + START_BTCOIN + totalprofit
+                    unrealisedbenifits = (nowBitcoins * cur) / (START_BTCOIN * initBitcoinPrice) * 100 - 100.0 - finalUSDBenifit
+                if canTrade:
+                    # the conditions of tradeMovingAverage() while in a position
+                    if TurtlePos > 0:
+                        trigger = belowMA[j:end] | (cur < AddPrice[TurtlePos - 1] - 2 * ATR)
+                        if TurtlePos < ADDTIME and dynamic_position < UPPERLIMITPOS:
+                            trigger |= cur > AddPrice[TurtlePos - 1]
+                    else:
+                        trigger = aboveMA[j:end] | (cur > AddPrice[-TurtlePos - 1] + 2 * ATR)
+                        if -TurtlePos < ADDTIME and dynamic_position > UNTERLIMITPOS:
+                            trigger |= cur < AddPrice[-TurtlePos - 1]
+                    if zhiyingPossible:
+                        trigger |= unrealisedbenifits >= ZHIYINGUSD
+                    hit = trigger.argmax()
+                    if trigger[hit]:
+                        skip = int(hit)
+                if bankruptPossible and skip and nowBitcoins[:skip].min() < 0:
+                    bankrupt = True
+                # without a trade the last tick of the day still sets the state
+                j = min(j + skip, end - 1)
+                quiet = 0
+            # the tick at j, as handle_movingaverage_5_backtest() does it
+            lastAskPrice = lastAskPrices[j]
+            lastBidPrice = lastBidPrices[j]
+            lastAskSize = lastAskSizes[j]
+            lastBidSize = lastBidSizes[j]
+            currentPrice = curs[j]
+            movingAveragePrice = movingAveragePrices[j]
+            j += 1
+            tradesBefore = trades
+            # unrealisedBenifit()
+            if abs(dynamic_position) > 0 and abs(startPrice_profit) > 0.01:
+                pricealpha = (currentPrice - startPrice_profit) / startPrice_profit
+                unrealisedBitcoinBenifit = pricealpha / (1+pricealpha) * dynamic_position / startPrice_profit
+                nowBitcoin = unrealisedBitcoinBenifit + START_BTCOIN + totalprofit
+                totalUSDbenifit = (nowBitcoin * currentPrice) / (START_BTCOIN * initBitcoinPrice) * 100 - 100.0
+                unrealisedbenifit = totalUSDbenifit - finalUSDBenifit
+                if nowBitcoin < 0:
+                    bankrupt = True
+            elif dynamic_position == 0:
+                nowBitcoin = START_BTCOIN + totalprofit
+                totalUSDbenifit = (nowBitcoin * currentPrice) / (START_BTCOIN * initBitcoinPrice) * 100 - 100.0
+                unrealisedbenifit = 0.0
+
+            if abs(traderest) < 0.01 and trading:
+                # tradeMovingAverage()
+                traderest = 0.0
+                if TurtlePos == 0:
+                    if currentPrice > movingAveragePrice:
+                        traderest = tradeTheRest(UnitPosition)
+                        if abs(UnitPosition - traderest) > 0:
+                            AddPrice[0] = lastAskPrice + 0.5 * ATR
+                            TurtlePos += 1
+                    elif currentPrice < movingAveragePrice:
+                        nowBitcoin = START_BTCOIN + totalprofit
+                        shortFirstPos = UnitPosition * (-1) - currentPrice * nowBitcoin
+                        traderest = tradeTheRest(shortFirstPos)
+                        if abs(shortFirstPos - traderest) > 0:
+                            AddPrice[0] = lastBidPrice - 0.5 * ATR
+                            TurtlePos -= 1
+                elif TurtlePos > 0:
+                    if currentPrice < movingAveragePrice or currentPrice < AddPrice[TurtlePos - 1] - 2 * ATR or unrealisedbenifit >= ZHIYINGUSD:
+                        pos = dynamic_position
+                        traderest = tradeTheRest(pos * (-1))
+                        if abs(pos * (-1) - traderest) > 0:
+                            TurtlePos = 0
+                    elif TurtlePos >= ADDTIME:
+                        pass
+                    elif currentPrice > AddPrice[TurtlePos - 1]:
+                        if dynamic_position < UPPERLIMITPOS:
+                            if (dynamic_position + UnitPosition) > UPPERLIMITPOS:
+                                UnitPosition = UPPERLIMITPOS - dynamic_position
+                            traderest = tradeTheRest(UnitPosition)
+                            if abs(UnitPosition - traderest) > 0.00:
+                                AddPrice[TurtlePos] = AddPrice[TurtlePos - 1] + 0.5 * ATR
+                                TurtlePos += 1
+                else:
+                    closed = False
+                    if currentPrice > movingAveragePrice or currentPrice > AddPrice[-TurtlePos - 1] + 2 * ATR or unrealisedbenifit >= ZHIYINGUSD:
+                        pos = dynamic_position
+                        traderest = tradeTheRest(abs(pos))
+                        if abs(abs(pos) - traderest) > 0.0:
+                            TurtlePos = 0
+                            closed = True
+                    if not closed and -TurtlePos < ADDTIME and currentPrice < AddPrice[-TurtlePos - 1]:
+                        if dynamic_position > UNTERLIMITPOS:
+                            if (dynamic_position - UnitPosition) < UNTERLIMITPOS:
+                                UnitPosition = dynamic_position - UNTERLIMITPOS
+                            traderest = tradeTheRest(UnitPosition*(-1))
+                            if abs(UnitPosition * (-1) - traderest) > 0:
+                                AddPrice[-TurtlePos] = AddPrice[-TurtlePos - 1] - 0.5 * ATR
+                                TurtlePos -= 1
+            elif abs(traderest) > 0.01:
+                traderest = tradeTheRest(traderest)
+            quiet = quiet + 1 if trades == tradesBefore else 0
+        if dayEnds[day] > n:
+            baseBenifit = (currentPrice - initBitcoinPrice) / initBitcoinPrice * 100
+            n = dayEnds[day]
+
+        # recordbenifit()
+        result.dates.append(dates[day])
+        result.prevClosePrice.append(prevCloses[day])
+        result.totalUSDbenifit.append(totalUSDbenifit)
+        result.position.append(dynamic_position)
+        result.movingAveragePrice.append(movingAveragePrice)
+        result.baseBenifit.append(baseBenifit)
+        if bankrupt:
+            break
+        if stop.passed(totalUSDbenifit):
+            result.pruned = True
+            break
+    else:
+        # lastDaysettlement() on the last tick
+        if dynamic_position > 0:
+            benifitCaculatePos(dynamic_position, float(ticks.askPrice[-1]))
+        if dynamic_position < 0:
+            benifitCaculatePos(dynamic_position, float(ticks.bidPrice[-1]))
+        dynamic_position = 0
+        result.dates.append(dates[-1])
+        result.prevClosePrice.append(prevCloses[-1])
+        result.totalUSDbenifit.append(totalUSDbenifit)
+        result.position.append(dynamic_position)
+        result.movingAveragePrice.append(movingAveragePrice)
+        result.baseBenifit.append(baseBenifit)
+
+    # totalUSDbenifit is already marked to the price
+    result.equity = list(result.totalUSDbenifit)
+    result.update(totalprofit = totalprofit, finalUSDBenifit = finalUSDBenifit, numberPostiveTrade = numberPostiveTrade,
+                  numberNegativTrade = numberNegativTrade, dynamic_position = dynamic_position, bankrupt = bankrupt)
+    return result
+
+
+def rBreakerLevels(prevHigh, prevLow, prevClose, p):
+    """The six R-Breaker prices of every day, from the previous day's high, low and close"""
+    f1, f2, f3 = p.R_BREAKER_F1, p.R_BREAKER_F2, p.R_BREAKER_F3
+    levels = dotdict()
+    levels.buy_setup = prevLow - f1 * (prevHigh - prevClose)
+    levels.sell_setup = prevHigh + f1 * (prevClose - prevLow)
+    levels.buy_enter = (1 + f2)/2 * (prevHigh + prevLow) - f2 * prevHigh
+    levels.sell_enter = (1 + f2)/2 * (prevHigh + prevLow) - f2 * prevLow
+    levels.buy_break = levels.sell_setup + f3 * (levels.sell_setup - levels.buy_setup)
+    levels.sell_break = levels.buy_setup - f3 * (levels.sell_setup - levels.buy_setup)
+    return levels
+
+
+def rBreakerDays(ticks, p):
+    """The accepted ticks of R-Breaker and the day by day values its levels and triggers come from"""
+    days = dotdict()
+    # R-Breaker only skips ticks with too big a gap between bid and ask, None fields included
+    mid = (ticks.bidPrice + ticks.askPrice) / 2
+    days.accepted = accepted = np.flatnonzero(~(np.abs(ticks.bidPrice - ticks.askPrice) > p.RESONABLE_PRICE_GAP))
+    days.midAccepted = midAccepted = mid[accepted]
+    days.starts, days.newDay = starts, newDay = dayStarts(ticks)
+    days.closes = closes = ticks.closePrice[starts]
+    # the first tick resets the day to 0/10000, a new day opens at its close
+    days.highStart = highStart = np.where(newDay, closes, 0.0)
+    days.lowStart = lowStart = np.where(newDay, closes, 10000.0)
+    days.bounds = bounds = np.searchsorted(accepted, np.append(starts, len(mid)))
+    highs = highStart.copy()
+    lows = lowStart.copy()
+    hasAccepted = bounds[1:] > bounds[:-1]
+    if len(accepted):
+        bounded = bounds[:-1][hasAccepted]
+        highs[hasAccepted] = np.maximum(highs[hasAccepted], np.maximum.reduceat(midAccepted, bounded))
+        lows[hasAccepted] = np.minimum(lows[hasAccepted], np.minimum.reduceat(midAccepted, bounded))
+    days.prevHigh = np.append(0.0, highs[:-1])
+    days.prevLow = np.append(10000.0, lows[:-1])
+    # until the first new day the handler doesn't trade
+    days.trading = np.cumsum(newDay) > 0
+    return days
+
+
+def runRBreaker(ticks, params = None):
+    """handle_trade_R_Breaker_backtest() over the ticks, returns the final state and the daily records
+
+    R-Breaker trades a few times a month, so instead of walking the ticks the kernel searches each
+    day for the first tick whose price meets a condition of the current position, handles that tick
+    like the handler does and searches again from the next one.
+    """
+    p = getParams(params)
+    START_BTCOIN = p.START_BTCOIN
+    ZHISHUN_PROZENT = p.ZHISHUN_PROZENT
+    operateposition = p.POSITION_SIZE * 100
+    stop = DrawdownStop(p.STOP_DRAWDOWN)
+
+    result = newResult()
+    if not len(ticks.timestamp):
+        return result
+    days = rBreakerDays(ticks, p)
+    accepted, midAccepted, starts, newDay, closes = days.accepted, days.midAccepted, days.starts, days.newDay, days.closes
+    highStart, lowStart, bounds, trading = days.highStart, days.lowStart, days.bounds, days.trading
+    levels = rBreakerLevels(days.prevHigh, days.prevLow, closes, p)
+
+    initBitcoinPrice = float(ticks.closePrice[0])
+    dates = np.datetime_as_string((ticks.timestamp[starts] // SECONDS_PER_DAY).astype("datetime64[D]")).tolist()
+    if len(accepted):
+        lastAskPrices = memoryview(ticks.bidPrice[accepted])
+        lastBidPrices = memoryview(ticks.askPrice[accepted])
+        lastAskSizes = memoryview(ticks.askSize[accepted])
+        lastBidSizes = memoryview(ticks.bidSize[accepted])
+
+    totalprofit = 0.0
+    finalUSDBenifit = 0.0
+    dynamic_position = 0
+    startPrice_profit = 0.0
+    prevClosePrice = 0.0
+    baseBenifit = 0.0
+    equity = 0.0
+
+    def benifitCaculate(endPrice_profit):
+        nonlocal totalprofit, finalUSDBenifit
+        pricealpha = (endPrice_profit - startPrice_profit) / startPrice_profit
+        eachtimebenifit = pricealpha / (1+pricealpha) * dynamic_position / startPrice_profit
+        totalprofit += eachtimebenifit
+        nowBitcoin = START_BTCOIN + totalprofit
+        USDBenifit = nowBitcoin * endPrice_profit - START_BTCOIN * initBitcoinPrice
+        finalUSDBenifit = USDBenifit / (START_BTCOIN * initBitcoinPrice) * 100
+
+    for day in range(len(starts)):
+        if newDay[day]:
+            prevClosePrice = float(closes[day])
+        first, last = int(bounds[day]), int(bounds[day + 1])
+        if trading[day] and last > first:
+            buy_setup, sell_setup = float(levels.buy_setup[day]), float(levels.sell_setup[day])
+            buy_enter, sell_enter = float(levels.buy_enter[day]), float(levels.sell_enter[day])
+            buy_break, sell_break = float(levels.buy_break[day]), float(levels.sell_break[day])
+            dayMid = midAccepted[first:last]
+            todayHighs = np.maximum(np.maximum.accumulate(dayMid), highStart[day])
+            todayLows = np.minimum(np.minimum.accumulate(dayMid), lowStart[day])
+            j = 0
+            while j < len(dayMid):
+                # the next tick on which the position can change
+                price = dayMid[j:]
+                if dynamic_position == 0:
+                    trigger = (price > buy_break) | (price < sell_break)
+                elif dynamic_position > 0:
+                    trigger = ((price - startPrice_profit) / startPrice_profit < -ZHISHUN_PROZENT) | (price < sell_break) | \
+                              ((todayHighs[j:] > sell_setup) & (price < sell_enter))
+                else:
+                    trigger = ((price - startPrice_profit) / startPrice_profit > ZHISHUN_PROZENT) | (price > buy_break) | \
+                              ((todayLows[j:] < buy_setup) & (price > buy_enter))
+                hit = trigger.argmax()
+                if not trigger[hit]:
+                    break
+                j += int(hit)
+                i = first + j
+                lastAskPrice = lastAskPrices[i]
+                lastBidPrice = lastBidPrices[i]
+                lastAskSize = lastAskSizes[i]
+                lastBidSize = lastBidSizes[i]
+                lastPrice = float(dayMid[j])
+                # Zhishun()
+                if dynamic_position > 0:
+                    pricealpha = (lastPrice - startPrice_profit) / startPrice_profit
+                    if pricealpha < -ZHISHUN_PROZENT and lastBidSize >= dynamic_position:
+                        benifitCaculate(lastBidPrice)
+                        dynamic_position = 0
+                if dynamic_position < 0:
+                    pricealpha = (lastPrice - startPrice_profit) / startPrice_profit
+                    if pricealpha > ZHISHUN_PROZENT and lastAskSize >= abs(dynamic_position):
+                        benifitCaculate(lastAskPrice)
+                        dynamic_position = 0
+                if dynamic_position == 0:
+                    if lastPrice > buy_break:
+                        if lastAskSize >= operateposition:
+                            startPrice_profit = lastAskPrice
+                            dynamic_position += operateposition
+                    if lastPrice < sell_break:
+                        if lastBidSize >= operateposition:
+                            startPrice_profit = lastBidPrice
+                            dynamic_position -= operateposition
+                elif dynamic_position > 0:
+                    if lastPrice < sell_break:
+                        if lastBidSize >= operateposition:
+                            benifitCaculate(lastBidPrice)
+                            dynamic_position -= operateposition
+                    elif todayHighs[j] > sell_setup and lastPrice < sell_enter:
+                        if lastBidSize >= operateposition:
+                            benifitCaculate(lastBidPrice)
+                            dynamic_position -= operateposition
+                            if lastBidSize - operateposition >= operateposition:
+                                startPrice_profit = lastBidPrice
+                                dynamic_position -= operateposition
+                elif dynamic_position < 0:
+                    if lastPrice > buy_break:
+                        if lastAskSize >= operateposition:
+                            benifitCaculate(lastAskPrice)
+                            dynamic_position += operateposition
+                    elif todayLows[j] < buy_setup and lastPrice > buy_enter:
+                        if lastAskSize >= operateposition:
+                            benifitCaculate(lastAskPrice)
+                            dynamic_position += operateposition
+                            if lastAskSize - operateposition >= operateposition:
+                                startPrice_profit = lastAskPrice
+                                dynamic_position += operateposition
+                j += 1
+        if last > first:
+            lastPrice = float(midAccepted[last - 1])
+            baseBenifit = (lastPrice - initBitcoinPrice) / initBitcoinPrice * 100
+            nowBitcoin = START_BTCOIN + totalprofit
+            if dynamic_position != 0:
+                pricealpha = (lastPrice - startPrice_profit) / startPrice_profit
+                nowBitcoin += pricealpha / (1+pricealpha) * dynamic_position / startPrice_profit
+            equity = (nowBitcoin * lastPrice) / (START_BTCOIN * initBitcoinPrice) * 100 - 100.0
+
+        # recordbenifit()
+        result.dates.append(dates[day])
+        result.prevClosePrice.append(prevClosePrice)
+        result.totalUSDbenifit.append(0.0)
+        result.position.append(dynamic_position)
+        result.movingAveragePrice.append(0.0)
+        result.baseBenifit.append(baseBenifit)
+        result.equity.append(equity)
+        if stop.passed(equity):
+            result.pruned = True
+            result.update(totalprofit = totalprofit, finalUSDBenifit = finalUSDBenifit, dynamic_position = dynamic_position)
+            return result
+
+    # lastDaysettlement() on the last tick, the only place R-Breaker counts trades
+    if dynamic_position != 0 and startPrice_profit != 0:
+        price = float(ticks.askPrice[-1]) if dynamic_position > 0 else float(ticks.bidPrice[-1])
+        pricealpha = (price - startPrice_profit) / startPrice_profit
+        eachtimebenifit = pricealpha / (1+pricealpha) * dynamic_position / startPrice_profit
+        if eachtimebenifit > 0:
+            result.numberPostiveTrade += 1
+        if eachtimebenifit < 0:
+            result.numberNegativTrade += 1
+        totalprofit += eachtimebenifit
+        nowBitcoin = START_BTCOIN + totalprofit
+        if nowBitcoin < 0:
+            result.bankrupt = True
+        finalUSDBenifit = (nowBitcoin * price - START_BTCOIN * initBitcoinPrice) / (START_BTCOIN * initBitcoinPrice) * 100
+        equity = finalUSDBenifit
+    dynamic_position = 0
+    result.dates.append(dates[-1])
+    result.prevClosePrice.append(prevClosePrice)
+    result.totalUSDbenifit.append(0.0)
+    result.position.append(dynamic_position)
+    result.movingAveragePrice.append(0.0)
+    result.baseBenifit.append(baseBenifit)
+    result.equity.append(equity)
+
+    result.update(totalprofit = totalprofit, finalUSDBenifit = finalUSDBenifit, dynamic_position = dynamic_position)
+    return result
+
+
+
+# the settings runRBreakerBatch() takes per parameter set, all others are shared by the batch
+R_BREAKER_BATCH_PARAMS = ("R_BREAKER_F1", "R_BREAKER_F2", "R_BREAKER_F3", "ZHISHUN_PROZENT", "POSITION_SIZE")
+
+
+def runRBreakerBatch(ticks, paramsList):
+    """runRBreaker() for many parameter sets in one pass over the ticks.
+
+    The sets may only differ in R_BREAKER_BATCH_PARAMS, which become arrays with one entry per set.
+    Each day the trigger conditions of every set are evaluated as one (ticks x sets) array; then the
+    ticks on which some sets trigger are handled in time order, for those sets at once, and only
+    their next trigger is searched again. Returns the final state of every set as arrays and the
+    daily equity as a (days x sets) array, with the dates of its rows.
+    """
+    ps = [getParams(params) for params in paramsList]
+    p = ps[0]
+    vector = dotdict((name, np.array([q[name] for q in ps])) for name in R_BREAKER_BATCH_PARAMS)
+    n = len(ps)
+    START_BTCOIN = p.START_BTCOIN
+    Z = vector.ZHISHUN_PROZENT
+    operateposition = vector.POSITION_SIZE * 100
+
+    totalprofit = np.zeros(n)
+    finalUSDBenifit = np.zeros(n)
+    dynamic_position = np.zeros(n, np.int64)
+    startPrice_profit = np.zeros(n)
+    equity = np.zeros(n)
+    result = dotdict(totalprofit = totalprofit, finalUSDBenifit = finalUSDBenifit, numberPostiveTrade = np.zeros(n, np.int64),
+                     numberNegativTrade = np.zeros(n, np.int64), dynamic_position = dynamic_position,
+                     bankrupt = np.zeros(n, bool), pruned = np.zeros(n, bool), dates = [], equity = np.zeros((0, n)))
+    if not len(ticks.timestamp):
+        return result
+    days = rBreakerDays(ticks, p)
+    accepted, midAccepted, bounds = days.accepted, days.midAccepted, days.bounds
+    # every level is a (days x sets) array
+    levels = rBreakerLevels(days.prevHigh[:, None], days.prevLow[:, None], days.closes[:, None],
+                            dotdict(R_BREAKER_F1 = vector.R_BREAKER_F1[None, :], R_BREAKER_F2 = vector.R_BREAKER_F2[None, :],
+                                    R_BREAKER_F3 = vector.R_BREAKER_F3[None, :]))
+    initBitcoinPrice = float(ticks.closePrice[0])
+    startUSD = START_BTCOIN * initBitcoinPrice
+    if len(accepted):
+        lastAskPrices = ticks.bidPrice[accepted]
+        lastBidPrices = ticks.askPrice[accepted]
+        lastAskSizes = ticks.askSize[accepted]
+        lastBidSizes = ticks.bidSize[accepted]
+
+    def firstTriggers(sets, j, dayMid, todayHighs, todayLows, level):
+        """Index of the next tick from j on which each of sets can change its position, len(dayMid) if none"""
+        price = dayMid[j:, None]
+        if not len(price):
+            return np.full(len(sets), j)
+        position = dynamic_position[sets]
+        start = startPrice_profit[sets]
+        trigger = np.empty((len(price), len(sets)), bool)
+        flat = position == 0
+        if flat.any():
+            cols = sets[flat]
+            trigger[:, flat] = (price > level.buy_break[cols]) | (price < level.sell_break[cols])
+        long = position > 0
+        if long.any():
+            cols = sets[long]
+            trigger[:, long] = ((price - start[long]) / start[long] < -Z[cols]) | (price < level.sell_break[cols]) | \
+                               ((todayHighs[j:, None] > level.sell_setup[cols]) & (price < level.sell_enter[cols]))
+        short = position < 0
+        if short.any():
+            cols = sets[short]
+            trigger[:, short] = ((price - start[short]) / start[short] > Z[cols]) | (price > level.buy_break[cols]) | \
+                                ((todayLows[j:, None] < level.buy_setup[cols]) & (price > level.buy_enter[cols]))
+        hits = trigger.argmax(axis = 0)
+        hits[~trigger[hits, np.arange(len(sets))]] = len(price)
+        return hits + j
+
+    def handleTick(sets, i, lastPrice, todayHigh, todayLow, level):
+        """The handler on tick i for the sets, like the scalar code of runRBreaker()"""
+        lastAskPrice, lastBidPrice = float(lastAskPrices[i]), float(lastBidPrices[i])
+        lastAskSize, lastBidSize = int(lastAskSizes[i]), int(lastBidSizes[i])
+        position = dynamic_position[sets]
+        start = startPrice_profit[sets]
+        profit = totalprofit[sets]
+        benifit = finalUSDBenifit[sets]
+        operate = operateposition[sets]
+        zhishun = Z[sets]
+
+        def benifitCaculate(mask, endPrice_profit):
+            pricealpha = (endPrice_profit - start[mask]) / start[mask]
+            profit[mask] += pricealpha / (1+pricealpha) * position[mask] / start[mask]
+            nowBitcoin = START_BTCOIN + profit[mask]
+            benifit[mask] = (nowBitcoin * endPrice_profit - startUSD) / startUSD * 100
+
+        # Zhishun()
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            pricealpha = (lastPrice - start) / start
+        stop = (position > 0) & (pricealpha < -zhishun) & (lastBidSize >= position)
+        benifitCaculate(stop, lastBidPrice)
+        position[stop] = 0
+        stop = (position < 0) & (pricealpha > zhishun) & (lastAskSize >= -position)
+        benifitCaculate(stop, lastAskPrice)
+        position[stop] = 0
+
+        flat, long, short = position == 0, position > 0, position < 0
+        buy_break, sell_break = level.buy_break[sets], level.sell_break[sets]
+        enter = flat & (lastPrice > buy_break) & (lastAskSize >= operate)
+        start[enter] = lastAskPrice
+        position[enter] += operate[enter]
+        enter = flat & (lastPrice < sell_break) & (lastBidSize >= operate)
+        start[enter] = lastBidPrice
+        position[enter] -= operate[enter]
+
+        breaks = lastPrice < sell_break
+        exit = long & breaks & (lastBidSize >= operate)
+        benifitCaculate(exit, lastBidPrice)
+        position[exit] -= operate[exit]
+        exit = long & ~breaks & (todayHigh > level.sell_setup[sets]) & (lastPrice < level.sell_enter[sets]) & \
+               (lastBidSize >= operate)
+        benifitCaculate(exit, lastBidPrice)
+        position[exit] -= operate[exit]
+        reverse = exit & (lastBidSize - operate >= operate)
+        start[reverse] = lastBidPrice
+        position[reverse] -= operate[reverse]
+
+        breaks = lastPrice > buy_break
+        exit = short & breaks & (lastAskSize >= operate)
+        benifitCaculate(exit, lastAskPrice)
+        position[exit] += operate[exit]
+        exit = short & ~breaks & (todayLow < level.buy_setup[sets]) & (lastPrice > level.buy_enter[sets]) & \
+               (lastAskSize >= operate)
+        benifitCaculate(exit, lastAskPrice)
+        position[exit] += operate[exit]
+        reverse = exit & (lastAskSize - operate >= operate)
+        start[reverse] = lastAskPrice
+        position[reverse] += operate[reverse]
+
+        dynamic_position[sets] = position
+        startPrice_profit[sets] = start
+        totalprofit[sets] = profit
+        finalUSDBenifit[sets] = benifit
+
+    everySet = np.arange(n)
+    equities = []
+    # the sets whose drawdown passed STOP_DRAWDOWN stop trading, their equity stays where it was
+    stopDrawdown = np.inf if p.STOP_DRAWDOWN is None else p.STOP_DRAWDOWN
+    peak = None
+    for day in range(len(days.starts)):
+        first, last = int(bounds[day]), int(bounds[day + 1])
+        if days.trading[day] and last > first:
+            level = dotdict((name, value[day]) for name, value in levels.items())
+            dayMid = midAccepted[first:last]
+            todayHighs = np.maximum(np.maximum.accumulate(dayMid), days.highStart[day])
+            todayLows = np.minimum(np.minimum.accumulate(dayMid), days.lowStart[day])
+            nextHits = firstTriggers(everySet, 0, dayMid, todayHighs, todayLows, level)
+            while True:
+                j = int(nextHits.min())
+                if j >= len(dayMid):
+                    break
+                hit = np.flatnonzero(nextHits == j)
+                sets = everySet[hit]
+                handleTick(sets, first + j, float(dayMid[j]), todayHighs[j], todayLows[j], level)
+                nextHits[hit] = firstTriggers(sets, j + 1, dayMid, todayHighs, todayLows, level)
+        if last > first:
+            lastPrice = float(midAccepted[last - 1])
+            nowBitcoin = START_BTCOIN + totalprofit
+            holding = dynamic_position != 0
+            start = startPrice_profit[holding]
+            pricealpha = (lastPrice - start) / start
+            nowBitcoin[holding] += pricealpha / (1+pricealpha) * dynamic_position[holding] / start
+            equity = np.where(result.pruned, equity, (nowBitcoin * lastPrice) / startUSD * 100 - 100.0)
+        equities.append(equity)
+        if p.STOP_DRAWDOWN is not None:
+            wealth = np.maximum(1 + equity / 100, 0)
+            peak = wealth if peak is None else np.maximum(peak, wealth)
+            falls = np.divide(peak - wealth, peak, out = np.ones(n), where = peak > 0) > stopDrawdown
+            result.pruned |= falls
+            everySet = np.flatnonzero(~result.pruned)
+            if not len(everySet):
+                break
+
+    # lastDaysettlement()
+    settle = (dynamic_position != 0) & (startPrice_profit != 0) & ~result.pruned
+    price = np.where(dynamic_position > 0, float(ticks.askPrice[-1]), float(ticks.bidPrice[-1]))[settle]
+    start = startPrice_profit[settle]
+    pricealpha = (price - start) / start
+    eachtimebenifit = pricealpha / (1+pricealpha) * dynamic_position[settle] / start
+    result.numberPostiveTrade[settle] = eachtimebenifit > 0
+    result.numberNegativTrade[settle] = eachtimebenifit < 0
+    totalprofit[settle] += eachtimebenifit
+    nowBitcoin = START_BTCOIN + totalprofit[settle]
+    result.bankrupt[settle] = nowBitcoin < 0
+    finalUSDBenifit[settle] = (nowBitcoin * price - startUSD) / startUSD * 100
+    equity = equity.copy()
+    equity[settle] = finalUSDBenifit[settle]
+    equities.append(equity)
+    dynamic_position[:] = 0
+    result.equity = np.array(equities)
+    # a row per day and the one of lastDaysettlement(), like the dates of runRBreaker()
+    dates = np.datetime_as_string((ticks.timestamp[days.starts] // SECONDS_PER_DAY).astype("datetime64[D]")).tolist()
+    dates = dates[:len(equities) - 1]
+    result.dates = dates + dates[-1:]
+    return result
+
+TURTLE_FINISHED = 0
+TURTLE_BANKRUPT = 1
+TURTLE_NAN_ATR = 2
+TURTLE_PRUNED = 3
+
+
+def _turtleKernel(cur, lastAskPrices, lastBidPrices, lastAskSizes, lastBidSizes, dayEnds, newDay, closes, ATRs,
+                  maxPreNhighPrices, minPreNlowPrices, START_BTCOIN, initBitcoinPrice, ZHIYINGUSD, DonchianN, ADDTIME,
+                  stopDrawdown, settleAskPrice, settleBidPrice, totalUSDbenifits, positions, baseBenifits):
+    """handle_trade_Turtle_backtest() and tradeTultle() over primitive arrays and scalars only.
+
+    The first arrays are per accepted tick, the rest per day. The daily records are written into
+    totalUSDbenifits, positions and baseBenifits. stopDrawdown is STOP_DRAWDOWN, inf for none. Returns (days recorded, one of the TURTLE_* states,
+    totalprofit, finalUSDBenifit, numberPostiveTrade, numberNegativTrade, dynamic_position, bankrupt).
+    """
+    totalprofit = 0.0
+    finalUSDBenifit = 0.0
+    numberPostiveTrade = 0
+    numberNegativTrade = 0
+    dynamic_position = 0
+    startPrice_profit = 0.0
+    bankrupt = False
+    unrealisedBitcoinBenifit = 0.0
+    unrealisedbenifit = 0.0
+    totalUSDbenifit = 0.0
+    baseBenifit = 0.0
+    currentPrice = 0.0
+    ATR = 0.0
+    UnitPosition = 0
+    maxPreNhighPrice = 0.0
+    minPreNlowPrice = 10000.0
+    TurtlePos = 0
+    AddPrice = np.zeros(ADDTIME)
+    simulateDayNumbers = 0
+    n = 0
+    days = 0
+    peak = -1.0
+    for day in range(len(dayEnds)):
+        if newDay[day]:
+            maxPreNhighPrice = maxPreNhighPrices[day]
+            minPreNlowPrice = minPreNlowPrices[day]
+            simulateDayNumbers += 1
+            ATR = ATRs[day]
+            # CalcUnit()
+            if ATR != ATR:
+                return days, TURTLE_NAN_ATR, totalprofit, finalUSDBenifit, numberPostiveTrade, numberNegativTrade, dynamic_position, bankrupt
+            X = START_BTCOIN + totalprofit
+            if ATR != 0:
+                UnitPosition = int(abs(0.02 * X * closes[day] * (closes[day] + ATR) / ATR))
+        for j in range(n, dayEnds[day]):
+            currentPrice = cur[j]
+            lastAskPrice = lastAskPrices[j]
+            lastBidPrice = lastBidPrices[j]
+            # unrealisedBenifit()
+            if abs(dynamic_position) > 0 and abs(startPrice_profit) > 0.01:
+                pricealpha = (currentPrice - startPrice_profit) / startPrice_profit
+                unrealisedBitcoinBenifit = pricealpha / (1+pricealpha) * dynamic_position / startPrice_profit
+                nowBitcoin = unrealisedBitcoinBenifit + START_BTCOIN + totalprofit
+                totalUSDbenifit = (nowBitcoin * currentPrice) / (START_BTCOIN * initBitcoinPrice) * 100 - 100.0
+                unrealisedbenifit = totalUSDbenifit - finalUSDBenifit
+                if nowBitcoin < 0:
+                    bankrupt = True
+            elif dynamic_position == 0:
+                nowBitcoin = START_BTCOIN + totalprofit
+                totalUSDbenifit = (nowBitcoin * currentPrice) / (START_BTCOIN * initBitcoinPrice) * 100 - 100.0
+                unrealisedbenifit = 0.0
+            if simulateDayNumbers <= DonchianN:
+                continue
+
+            # tradeTultle()
+            closing = False
+            if TurtlePos == 0:
+                if currentPrice > maxPreNhighPrice:
+                    if lastAskSizes[j] >= UnitPosition:
+                        dynamic_position += UnitPosition
+                        AddPrice[0] = lastAskPrice + 0.5 * ATR
+                        TurtlePos += 1
+                        startPrice_profit = lastAskPrice
+                elif currentPrice < minPreNlowPrice:
+                    if lastBidSizes[j] >= UnitPosition:
+                        dynamic_position -= UnitPosition
+                        AddPrice[0] = lastBidPrice - 0.5 * ATR
+                        TurtlePos -= 1
+                        startPrice_profit = lastAskPrice
+            elif TurtlePos > 0:
+                sell_break = AddPrice[TurtlePos - 1] - 2 * ATR
+                breaks = currentPrice < sell_break
+                if currentPrice < minPreNlowPrice or unrealisedbenifit > ZHIYINGUSD or breaks:
+                    if lastBidSizes[j] >= abs(dynamic_position):
+                        closing = True
+                        closePrice = lastBidPrice
+                if not closing and not breaks and TurtlePos < ADDTIME and currentPrice > AddPrice[TurtlePos - 1]:
+                    if lastAskSizes[j] >= UnitPosition:
+                        dynamic_position += UnitPosition
+                        AddPrice[TurtlePos] = AddPrice[TurtlePos - 1] + 0.5 * ATR
+                        TurtlePos += 1
+                        # updateStartPriceProfit()
+                        if dynamic_position != 0:
+                            startPrice_profit = (startPrice_profit * (dynamic_position - UnitPosition) + lastAskPrice * UnitPosition) / (dynamic_position)
+            else:
+                buy_break = AddPrice[-TurtlePos - 1] + 2 * ATR
+                if currentPrice > maxPreNhighPrice or unrealisedbenifit > ZHIYINGUSD or currentPrice > buy_break:
+                    if lastAskSizes[j] >= abs(dynamic_position):
+                        closing = True
+                        closePrice = lastAskPrice
+                if not closing and -TurtlePos < ADDTIME and currentPrice < AddPrice[-TurtlePos - 1]:
+                    if lastBidSizes[j] >= UnitPosition:
+                        dynamic_position -= UnitPosition
+                        AddPrice[-TurtlePos] = AddPrice[-TurtlePos - 1] - 0.5 * ATR
+                        TurtlePos -= 1
+                        if dynamic_position != 0:
+                            startPrice_profit = (startPrice_profit * (dynamic_position + UnitPosition) + lastBidPrice * (-UnitPosition)) / (dynamic_position)
+            if closing:
+                # close the whole position, benifitCaculatePos()
+                pos = dynamic_position
+                dynamic_position = 0
+                TurtlePos = 0
+                if startPrice_profit != 0:
+                    pricealpha = (closePrice - startPrice_profit) / startPrice_profit
+                    eachtimebenifit = pricealpha / (1+pricealpha) * pos / startPrice_profit
+                    if eachtimebenifit > 0:
+                        numberPostiveTrade += 1
+                    if eachtimebenifit < 0:
+                        numberNegativTrade += 1
+                    totalprofit += eachtimebenifit
+                    nowBitcoin = START_BTCOIN + totalprofit
+                    if nowBitcoin < 0:
+                        bankrupt = True
+                    finalUSDBenifit = (nowBitcoin * closePrice - START_BTCOIN * initBitcoinPrice) / (START_BTCOIN * initBitcoinPrice) * 100
+        if dayEnds[day] > n:
+            baseBenifit = (currentPrice - initBitcoinPrice) / initBitcoinPrice * 100
+            n = dayEnds[day]
+
+        # recordbenifit()
+        totalUSDbenifits[day] = totalUSDbenifit
+        positions[day] = dynamic_position
+        baseBenifits[day] = baseBenifit
+        days += 1
+        if bankrupt:
+            return days, TURTLE_BANKRUPT, totalprofit, finalUSDBenifit, numberPostiveTrade, numberNegativTrade, dynamic_position, bankrupt
+        # DrawdownStop
+        wealth = max(1 + totalUSDbenifit / 100, 0.0)
+        peak = max(peak, wealth)
+        if (1.0 if peak <= 0 else (peak - wealth) / peak) > stopDrawdown:
+            return days, TURTLE_PRUNED, totalprofit, finalUSDBenifit, numberPostiveTrade, numberNegativTrade, dynamic_position, bankrupt
+
+    # lastDaysettlement()
+    if dynamic_position != 0 and startPrice_profit != 0:
+        closePrice = settleAskPrice if dynamic_position > 0 else settleBidPrice
+        pricealpha = (closePrice - startPrice_profit) / startPrice_profit
+        eachtimebenifit = pricealpha / (1+pricealpha) * dynamic_position / startPrice_profit
+        if eachtimebenifit > 0:
+            numberPostiveTrade += 1
+        if eachtimebenifit < 0:
+            numberNegativTrade += 1
+        totalprofit += eachtimebenifit
+        nowBitcoin = START_BTCOIN + totalprofit
+        if nowBitcoin < 0:
+            bankrupt = True
+        finalUSDBenifit = (nowBitcoin * closePrice - START_BTCOIN * initBitcoinPrice) / (START_BTCOIN * initBitcoinPrice) * 100
+    return days, TURTLE_FINISHED, totalprofit, finalUSDBenifit, numberPostiveTrade, numberNegativTrade, 0, bankrupt
+
+
+if njit is not None:
+    turtleKernel = njit(cache = True)(_turtleKernel)
+else:
+    turtleKernel = _turtleKernel
+
+
+def runTurtle(ticks, params = None):
+    """handle_trade_Turtle_backtest() over the ticks, returns the final state and the daily records
+
+    The Donchian channel and ATR of every day are computed as arrays, the path dependent pyramiding
+    runs in turtleKernel(), compiled by numba if it is installed.
+    """
+    p = getParams(params)
+    result = newResult()
+    # Turtle only skips ticks where both prices are None
+    mid, accepted = acceptedPrices(ticks, p, "price")
+    if not len(accepted):
+        return result
+    starts, newDay = dayStarts(ticks)
+    highs, lows = dayHighLow(ticks, p, "price", mid, accepted, starts, newDay)
+    ATRs = dayATR(ticks, p, "price", highs, lows, newDay)
+    maxPreNhighPrices, minPreNlowPrices = dayDonchian(ticks, p, "price", highs, lows, newDay)
+    closes = ticks.closePrice[starts]
+    dayEnds = np.searchsorted(accepted, np.append(starts[1:], len(mid)))
+
+    arrays = [mid[accepted], ticks.bidPrice[accepted], ticks.askPrice[accepted], ticks.askSize[accepted], ticks.bidSize[accepted],
+              dayEnds, newDay, closes, ATRs, maxPreNhighPrices, minPreNlowPrices]
+    if njit is None:
+        # plain python is faster on lists than on numpy scalars
+        arrays = [array.tolist() for array in arrays]
+    totalUSDbenifits = np.zeros(len(starts))
+    positions = np.zeros(len(starts), np.int64)
+    baseBenifits = np.zeros(len(starts))
+    days, state, totalprofit, finalUSDBenifit, numberPostiveTrade, numberNegativTrade, dynamic_position, bankrupt = turtleKernel(
+        *arrays, p.START_BTCOIN, float(ticks.closePrice[accepted[0]]), p.ZHIYINGUSD, p.DonchianN, p.ADDTIME,
+        np.inf if p.STOP_DRAWDOWN is None else float(p.STOP_DRAWDOWN), float(ticks.askPrice[-1]), float(ticks.bidPrice[-1]),
+        totalUSDbenifits, positions, baseBenifits)
+    if state == TURTLE_NAN_ATR:
+        raise ValueError("cannot convert float NaN to integer") # as CalcUnit() does
+
+    # prevClosePrice is only set by a new day
+    prevClosePrices = np.where(newDay, closes, 0.0)
+    result.dates = np.datetime_as_string((ticks.timestamp[starts[:days]] // SECONDS_PER_DAY).astype("datetime64[D]")).tolist()
+    result.prevClosePrice = prevClosePrices[:days].tolist()
+    result.totalUSDbenifit = totalUSDbenifits[:days].tolist()
+    result.position = positions[:days].tolist()
+    result.movingAveragePrice = [0.0] * days
+    result.baseBenifit = baseBenifits[:days].tolist()
+    if state == TURTLE_FINISHED:
+        # the record after lastDaysettlement()
+        result.dates.append(result.dates[-1])
+        result.prevClosePrice.append(result.prevClosePrice[-1])
+        result.totalUSDbenifit.append(result.totalUSDbenifit[-1])
+        result.position.append(0)
+        result.movingAveragePrice.append(0.0)
+        result.baseBenifit.append(result.baseBenifit[-1])
+    # totalUSDbenifit is already marked to the price
+    result.equity = list(result.totalUSDbenifit)
+    result.update(totalprofit = totalprofit, finalUSDBenifit = finalUSDBenifit, numberPostiveTrade = numberPostiveTrade,
+                  numberNegativTrade = numberNegativTrade, dynamic_position = dynamic_position, bankrupt = bankrupt,
+                  pruned = state == TURTLE_PRUNED)
+    return result
+
+
+ENGINES = {
+    "MovingAverage": runMovingAverage,
+    "R_Breaker": runRBreaker,
+    "Turtle": runTurtle,
+}
+
+# engines that run many parameter sets at once, and the settings that may differ within a batch
+BATCH_ENGINES = {
+    "R_Breaker": (runRBreakerBatch, R_BREAKER_BATCH_PARAMS),
+}
+
+
+def writeGrafic(result, filename = None):
+    """The daily records like OrderManager.recordbenifit() writes them"""
+    graficdata = resultwriter.ResultWriter(filename or resultwriter.resultFile("grafic"), resultwriter.GRAFIC_COLUMNS)
+    for record in zip(result.prevClosePrice, result.totalUSDbenifit, result.position, result.movingAveragePrice, result.baseBenifit):
+        graficdata.append(*record)
+    graficdata.close()
+
+
+def run():
+    if settings.STRATEGY not in ENGINES:
+        print("no array engine for strategy %s, use marketmaker.py" % settings.STRATEGY)
+        return
+    ticks = loadTicks(tickstore.openStore(settings.BACKTESTFILE), settings.START_DATE, settings.END_DATE)
+    result = ENGINES[settings.STRATEGY](ticks)
+    writeGrafic(result)
+    if result.bankrupt:
+        print("you are bankrupt now!!!!!!")
+    else:
+        print("back testing is finished!")
+    print("盈利交易次数为:%d, 亏损交易次数为%d" %(result.numberPostiveTrade, result.numberNegativTrade))
+    print("total profit: %.8f XBT, %.2f%% in USD" % (result.totalprofit, result.finalUSDBenifit))
@@ -10,6 +10,9 @@ import logging
 import sys
 from time import sleep
 from market_maker import bitmex
+from market_maker import dataindex
+from market_maker import datasort
+from market_maker import recorder
 from market_maker.settings import settings
 from market_maker.utils import log, constants, errors
 
@@ -26,24 +29,18 @@ class GetHisTradeDatas:
         self.number_per_day = 1440 // self.period
         
     def createFile(self,datafilename):
-        self.recordFile = open(datafilename,"w")
+        self.recordFile = open(datafilename,"w",newline="\n")
+        self.recordIndex = dataindex.IndexWriter(datafilename)
         
     def writeLineintoFile(self,index):
-        self.recordFile.write(self.quote[index]["timestamp"])
-        self.recordFile.write(" ")
-        self.recordFile.write(str(self.quote[index]["bidSize"]))
-        self.recordFile.write(" ")
-        self.recordFile.write(str(self.quote[index]["bidPrice"]))
-        self.recordFile.write(" ")
-        self.recordFile.write(str(self.quote[index]["askPrice"]))
-        self.recordFile.write(" ")
-        self.recordFile.write(str(self.quote[index]["askSize"]))
-        self.recordFile.write(" ")
-        self.recordFile.write(str(self.tradeBucket[0]["close"]))
-        self.recordFile.write("\n")
+        line = "%s %s %s %s %s %s\n" % (self.quote[index]["timestamp"], self.quote[index]["bidSize"], self.quote[index]["bidPrice"],
+                                        self.quote[index]["askPrice"], self.quote[index]["askSize"], self.tradeBucket[0]["close"])
+        self.recordFile.write(line)
+        self.recordIndex.addLine(line)
         
     def closeFile(self):
         self.recordFile.close()   
+        self.recordIndex.save()
         
     def run_loop(self):
         dateindex = settings.START_DATE
@@ -75,11 +72,13 @@ class GetHisTradeDatas:
                 break   
         
 def run():
-    DR = GetHisTradeDatas()
-    DR.createFile(settings.BACKTESTFILE)
-    DR.run_loop()
+    # pages of several days on a few threads, see recorder.py
+    recorder.run([sys.argv[1]] if len(sys.argv) > 1 else None)
+    #DR = GetHisTradeDatas()
+    #DR.createFile(settings.BACKTESTFILE)
+    #DR.run_loop()
     #DR.run_loop_back()
-    DR.closeFile()
+    #DR.closeFile()
     
 def is_datefinished(currentdate = "2017-01-01", enddate = "2017-08-31"):
     if currentdate == enddate:
@@ -107,6 +106,11 @@ def getXDaysBefore(currentdate = "2017-09-01", x = 1):
     strxdaysbefore = xdaysbefore.strftime("%Y-%m-%d")
     #print(strtomorrow)
     return strxdaysbefore
+
+def getXDaysAfter(currentdate = "2017-09-01", x = 1):
+    today = datetime.date(fetchYearFromTime(currentdate),fetchMonthFromTime(currentdate),fetchDayFromTime(currentdate))
+    xdaysafter = today + datetime.timedelta(days=x)
+    return xdaysafter.strftime("%Y-%m-%d")
         
 def fetchYearFromTime(currentdate = "2017-11-21"):
     yearstr = currentdate[:4]
@@ -170,4 +174,96 @@ def IsThereANone(linestr = "2017-08-01T00:00:00.000Z 28547 2854.7 2859 28448 285
         if text == "None":
             return True
     return False
+
+class Tick(object):
+    """One record of the backtest data, as handed to the backtest handlers"""
+    __slots__ = ("timestamp", "date", "bidSize", "bidPrice", "askPrice", "askSize", "closePrice", "hasNone")
+
+    def __init__(self, timestamp, bidSize, bidPrice, askPrice, askSize, closePrice, hasNone):
+        self.timestamp = timestamp # "2017-08-01T00:00:00"
+        self.date = timestamp[:10]
+        self.bidSize = bidSize
+        self.bidPrice = bidPrice
+        self.askPrice = askPrice
+        self.askSize = askSize
+        self.closePrice = closePrice
+        self.hasNone = hasNone
+
+def parseTick(linestr = "2017-08-01T00:00:00.000Z 28547 2854.7 2859 28448 2854.7"):
+    """Split a data line once and return its Tick, following the get*FromLine() rules for None fields"""
+    timestamp, bidSizeStr, bidPriceStr, askPriceStr, askSizeStr, closePriceStr = linestr.split()[:6]
+    if "None" not in linestr:
+        return Tick(timestamp[:19], int(bidSizeStr), float(bidPriceStr), float(askPriceStr), int(askSizeStr),
+                    float(closePriceStr), False)
+    hasNone = "None" in (bidSizeStr, bidPriceStr, askPriceStr, askSizeStr)
+    if bidPriceStr == "None":
+        bidPriceStr = askPriceStr
+    if askPriceStr == "None":
+        askPriceStr = bidPriceStr
+    return Tick(timestamp[:19],
+                0 if bidSizeStr == "None" else int(bidSizeStr),
+                -1 if bidPriceStr == "None" else float(bidPriceStr),
+                -1 if askPriceStr == "None" else float(askPriceStr),
+                0 if askSizeStr == "None" else int(askSizeStr),
+                float(closePriceStr), hasNone)
+
+def iterDaysFromFile(datafilename, startdate = "2017-01-01", enddate = "2017-08-31"):
+    """Yield (date, ticks) for every day in [startdate, enddate) of a data file.
+
+    A file that is not in ascending time order is read from its sorted copy (see datasort). With a
+    usable date index (see dataindex) every day is read straight from its offset, otherwise the file
+    is scanned from the top.
+    """
+    datafilename = datasort.normalizedFile(datafilename)
+    if not dataindex.isUpToDate(datafilename):
+        dataindex.buildIndex(datafilename)
+    index = dataindex.loadIndex(datafilename)
+    if index is None:
+        for day in scanDaysFromFile(datafilename, startdate, enddate):
+            yield day
+        return
+    recordFile = open(datafilename, "rb")
+    try:
+        for date in sorted(d for d in index if startdate <= d < enddate):
+            offset, count = index[date]
+            recordFile.seek(offset)
+            yield date, readTicks(recordFile, count)
+    finally:
+        recordFile.close()
+
+def readTicks(recordFile, count):
+    """The next count ticks of a data file opened in binary mode, blank lines are skipped like the index does"""
+    ticks = []
+    while len(ticks) < count:
+        line = recordFile.readline()
+        if not line:
+            break
+        if line.strip():
+            ticks.append(parseTick(line.decode()))
+    return ticks
+
+def scanDaysFromFile(datafilename, startdate = "2017-01-01", enddate = "2017-08-31"):
+    recordFile = open(datafilename, "r")
+    try:
+        for line in recordFile:
+            if getDateFromLine(line) == startdate:
+                break
+        else:
+            return
+        ticks = [parseTick(line)]
+        dateindex = startdate
+        for line in recordFile:
+            if not line.strip():
+                continue
+            date = getDateFromLine(line)
+            if date != dateindex:
+                yield dateindex, ticks
+                if date >= enddate:
+                    return
+                dateindex = date
+                ticks = []
+            ticks.append(parseTick(line))
+        yield dateindex, ticks
+    finally:
+        recordFile.close()
     
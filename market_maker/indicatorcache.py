@@ -0,0 +1,112 @@
+"""Indicator series shared by the runs of a sweep
+
+Most parameter sets of a sweep share their indicators: the accepted ticks of the price filter,
+the daily high/low, the ATR and Donchian channel of a length, the moving average of a window.
+IndicatorCache computes each series once and keeps it as a .npy file in the "indicators"
+directory of the tick store. Worker processes open the files with numpy.memmap, so they all
+read the same pages, read-only.
+
+The accepted ticks and the highest and lowest price of every day don't depend on the tick window
+of a run. They are computed once over the whole store and every window takes its slice (see
+fastbacktest.acceptedPrices()), so the overlapping windows of a walk-forward share them. The ATR,
+the Donchian channel and the moving average start afresh on the first day of a window, they are
+kept per window.
+
+A series is keyed by the tick store (size, mtime and rows of its data file), the dates of its window
+if it has one and a key like ("atr", "quote", 20.0, 200.0, 5, 5) that names the indicator and everything
+it depends on. evict() keeps the INDICATOR_CACHE_SIZE series used last.
+"""
+from __future__ import absolute_import
+import os
+import json
+import hashlib
+import numpy as np
+from market_maker.settings import settings
+
+# bump when an indicator is computed differently, so old files are not used any more
+VERSION = 3
+
+
+def cachePath(store):
+    return os.path.join(store.storename, "indicators")
+
+
+class IndicatorCache:
+    def __init__(self, store, size = None):
+        self.store = store
+        self.directory = cachePath(store)
+        self.source = [VERSION, store.meta["sourceSize"], store.meta["sourceMtime"], store.meta["rows"]]
+        self.size = size
+        self.window = None
+        self.series = {}
+
+    def setWindow(self, startdate, enddate):
+        """The runs that follow are on the ticks of [startdate, enddate), the series of other windows are let go"""
+        if self.window != (startdate, enddate):
+            self.window = (startdate, enddate)
+            self.series = {key: series for key, series in self.series.items() if key[0] is None}
+
+    def path(self, key, window = None):
+        name = hashlib.sha1(json.dumps(self.source + list(window or ()) + list(key)).encode()).hexdigest()
+        return os.path.join(self.directory, name + ".npy")
+
+    def get(self, key, compute, window = False):
+        """The series of key, compute() gives it if it is not cached yet.
+
+        With window the series belongs to the current window (see setWindow()), else to the whole store.
+        """
+        memo = (self.window if window else None, key)
+        if memo in self.series:
+            return self.series[memo]
+        path = self.path(key, memo[0])
+        if os.path.isfile(path):
+            series = np.load(path, mmap_mode = "r")
+            try:
+                # evict() goes by the modification time
+                os.utime(path)
+            except OSError:
+                pass
+        else:
+            series = np.asarray(compute())
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, exist_ok = True)
+            # another worker may write the same series, the rename makes sure nobody reads half a file
+            tmp = "%s.%d.tmp" % (path, os.getpid())
+            with open(tmp, "wb") as seriesfile:
+                np.save(seriesfile, series)
+            os.replace(tmp, path)
+        self.series[memo] = series
+        return series
+
+    def remember(self, key, compute):
+        """compute() once per window and kept in memory only, for what is quickly made of cached series"""
+        memo = (self.window, ("remembered",) + tuple(key))
+        if memo not in self.series:
+            self.series[memo] = compute()
+        return self.series[memo]
+
+    def evict(self):
+        """Drop the least recently used series beyond size"""
+        if not self.size or not os.path.isdir(self.directory):
+            return
+        used = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy"):
+                path = os.path.join(self.directory, name)
+                try:
+                    used.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+        used.sort()
+        for lastUsed, path in used[:max(0, len(used) - self.size)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def openCache(store):
+    """The IndicatorCache of a store, or None if INDICATOR_CACHE is off"""
+    if not settings.INDICATOR_CACHE:
+        return None
+    return IndicatorCache(store, settings.INDICATOR_CACHE_SIZE)
@@ -0,0 +1,140 @@
+"""Incremental indicators
+
+Every indicator takes one value per update and costs O(1) per update, whatever its window: the
+moving average keeps a running sum, the Donchian channel a monotonic deque of the candidates for
+the maximum and minimum, the ATR a running sum of the true ranges in its window. The live trading,
+the backtest handlers and the array engines of fastbacktest all use these classes, so they
+compute the same numbers.
+
+The running sums are summed up again with math.fsum once per window, so the rounding errors of
+the additions and subtractions don't pile up over a long backtest.
+"""
+from __future__ import absolute_import
+import math
+import collections
+
+
+class MovingAverage:
+    """Mean of the last `window` values, the window starts filled with `initial`"""
+    def __init__(self, window, initial = 0.0):
+        self.window = window
+        self.fill(initial)
+
+    def fill(self, value):
+        """Forget every value, as if `window` times value had been appended"""
+        self.values = collections.deque(self.window * [value], self.window)
+        self.total = math.fsum(self.values)
+        self.updates = 0
+        self.value = self.total / self.window
+
+    def append(self, value):
+        self.total += value - self.values[0]
+        self.values.append(value)
+        self.updates += 1
+        if self.updates == self.window:
+            self.total = math.fsum(self.values)
+            self.updates = 0
+        self.value = self.total / self.window
+        return self.value
+
+
+class RollingMax:
+    """Largest of the last `window` values, the window starts filled with `initial`"""
+    def __init__(self, window, initial = 0.0):
+        self.window = window
+        self.index = window - 1
+        # (index, value) of the values that can still become the maximum, decreasing
+        self.candidates = collections.deque([(self.index, initial)])
+        self.value = initial
+
+    def _dominates(self, value, other):
+        return value >= other
+
+    def append(self, value):
+        self.index += 1
+        while self.candidates and self._dominates(value, self.candidates[-1][1]):
+            self.candidates.pop()
+        self.candidates.append((self.index, value))
+        if self.candidates[0][0] <= self.index - self.window:
+            self.candidates.popleft()
+        self.value = self.candidates[0][1]
+        return self.value
+
+
+class RollingMin(RollingMax):
+    """Smallest of the last `window` values, the window starts filled with `initial`"""
+    def _dominates(self, value, other):
+        return value <= other
+
+
+class DonchianChannel:
+    """Highest high and lowest low of the last `window` days, the days before the first are 0"""
+    def __init__(self, window, initial = 0.0):
+        self.highs = RollingMax(window, initial)
+        self.lows = RollingMin(window, initial)
+
+    def append(self, high, low):
+        self.highs.append(high)
+        self.lows.append(low)
+
+    @property
+    def upper(self):
+        return self.highs.value
+
+    @property
+    def lower(self):
+        return self.lows.value
+
+
+class AverageTrueRange:
+    """ATR over the true ranges (high - low) of the days, as calcATR() takes them.
+
+    The last `length` days are kept, the ATR is taken over the oldest `n` of them, and only
+    over the true ranges between 0 and maxRange, NaN if there is none. The days before the
+    first one have a true range of 0.
+
+    With wilder the ATR is smoothed like Wilder's: once the window holds n valid true ranges
+    their mean is the start, after that every valid true range that comes into the window moves
+    the ATR by 1/n of the difference. Until then it is the plain mean.
+    """
+    def __init__(self, n, length = None, wilder = False, maxRange = 1000.0):
+        self.length = length or n
+        self.n = min(n, self.length)
+        self.wilder = wilder
+        self.maxRange = maxRange
+        self.ranges = collections.deque(self.length * [0.0], self.length)
+        self.total = 0.0
+        self.count = 0
+        self.updates = 0
+        self.smoothed = None
+        self.value = float("nan")
+
+    def _valid(self, TR):
+        return 0 < TR < self.maxRange
+
+    def append(self, TR):
+        # the oldest day leaves the window, the day n days later comes in
+        leaving = self.ranges[0]
+        entering = self.ranges[self.n] if self.n < self.length else TR
+        self.ranges.append(TR)
+        if self._valid(leaving):
+            self.total -= leaving
+            self.count -= 1
+        if self._valid(entering):
+            self.total += entering
+            self.count += 1
+        self.updates += 1
+        if self.updates == self.length:
+            self.total = math.fsum(TR for TR in list(self.ranges)[:self.n] if self._valid(TR))
+            self.updates = 0
+        elif not self.count:
+            self.total = 0.0
+        if self.smoothed is not None:
+            if self._valid(entering):
+                self.smoothed += (entering - self.smoothed) / self.n
+            self.value = self.smoothed
+        else:
+            self.value = self.total / self.count if self.count else float("nan")
+            if self.wilder and self.count == self.n:
+                self.smoothed = self.value
+        return self.value
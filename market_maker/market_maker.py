@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 from time import sleep
+import time
 import sys
 from datetime import datetime
 from os.path import getmtime
@@ -14,8 +15,12 @@ import numpy as np
 
 from market_maker import bitmex
 from market_maker.settings import settings
-from market_maker.utils import log, constants, errors
+from market_maker.utils import log, constants, errors, events
 from market_maker import getTradeHis 
+from market_maker import tickstore
+from market_maker import sweep
+from market_maker import indicators
+from market_maker import resultwriter
 
 
 
@@ -215,7 +220,7 @@ class OrderManager:
         # on any error.
 
 
-    def init(self):
+    def init(self, resultName = ""):
         if settings.DRY_RUN:
             logger.info("Initializing dry run. Orders printed below represent what would be posted to BitMEX.")
         elif settings.IS_BACKTESTING:
@@ -223,7 +228,13 @@ class OrderManager:
         else:
             logger.info("Order Manager initializing, connecting to BitMEX. Live run: executing real trades on " + settings.BASE_URL)
             
-        self.graficdata2 = open("grafic2.txt", "a", 1)
+        # resultName keeps the files of several managers apart, e.g. grafic2-XBTUSD
+        suffix = "-" + resultName if resultName else ""
+        # the live bot writes every record at once, like the line buffered grafic2.txt did
+        self.graficdata2 = resultwriter.ResultWriter(resultwriter.resultFile("grafic2" + suffix), resultwriter.GRAFIC2_COLUMNS,
+                                                     append = True, chunk = resultwriter.CHUNK if settings.IS_BACKTESTING else 1)
+        self.trades = resultwriter.ResultWriter(resultwriter.resultFile("trades" + suffix), resultwriter.TRADE_COLUMNS,
+                                                enabled = settings.IS_BACKTESTING and settings.RECORD_RESULTS)
 
         if not settings.IS_BACKTESTING:
             self.instrument = self.exchange.get_instrument()
@@ -245,6 +256,8 @@ class OrderManager:
         else:
             self.todayDate = settings.START_DATE
             self.startDate = settings.START_DATE
+            self.clockTime = ""
+            self.current_XBT = settings.START_BTCOIN
          
         # profit calculation
         self.totalprofit = 0.0
@@ -270,6 +283,7 @@ class OrderManager:
         self.lastBidSize = 0.0
         self.todayHighPrice = 0
         self.todayLowPrice = 10000.0
+        self.movingAveragePrice = 0.0
         
         # indicates if this is the first day of trading
         self.firstDay = True
@@ -307,10 +321,9 @@ class OrderManager:
             self.reset()
             
     def init_MeanAndHighLowPrices(self):
-        self.highPriceQueue = collections.deque(settings.DonchianN * [0], settings.ATRN)
-        self.lowPriceQueue = collections.deque(settings.DonchianN * [0], settings.ATRN)
+        self.initDayIndicators(settings.ATRN)
         
-        self.movingAvergePrices = collections.deque(settings.AVERGAGEDAY * [0], settings.AVERGAGEDAY)
+        self.movingAvergePrices = indicators.MovingAverage(settings.AVERGAGEDAY)
         self.movingAveragePrice = 0.0
         num = 0
         initQuoteBucketed = self.exchange.bitmex.quoteBucketedWithoutTime(self.exchange.symbol, settings.BACKTEST_PERIOD, 'true')
@@ -318,8 +331,7 @@ class OrderManager:
         self.lastAskPrice = initQuoteBucketed[size - 1]["askPrice"]
         self.lastBidPrice = initQuoteBucketed[size - 1]["bidPrice"]
         self.currentPrice = (self.lastAskPrice + self.lastBidPrice ) / 2
-        for i in range(0, settings.AVERGAGEDAY, 1):
-            self.movingAvergePrices.append(self.currentPrice)
+        self.movingAvergePrices.fill(self.currentPrice)
         #print("the following prices are in the movingAvergePrices:")
         for i in range(size-1, 0, -1):
             if (num % settings.AVERAGENUMPERIORD == 0):
@@ -327,10 +339,10 @@ class OrderManager:
                 self.lastBidPrice = initQuoteBucketed[i]["bidPrice"]
                 self.currentPrice = (self.lastAskPrice + self.lastBidPrice ) / 2
                 self.movingAvergePrices.append(self.currentPrice)
-                print(initQuoteBucketed[i]["timestamp"] + ("%.2f" % self.currentPrice))
+                events.emit(events.DEBUG, "init", initQuoteBucketed[i]["timestamp"], " %.2f", self.currentPrice)
                 #print(initQuoteBucketed[i]["timestamp"])
             num += 1
-        self.movingAveragePrice = np.mean(self.movingAvergePrices)    
+        self.movingAveragePrice = self.movingAvergePrices.value
         
         initQuoteBucketed = self.exchange.bitmex.quoteBucketed(self.exchange.symbol, settings.BACKTEST_PERIOD, self.startDate)
         size = len(initQuoteBucketed)
@@ -349,8 +361,7 @@ class OrderManager:
             dateindex = getTradeHis.getNextDay(dateindex)
             #print("Debug by Lu: " + dateindex)
             initTradeBucketed = self.exchange.bitmex.tradeBucketed(self.exchange.symbol, 1440, dateindex)
-            self.highPriceQueue.append(initTradeBucketed[0]["high"])
-            self.lowPriceQueue.append(initTradeBucketed[0]["low"])
+            self.appendDayHighLow(initTradeBucketed[0]["high"], initTradeBucketed[0]["low"])
             if dateindex == self.startDate:
                 break
   
@@ -364,8 +375,7 @@ class OrderManager:
     def init_Turtle(self):
         self.maxPreNhighPrice = 0.0
         self.minPreNlowPrice = 10000
-        self.highPriceQueue = collections.deque(settings.DonchianN * [0], settings.DonchianN)
-        self.lowPriceQueue = collections.deque(settings.DonchianN * [0], settings.DonchianN)
+        self.initDayIndicators(settings.DonchianN)
         self.ATR = 0
         self.UnitPosition = 0
         self.TurtlePos = 0 #could be -5 ~ +5
@@ -374,7 +384,7 @@ class OrderManager:
         self.unitPositions = []
         
     def init_MovingAverage_real(self):
-        print("Moving Average trading method is initialing")
+        events.emit(events.INFO, "init", self.eventTime(), ": Moving Average trading method is initialing")
         
         self.init_MeanAndHighLowPrices()
         
@@ -389,13 +399,12 @@ class OrderManager:
         self.maxPreNhighPrice = 0.0
         self.minPreNlowPrice = 10000
         
-        self.highPriceQueue = collections.deque(settings.DonchianN * [0], settings.DonchianN)
-        self.lowPriceQueue = collections.deque(settings.DonchianN * [0], settings.DonchianN)
+        self.initDayIndicators(settings.DonchianN)
         self.ATR = 0
         self.UnitPosition = 0
         self.TurtlePos = 0 #could be -5 ~ +5
         self.AddPrice = [0] * settings.ADDTIME
-        self.movingAvergePrices = collections.deque(settings.AVERGAGEDAY * [0], settings.AVERGAGEDAY)
+        self.movingAvergePrices = indicators.MovingAverage(settings.AVERGAGEDAY)
         self.movingAveragePrice = 0.0
         
         self.traderest = 0.0
@@ -408,7 +417,7 @@ class OrderManager:
         if nowbitcoin > 0:
             self.UPPERLIMITPOS = nowbitcoin * self.currentPrice * 2
             self.UNTERLIMITPOS = nowbitcoin * self.currentPrice * (-4)
-            print("UPPERLIMITPOS = %d, UNTERLIMITPOS = %d" % (self.UPPERLIMITPOS, self.UNTERLIMITPOS))
+            events.emit(events.DEBUG, "limit", self.eventTime(), ": UPPERLIMITPOS = %d, UNTERLIMITPOS = %d", self.UPPERLIMITPOS, self.UNTERLIMITPOS)
     
     def benifitCaculate(self):
         pricealpha = (self.endPrice_profit - self.startPrice_profit) / self.startPrice_profit
@@ -420,8 +429,7 @@ class OrderManager:
         BenifitinUSD = USDBenifit / (initBitcoin * self.initBitcoinPrice) * 100
         #self.baseBenifit = (self.endPrice_profit - self.initBitcoinPrice) / self.initBitcoinPrice * 100
         self.finalUSDBenifit = BenifitinUSD
-        print("%d XBTUSD settled, benifit: %.6f BT, total benifit: %.6f BT, Basebenifit: %.2f%% USDBenifit: %.2f%% %.2f USD" % (self.dynamic_position, eachtimebenifit, self.totalprofit, self.baseBenifit, BenifitinUSD, USDBenifit))
-        print(self.prevDayBacktest)
+        events.emit(events.INFO, "close", self.eventTime(), ": %d XBTUSD settled, benifit: %.6f BT, total benifit: %.6f BT, Basebenifit: %.2f%% USDBenifit: %.2f%% %.2f USD", self.dynamic_position, eachtimebenifit, self.totalprofit, self.baseBenifit, BenifitinUSD, USDBenifit)
         
     def benifitCaculatePos(self, pos, price):
         #print("benifitCaculatePos is called, startPrice_profit = %.2f" % self.startPrice_profit)
@@ -449,7 +457,7 @@ class OrderManager:
         self.finalUSDBenifit = BenifitinUSD
         #print("%d XBTUSD settled, benifit: %.6f BT, total benifit: %.6f BT, Basebenifit: %.2f%% USDBenifit: %.2f%% %.2f USD" % (pos, eachtimebenifit, self.totalprofit, self.baseBenifit, BenifitinUSD, USDBenifit))
         #print(self.prevDayBacktest)
-        print("平仓 %d, 本次利润%.4fBTC" %(pos,eachtimebenifit))
+        events.emit(events.INFO, "close", self.eventTime(), ": 平仓 %d, 本次利润%.4fBTC", pos,eachtimebenifit)
         
     def updateStartPriceProfit(self, newPrice, AddedPos):
         #print("newPrice = %.2f, Addedpos = %.2d, startPrice = %.2f, totalposition = %.2d, profit = " % (newPrice,AddedPos,self.startPrice_profit, self.dynamic_position))
@@ -464,6 +472,7 @@ class OrderManager:
                 pricealpha = (self.currentPrice - self.startPrice_profit) / self.startPrice_profit
                 self.unrealisedBitcoinBenifit = pricealpha / (1+pricealpha) * self.dynamic_position / self.startPrice_profit
                 nowBitcoin = self.unrealisedBitcoinBenifit + settings.START_BTCOIN + self.totalprofit
+                self.current_XBT = nowBitcoin
                 self.totalUSDbenifit = (nowBitcoin * self.currentPrice) / (settings.START_BTCOIN * self.initBitcoinPrice) * 100 - 100.0
                 self.unrealisedbenifit = self.totalUSDbenifit - self.finalUSDBenifit
     
@@ -471,6 +480,7 @@ class OrderManager:
                     self.bankrupt = True
             elif self.dynamic_position == 0:
                 nowBitcoin = settings.START_BTCOIN + self.totalprofit
+                self.current_XBT = nowBitcoin
                 self.totalUSDbenifit = (nowBitcoin * self.currentPrice) / (settings.START_BTCOIN * self.initBitcoinPrice) * 100 - 100.0
                 self.unrealisedbenifit = 0.0
                 #print("unrealisedbenifit = %.2f, finalUSDBenifit = %.2f" %(self.unrealisedbenifit,self.finalUSDBenifit))
@@ -478,37 +488,42 @@ class OrderManager:
             self.baseBenifit = (self.currentPrice - self.initBitcoinPrice) / self.initBitcoinPrice * 100
             self.totalUSDbenifit = (self.current_XBT * self.lastBidPrice - self.initNumOfXBT * self.initBitcoinPrice) / (self.initNumOfXBT * self.initBitcoinPrice) * 100.0
         
-    def lastDaysettlement(self, tradeline = " "): # on last day of backtest to make position to 0
+    def lastDaysettlement(self, tick): # on last day of backtest to make position to 0
         if self.dynamic_position > 0:
-            self.endPrice_profit = getTradeHis.getaskPriceFromLine(tradeline)
+            self.endPrice_profit = tick.askPrice
             self.benifitCaculatePos(self.dynamic_position,self.endPrice_profit)
+            pos = -self.dynamic_position
             self.dynamic_position = 0
+            self.recordTrade(tick.timestamp, pos, self.endPrice_profit)
         if self.dynamic_position < 0:
-            self.endPrice_profit = getTradeHis.getbidPriceFromLine(tradeline)
+            self.endPrice_profit = tick.bidPrice
             self.benifitCaculatePos(self.dynamic_position,self.endPrice_profit)
+            pos = -self.dynamic_position
             self.dynamic_position = 0
+            self.recordTrade(tick.timestamp, pos, self.endPrice_profit)
             
     
+    def initDayIndicators(self, length):
+        """Donchian channel and ATR over the highs and lows of the last `length` days"""
+        self.donchian = indicators.DonchianChannel(length)
+        self.averageTrueRange = indicators.AverageTrueRange(settings.ATRN, length, settings.ATR_WILDER)
+    
+    def appendDayHighLow(self, high, low):
+        self.donchian.append(high, low)
+        self.averageTrueRange.append(high - low)
+    
     def getPreNMaxMinPrice(self):
-        N = settings.DonchianN
-        maxP = 0
-        minP = 10000
-        for i in range(0,N):
-            if self.highPriceQueue[i]>maxP:
-                maxP = self.highPriceQueue[i]
-            if self.lowPriceQueue[i]<minP:
-                minP = self.lowPriceQueue[i]
-        #print("price in queue: %.2f, %.2f, %.2f, %.2f, %.2f" % (self.lowPriceQueue[0], self.lowPriceQueue[1], self.lowPriceQueue[2], self.lowPriceQueue[3], self.lowPriceQueue[4]))
-        self.maxPreNhighPrice = maxP
-        self.minPreNlowPrice = minP
-        
-    def is_newDay(self, tradeline = " "): 
+        self.maxPreNhighPrice = max(self.donchian.upper, 0)
+        self.minPreNlowPrice = min(self.donchian.lower, 10000)
+        
+    def is_newDay(self, tick = None): 
         if settings.IS_BACKTESTING:
-            nowDay = getTradeHis.getDateFromLine(tradeline)
+            nowDay = tick.date
             if nowDay != self.prevDayBacktest:
                 #print("new day: " + nowDay)
                 self.firstDay = False
                 self.prevDayBacktest = nowDay
+                self.todayDate = nowDay
                 return True
             else:
                 return False
@@ -687,29 +702,18 @@ class OrderManager:
             if pricealpha < -settings.ZHISHUN_PROZENT:
                 self.settlement(plastBidSize, plastBidPrice, plastAskPrice, plastAskSize)
                 if self.dynamic_position == 0:
-                    print("price has decreased more than 5%, sell all")
+                    events.emit(events.INFO, "stop", self.eventTime(), ": price has decreased more than 5%, sell all")
         if self.dynamic_position < 0:
             pricealpha = (plastPrice - self.startPrice_profit) / self.startPrice_profit
             if pricealpha > settings.ZHISHUN_PROZENT:
                 self.settlement(plastBidSize, plastBidPrice, plastAskPrice, plastAskSize)
                 if self.dynamic_position == 0:
-                    print("price has increased more than 5%, buy all")
+                    events.emit(events.INFO, "stop", self.eventTime(), ": price has increased more than 5%, buy all")
                     
     def calcATR(self):
-        N = settings.ATRN
-        TR_List = []
-        #TR_List_Str = ""
-        for i in range(0,N):
-            TR = self.highPriceQueue[i] - self.lowPriceQueue[i]
-            if TR > 0 and TR < 1000.0:
-                TR_List.append(TR)
-            #print("high = %.2f, low = %.2f, TR = %.2f" % (self.highPriceQueue[i], self.lowPriceQueue[i], TR))
-            #TR_List_Str += (str(round(TR,2))+" ")
-        ATR = np.array(TR_List).mean()
-        self.ATR = ATR
-        #TR_List_Str += ("ATR = " + str(self.ATR))
+        self.ATR = self.averageTrueRange.value
         #print("ATR = %.2f" % self.ATR)
-        #print(TR_List_Str)
+        return self.ATR
     
     
     def CalcUnit(self, nowPrice):  #   计算一个ATR单位的仓位
@@ -719,7 +723,7 @@ class OrderManager:
             X = self.current_XBT
         if self.ATR != 0:
             self.UnitPosition = int(abs(0.02 * X * nowPrice * (nowPrice + self.ATR) / self.ATR))
-        print(self.todayDate + (": bitcoin = %.4f today UnitPosition = %d, nowPrice = %.2f, ATR = %d, dynamicpostion = %d" % (X, self.UnitPosition, nowPrice, self.ATR, self.dynamic_position)))
+        events.emit(events.DEBUG, "unit", self.todayDate, ": bitcoin = %.4f today UnitPosition = %d, nowPrice = %.2f, ATR = %d, dynamicpostion = %d", X, self.UnitPosition, nowPrice, self.ATR, self.dynamic_position)
         
     def tradeTultle(self):
         sell_break = 0.0
@@ -731,7 +735,7 @@ class OrderManager:
                     self.AddPrice[0] = self.lastAskPrice + 0.5 * self.ATR                
                     self.TurtlePos += 1
                     self.startPrice_profit = self.lastAskPrice
-                    print(self.prevDayBacktest + (" 价格向上突破%.2f,建仓:%d, 建仓价为%.2f" %(self.maxPreNhighPrice, self.UnitPosition,self.startPrice_profit)))
+                    events.emit(events.INFO, "open", self.prevDayBacktest, " 价格向上突破%.2f,建仓:%d, 建仓价为%.2f", self.maxPreNhighPrice, self.UnitPosition,self.startPrice_profit)
             elif self.currentPrice < self.minPreNlowPrice:
                 traderesult = self.backtest_trade(self.UnitPosition, "sell")
                 if traderesult:
@@ -739,7 +743,7 @@ class OrderManager:
                     sellbreak = self.lastBidPrice - 0.5 * self.ATR
                     self.TurtlePos -= 1
                     self.startPrice_profit = self.lastAskPrice
-                    print(self.prevDayBacktest + (" 价格向下跌破%.2f,建仓:-%d, 建仓价为%.2f" %(self.minPreNlowPrice, self.UnitPosition, self.startPrice_profit)))
+                    events.emit(events.INFO, "open", self.prevDayBacktest, " 价格向下跌破%.2f,建仓:-%d, 建仓价为%.2f", self.minPreNlowPrice, self.UnitPosition, self.startPrice_profit)
         elif abs(self.TurtlePos) > 0:
             sell_break = self.AddPrice[abs(self.TurtlePos) - 1] - 2 * self.ATR
             buy_break = self.AddPrice[abs(self.TurtlePos) - 1] + 2 * self.ATR
@@ -749,7 +753,7 @@ class OrderManager:
                     traderesult = self.backtest_trade(abs(self.dynamic_position), "sell")
                     if traderesult:
                         self.TurtlePos = 0
-                        print(self.prevDayBacktest + (" 价格向下跌破N日最低价格触发止盈, 平仓价为%.2f" %(self.lastBidPrice)))
+                        events.emit(events.INFO, "close", self.prevDayBacktest, " 价格向下跌破N日最低价格触发止盈, 平仓价为%.2f", self.lastBidPrice)
                         self.benifitCaculatePos(pos, self.lastBidPrice)
                         return 0
                 if self.currentPrice < sell_break:
@@ -757,7 +761,7 @@ class OrderManager:
                     traderesult = self.backtest_trade(abs(self.dynamic_position), "sell")
                     if traderesult:
                         self.TurtlePos = 0
-                        print(self.prevDayBacktest + (" 价格向下跌破2ATR触发平仓, 平仓价为%.2f" %(self.lastBidPrice)))
+                        events.emit(events.INFO, "close", self.prevDayBacktest, " 价格向下跌破2ATR触发平仓, 平仓价为%.2f", self.lastBidPrice)
                         self.benifitCaculatePos(pos, self.lastBidPrice)
                         return 0
                 elif abs(self.TurtlePos) >= settings.ADDTIME:
@@ -768,14 +772,14 @@ class OrderManager:
                         self.AddPrice[abs(self.TurtlePos)] = self.AddPrice[abs(self.TurtlePos) - 1] + 0.5 * self.ATR
                         self.TurtlePos += 1
                         self.updateStartPriceProfit(self.lastAskPrice, self.UnitPosition)
-                        print(self.prevDayBacktest + (" 价格向上突破%.2f, 加仓 %d, 现仓位为%.d, 仓位均价%.2f" %(self.AddPrice[abs(self.TurtlePos) - 2],self.UnitPosition, self.dynamic_position, self.startPrice_profit)))
+                        events.emit(events.INFO, "add", self.prevDayBacktest, " 价格向上突破%.2f, 加仓 %d, 现仓位为%.d, 仓位均价%.2f", self.AddPrice[abs(self.TurtlePos) - 2],self.UnitPosition, self.dynamic_position, self.startPrice_profit)
             elif self.TurtlePos < 0:
                 if self.currentPrice > self.maxPreNhighPrice  or self.unrealisedbenifit > settings.ZHIYINGUSD:
                     pos = self.dynamic_position
                     traderesult = self.backtest_trade(abs(self.dynamic_position), "buy")
                     if traderesult:
                         self.TurtlePos = 0
-                        print(self.prevDayBacktest + (" 价格向上涨破N日最高价格触发平仓, 平仓价为%.2f" %(self.lastAskPrice)))
+                        events.emit(events.INFO, "close", self.prevDayBacktest, " 价格向上涨破N日最高价格触发平仓, 平仓价为%.2f", self.lastAskPrice)
                         self.benifitCaculatePos(pos, self.lastAskPrice)
                         return 0
                 if self.currentPrice > buy_break:
@@ -783,7 +787,7 @@ class OrderManager:
                     traderesult = self.backtest_trade(abs(self.dynamic_position), "buy")
                     if traderesult:
                         self.TurtlePos = 0
-                        print(self.prevDayBacktest + (" 价格向上涨破2ATR触发平仓, 平仓价为%.2f" %(self.lastAskPrice)))
+                        events.emit(events.INFO, "close", self.prevDayBacktest, " 价格向上涨破2ATR触发平仓, 平仓价为%.2f", self.lastAskPrice)
                         self.benifitCaculatePos(pos, self.lastAskPrice)
                         return 0
                 if abs(self.TurtlePos) >= settings.ADDTIME:
@@ -794,7 +798,7 @@ class OrderManager:
                         self.AddPrice[abs(self.TurtlePos)] = self.AddPrice[abs(self.TurtlePos) - 1] - 0.5 * self.ATR   
                         self.TurtlePos -= 1   
                         self.updateStartPriceProfit(self.lastBidPrice, (self.UnitPosition * (-1)))   
-                        print(self.prevDayBacktest + (" 价格向下突破%.2f, 卖出加仓 -%d, 现仓位为%.d, 仓位均价%.2f" %(self.AddPrice[abs(self.TurtlePos) - 2],self.UnitPosition,self.dynamic_position, self.startPrice_profit)))
+                        events.emit(events.INFO, "add", self.prevDayBacktest, " 价格向下突破%.2f, 卖出加仓 -%d, 现仓位为%.d, 仓位均价%.2f", self.AddPrice[abs(self.TurtlePos) - 2],self.UnitPosition,self.dynamic_position, self.startPrice_profit)
    
     def tradeMovingAverage(self):
         sell_break = 0.0
@@ -808,7 +812,7 @@ class OrderManager:
                 if abs(successTrade)>0:
                     self.AddPrice[0] = self.lastAskPrice + 0.5 * self.ATR                
                     self.TurtlePos += 1
-                    print(self.prevDayBacktest + (" 价格向上突破均线%.2f,建仓:%d, 建仓价为%.2f" %(self.movingAveragePrice, self.UnitPosition,self.startPrice_profit)))
+                    events.emit(events.INFO, "open", self.prevDayBacktest, " 价格向上突破均线%.2f,建仓:%d, 建仓价为%.2f", self.movingAveragePrice, self.UnitPosition,self.startPrice_profit)
             elif self.currentPrice < self.movingAveragePrice:
                 nowBitcoin = settings.START_BTCOIN + self.totalprofit
                 shortFirstPos = self.UnitPosition * (-1) - self.currentPrice * nowBitcoin
@@ -817,7 +821,7 @@ class OrderManager:
                 if abs(successTrade)>0:
                     self.AddPrice[0] = self.lastBidPrice - 0.5 * self.ATR
                     self.TurtlePos -= 1
-                    print(self.prevDayBacktest + (" 价格向下跌破均线%.2f,建仓:-%d, 建仓价为%.2f" %(self.movingAveragePrice, self.UnitPosition, self.startPrice_profit)))
+                    events.emit(events.INFO, "open", self.prevDayBacktest, " 价格向下跌破均线%.2f,建仓:-%d, 建仓价为%.2f", self.movingAveragePrice, self.UnitPosition, self.startPrice_profit)
         elif abs(self.TurtlePos) > 0:
             sell_break = self.AddPrice[abs(self.TurtlePos) - 1] - 2 * self.ATR
             buy_break = self.AddPrice[abs(self.TurtlePos) - 1] + 2 * self.ATR
@@ -828,7 +832,7 @@ class OrderManager:
                     successTrade = pos * (-1) - traderest
                     if abs(successTrade) > 0:
                         self.TurtlePos = 0
-                        print(self.prevDayBacktest + (" 价格向下跌破均线/2ATR触发止盈/平仓, 平仓价为%.2f" %(self.lastBidPrice)))
+                        events.emit(events.INFO, "close", self.prevDayBacktest, " 价格向下跌破均线/2ATR触发止盈/平仓, 平仓价为%.2f", self.lastBidPrice)
                         return traderest
                 elif abs(self.TurtlePos) >= settings.ADDTIME:
                     return traderest
@@ -842,7 +846,7 @@ class OrderManager:
                     if abs(successTrade) > 0.00:
                         self.AddPrice[abs(self.TurtlePos)] = self.AddPrice[abs(self.TurtlePos) - 1] + 0.5 * self.ATR
                         self.TurtlePos += 1
-                        print(self.prevDayBacktest + (" 价格向上突破%.2f, 加仓 %d, 现仓位为%.d, 仓位均价%.2f" %(self.AddPrice[abs(self.TurtlePos) - 2],self.UnitPosition, self.dynamic_position, self.startPrice_profit)))
+                        events.emit(events.INFO, "add", self.prevDayBacktest, " 价格向上突破%.2f, 加仓 %d, 现仓位为%.d, 仓位均价%.2f", self.AddPrice[abs(self.TurtlePos) - 2],self.UnitPosition, self.dynamic_position, self.startPrice_profit)
             elif self.TurtlePos < 0:
                 if self.currentPrice > self.movingAveragePrice  or self.currentPrice > buy_break or self.unrealisedbenifit >= settings.ZHIYINGUSD:
                     pos = self.dynamic_position
@@ -850,7 +854,7 @@ class OrderManager:
                     successTrade = abs(pos) - traderest
                     if abs(successTrade) > 0.0:
                         self.TurtlePos = 0
-                        print(self.prevDayBacktest + (" 价格向上涨破均价/2ATR触发平仓, 平仓价为%.2f" %(self.lastAskPrice)))
+                        events.emit(events.INFO, "close", self.prevDayBacktest, " 价格向上涨破均价/2ATR触发平仓, 平仓价为%.2f", self.lastAskPrice)
                         return traderest
                 if abs(self.TurtlePos) >= settings.ADDTIME:
                     return traderest
@@ -864,7 +868,7 @@ class OrderManager:
                     if abs(successTrade) > 0:
                         self.AddPrice[abs(self.TurtlePos)] = self.AddPrice[abs(self.TurtlePos) - 1] - 0.5 * self.ATR   
                         self.TurtlePos -= 1   
-                        print(self.prevDayBacktest + (" 价格向下突破%.2f, 卖出加仓 -%d, 现仓位为%.d, 仓位均价%.2f" %(self.AddPrice[abs(self.TurtlePos) - 2],self.UnitPosition,self.dynamic_position, self.startPrice_profit)))   
+                        events.emit(events.INFO, "add", self.prevDayBacktest, " 价格向下突破%.2f, 卖出加仓 -%d, 现仓位为%.d, 仓位均价%.2f", self.AddPrice[abs(self.TurtlePos) - 2],self.UnitPosition,self.dynamic_position, self.startPrice_profit)
         return traderest   
     
     def tradeMovingAverage_real(self):
@@ -876,20 +880,20 @@ class OrderManager:
                 self.tradeTheRest_real(self.UnitPosition)
                 self.AddPrice[0] = self.lastAskPrice + 0.5 * self.ATR                
                 self.TurtlePos += 1
-                print(self.todayDate + self.clockTime + (": 价格向上突破均线%.2f,建仓:%d, 建仓价为%.2f" %(self.movingAveragePrice, self.UnitPosition,self.lastAskPrice)))
+                events.emit(events.INFO, "open", self.todayDate + self.clockTime, ": 价格向上突破均线%.2f,建仓:%d, 建仓价为%.2f", self.movingAveragePrice, self.UnitPosition,self.lastAskPrice)
             elif self.currentPrice < self.movingAveragePrice:
                 shortFirstPos = self.UnitPosition * (-1) - self.currentPrice * self.current_XBT * 2
                 self.tradeTheRest_real(shortFirstPos)
                 self.AddPrice[0] = self.lastBidPrice - 0.5 * self.ATR
                 self.TurtlePos -= 1
-                print(self.todayDate + self.clockTime + (": 价格向下跌破均线%.2f,建仓:-%d, 建仓价为%.2f" %(self.movingAveragePrice, shortFirstPos, self.lastBidPrice)))
+                events.emit(events.INFO, "open", self.todayDate + self.clockTime, ": 价格向下跌破均线%.2f,建仓:-%d, 建仓价为%.2f", self.movingAveragePrice, shortFirstPos, self.lastBidPrice)
         elif abs(self.dynamic_position) > 0:
             sell_break = self.AddPrice[abs(self.TurtlePos) - 1] - self.ATR
             buy_break = self.AddPrice[abs(self.TurtlePos) - 1] + self.ATR
             if self.dynamic_position > 0:
                 if self.currentPrice < self.movingAveragePrice or self.currentPrice < sell_break:
                     self.sellorbuyAll()
-                    print(self.todayDate + self.clockTime + (": 价格向下跌破均线/2ATR触发止盈/平仓, 平仓价为%.2f" %(self.lastBidPrice)))
+                    events.emit(events.INFO, "close", self.todayDate + self.clockTime, ": 价格向下跌破均线/2ATR触发止盈/平仓, 平仓价为%.2f", self.lastBidPrice)
                     return 0
                 elif abs(self.TurtlePos) >= settings.ADDTIME:
                     return 0
@@ -901,12 +905,12 @@ class OrderManager:
                     self.tradeTheRest_real(self.UnitPosition)
                     self.AddPrice[abs(self.TurtlePos)] = self.AddPrice[abs(self.TurtlePos) - 1] + 0.5 * self.ATR
                     self.TurtlePos += 1
-                    print(self.todayDate + self.clockTime +  (": 价格向上突破%.2f, 加仓 %d, 现仓位为%.d, 仓位均价%.2f" %(self.AddPrice[abs(self.TurtlePos) - 2],self.UnitPosition, self.dynamic_position, self.lastAskPrice)))
+                    events.emit(events.INFO, "add", self.todayDate + self.clockTime, ": 价格向上突破%.2f, 加仓 %d, 现仓位为%.d, 仓位均价%.2f", self.AddPrice[abs(self.TurtlePos) - 2],self.UnitPosition, self.dynamic_position, self.lastAskPrice)
             elif self.dynamic_position < 0:
                 if self.currentPrice > self.movingAveragePrice  or self.currentPrice > buy_break :
                     pos = self.dynamic_position
                     self.sellorbuyAll()
-                    print(self.todayDate + self.clockTime + (" 价格向上涨破均价/2ATR触发平仓, 平仓价为%.2f" %(self.lastAskPrice)))
+                    events.emit(events.INFO, "close", self.todayDate + self.clockTime, " 价格向上涨破均价/2ATR触发平仓, 平仓价为%.2f", self.lastAskPrice)
                     return 0
                 if abs(self.TurtlePos) >= settings.ADDTIME:
                     return 0
@@ -918,7 +922,7 @@ class OrderManager:
                     self.tradeTheRest_real(-self.UnitPosition)
                     self.AddPrice[abs(self.TurtlePos)] = self.AddPrice[abs(self.TurtlePos) - 1] - 0.5 * self.ATR   
                     self.TurtlePos -= 1   
-                    print(self.todayDate + self.clockTime + (" 价格向下突破%.2f, 卖出加仓 -%d, 现仓位为%.d, 仓位均价%.2f" %(self.AddPrice[abs(self.TurtlePos) - 2],self.UnitPosition,self.dynamic_position, self.lastBidPrice)))   
+                    events.emit(events.INFO, "add", self.todayDate + self.clockTime, " 价格向下突破%.2f, 卖出加仓 -%d, 现仓位为%.d, 仓位均价%.2f", self.AddPrice[abs(self.TurtlePos) - 2],self.UnitPosition,self.dynamic_position, self.lastBidPrice)
         return 0   
         
     def backtest_trade_rest(self, pos,dir = "buy"):   #trade in market price
@@ -988,20 +992,20 @@ class OrderManager:
                 if pos > self.lastAskSize:
                     pos = self.lastAskSize
                 price = self.lastAskPrice
-                print(self.todayDate + self.clockTime + ("buy %d with price %.2f" % (pos, price)))
+                events.emit(events.INFO, "order", self.todayDate + self.clockTime, "buy %d with price %.2f", pos, price)
                 self.exchange.bitmex.buy(int(pos), price) 
             elif pos < 0:
                 pos = -pos
                 if pos > self.lastBidPrice:
                     pos = self.lastBidPrice
                 price = self.lastBidPrice
-                print(self.todayDate + self.clockTime + ("sell %d with price %.2f" % (pos, price)))
+                events.emit(events.INFO, "order", self.todayDate + self.clockTime, "sell %d with price %.2f", pos, price)
                 self.exchange.bitmex.sell(int(pos), price)
             sleep(1)
             self.cancel_openorders()
             sleep(1)
             self.dynamic_position = self.exchange.get_delta()
-            print(self.todayDate + self.clockTime + ("after the buy or sell, now we have dynamic_postion = %d" % (self.dynamic_position)))
+            events.emit(events.INFO, "order", self.todayDate + self.clockTime, "after the buy or sell, now we have dynamic_postion = %d", self.dynamic_position)
         return True
     
     def sellorbuyAll(self): # 平仓 
@@ -1015,18 +1019,17 @@ class OrderManager:
         self.cancel_openorders()
         self.TurtlePos = 0
     
-    def handle_trade_Turtle_backtest(self, tradeline = " "):
+    def handle_trade_Turtle_backtest(self, tick):
         #logger.info('Debug by Lu: handle_trade_Turtle_backtest is called')   
         if self.firstTime:
             self.todayHighPrice = 0
             self.todayLowPrice = 10000
-            self.initBitcoinPrice = getTradeHis.getPrevClosePriceFromLine(tradeline)
+            self.initBitcoinPrice = tick.closePrice
             #self.firstTime = False
         
-        if self.is_newDay(tradeline):
-            self.highPriceQueue.append(self.todayHighPrice)
-            self.lowPriceQueue.append(self.todayLowPrice)
-            self.prevClosePrice = getTradeHis.getPrevClosePriceFromLine(tradeline)
+        if self.is_newDay(tick):
+            self.appendDayHighLow(self.todayHighPrice, self.todayLowPrice)
+            self.prevClosePrice = tick.closePrice
             self.prevHighPrice = self.todayHighPrice
             self.prevLowPrice = self.todayLowPrice
             self.todayHighPrice = self.prevClosePrice
@@ -1037,10 +1040,10 @@ class OrderManager:
             self.CalcUnit(self.prevClosePrice)
             
      
-        lastAskPrice = getTradeHis.getbidPriceFromLine(tradeline)
-        lastBidPrice = getTradeHis.getaskPriceFromLine(tradeline)
-        lastAskSize = getTradeHis.getaskSizeFromLine(tradeline)
-        lastBidSize = getTradeHis.getbidSizeFromLine(tradeline)
+        lastAskPrice = tick.bidPrice
+        lastBidPrice = tick.askPrice
+        lastAskSize = tick.askSize
+        lastBidSize = tick.bidSize
         
         if lastBidPrice < 0 or lastAskPrice < 0: # both of the prices are none
             return 0
@@ -1064,7 +1067,7 @@ class OrderManager:
         #print("lastPrice = %.2f, preCurrentPrice = %.2f" %(lastPrice, self.preCurrentPrice))
         if abs(lastPrice - self.preCurrentPrice) > settings.RESONABLE_PRICE_STEP:
             #数据无效,filter the unresonable pricegap
-            print(self.prevDayBacktest + "价格异常变动，跳过此次交易，请查看！！！！！！！！！")
+            events.emit(events.WARNING, "filtered", self.prevDayBacktest, "价格异常变动，跳过此次交易，请查看！！！！！！！！！")
             return 0
         
         self.preCurrentPrice = self.currentPrice
@@ -1081,24 +1084,21 @@ class OrderManager:
             #self.Zhishun(lastPrice, lastBidSize, lastBidPrice, lastAskPrice, lastAskSize)
             self.tradeTultle()
 
-    def handle_movingaverage_backtest(self, tradeline = " "):
+    def handle_movingaverage_backtest(self, tick):
         #logger.info('Debug by Lu: handle_trade_Turtle_backtest is called')   
         if self.firstTime:
             self.todayHighPrice = 0
             self.todayLowPrice = 10000
-            self.initBitcoinPrice = getTradeHis.getPrevClosePriceFromLine(tradeline)
+            self.initBitcoinPrice = tick.closePrice
             self.prevClosePrice = self.initBitcoinPrice
-            for i in range(0,settings.AVERGAGEDAY):
-                self.movingAvergePrices.append(self.initBitcoinPrice)
+            self.movingAvergePrices.fill(self.initBitcoinPrice)
             
             #self.firstTime = False
-        Is_newDay = self.is_newDay(tradeline)
+        Is_newDay = self.is_newDay(tick)
         if Is_newDay:
-            self.highPriceQueue.append(self.todayHighPrice)
-            self.lowPriceQueue.append(self.todayLowPrice)
-            self.prevClosePrice = getTradeHis.getPrevClosePriceFromLine(tradeline)
-            self.movingAvergePrices.append(self.prevClosePrice)
-            self.movingAveragePrice = np.mean(self.movingAvergePrices)
+            self.appendDayHighLow(self.todayHighPrice, self.todayLowPrice)
+            self.prevClosePrice = tick.closePrice
+            self.movingAveragePrice = self.movingAvergePrices.append(self.prevClosePrice)
             self.prevHighPrice = self.todayHighPrice
             self.prevLowPrice = self.todayLowPrice
             self.todayHighPrice = self.prevClosePrice
@@ -1111,12 +1111,12 @@ class OrderManager:
             self.traderest = 0.0
             
      
-        lastAskPrice = getTradeHis.getbidPriceFromLine(tradeline)
-        lastBidPrice = getTradeHis.getaskPriceFromLine(tradeline)
-        lastAskSize = getTradeHis.getaskSizeFromLine(tradeline)
-        lastBidSize = getTradeHis.getbidSizeFromLine(tradeline)
+        lastAskPrice = tick.bidPrice
+        lastBidPrice = tick.askPrice
+        lastAskSize = tick.askSize
+        lastBidSize = tick.bidSize
         
-        if getTradeHis.IsThereANone(tradeline):
+        if tick.hasNone:
             return 0
         
         if abs(lastAskPrice - lastBidPrice) > settings.RESONABLE_PRICE_GAP:
@@ -1138,7 +1138,7 @@ class OrderManager:
         #print("lastPrice = %.2f, preCurrentPrice = %.2f" %(lastPrice, self.preCurrentPrice))
         if abs(lastPrice - self.preCurrentPrice) > settings.RESONABLE_PRICE_STEP:
             #数据无效,filter the unresonable pricegap
-            print(self.prevDayBacktest + "价格异常变动，跳过此次交易，请查看！！！！！！！！！")
+            events.emit(events.WARNING, "filtered", self.prevDayBacktest, "价格异常变动，跳过此次交易，请查看！！！！！！！！！")
             return 0
         
         self.preCurrentPrice = self.currentPrice
@@ -1160,22 +1160,20 @@ class OrderManager:
         elif abs(self.traderest) > 0.01:
             self.traderest = self.tradeTheRest(self.traderest)
 
-    def handle_movingaverage_5_backtest(self, tradeline = " "):
+    def handle_movingaverage_5_backtest(self, tick):
         #logger.info('Debug by Lu: handle_trade_Turtle_backtest is called')   
         if self.firstTime:
             self.todayHighPrice = 0
             self.todayLowPrice = 10000
-            self.initBitcoinPrice = getTradeHis.getPrevClosePriceFromLine(tradeline)
+            self.initBitcoinPrice = tick.closePrice
             self.prevClosePrice = self.initBitcoinPrice
-            for i in range(0,settings.AVERGAGEDAY):
-                self.movingAvergePrices.append(self.initBitcoinPrice)
+            self.movingAvergePrices.fill(self.initBitcoinPrice)
             
             #self.firstTime = False
-        Is_newDay = self.is_newDay(tradeline)
+        Is_newDay = self.is_newDay(tick)
         if Is_newDay:
-            self.highPriceQueue.append(self.todayHighPrice)
-            self.lowPriceQueue.append(self.todayLowPrice)
-            self.prevClosePrice = getTradeHis.getPrevClosePriceFromLine(tradeline)
+            self.appendDayHighLow(self.todayHighPrice, self.todayLowPrice)
+            self.prevClosePrice = tick.closePrice
             self.prevHighPrice = self.todayHighPrice
             self.prevLowPrice = self.todayLowPrice
             self.todayHighPrice = self.prevClosePrice
@@ -1187,12 +1185,12 @@ class OrderManager:
             self.traderest = 0.0
             
      
-        lastAskPrice = getTradeHis.getbidPriceFromLine(tradeline)
-        lastBidPrice = getTradeHis.getaskPriceFromLine(tradeline)
-        lastAskSize = getTradeHis.getaskSizeFromLine(tradeline)
-        lastBidSize = getTradeHis.getbidSizeFromLine(tradeline)
+        lastAskPrice = tick.bidPrice
+        lastBidPrice = tick.askPrice
+        lastAskSize = tick.askSize
+        lastBidSize = tick.bidSize
         
-        if getTradeHis.IsThereANone(tradeline):
+        if tick.hasNone:
             return 0
         
         if abs(lastAskPrice - lastBidPrice) > settings.RESONABLE_PRICE_GAP:
@@ -1214,7 +1212,7 @@ class OrderManager:
         #print("lastPrice = %.2f, preCurrentPrice = %.2f" %(lastPrice, self.preCurrentPrice))
         if abs(lastPrice - self.preCurrentPrice) > settings.RESONABLE_PRICE_STEP:
             #数据无效,filter the unresonable pricegap
-            print(self.prevDayBacktest + "价格异常变动，跳过此次交易，请查看！！！！！！！！！")
+            events.emit(events.WARNING, "filtered", self.prevDayBacktest, "价格异常变动，跳过此次交易，请查看！！！！！！！！！")
             return 0
         
         self.preCurrentPrice = self.currentPrice
@@ -1223,8 +1221,8 @@ class OrderManager:
         self.simulateTimeNumbers = (self.simulateTimeNumbers + 1) % settings.AVERAGENUMPERIORD
         
         if (self.simulateTimeNumbers == 0):
-            self.movingAvergePrices.append(self.currentPrice)
-            self.movingAveragePrice = np.mean(self.movingAvergePrices)
+            self.movingAveragePrice = self.movingAvergePrices.append(self.currentPrice)
+            self.clockTime = tick.timestamp[10:]
             self.recordbenifit2()
         
         if lastPrice > self.todayHighPrice:
@@ -1278,8 +1276,7 @@ class OrderManager:
             self.todayLowPrice = lastPrice
             
         if (self.simulateTimeNumbers == 0):
-            self.movingAvergePrices.append(self.currentPrice)
-            self.movingAveragePrice = np.mean(self.movingAvergePrices)
+            self.movingAveragePrice = self.movingAvergePrices.append(self.currentPrice)
         
         return True
     
@@ -1295,7 +1292,7 @@ class OrderManager:
         self.margin = self.exchange.get_margin()
         self.dynamic_position = self.exchange.get_delta()
         self.current_XBT = self.margin["marginBalance"] / 100000000.0
-        print(self.todayDate + self.clockTime + (": dynamic_position = %d, start_XBt = %.8f, currentPrice = %.2f, averagePrice = %.2f" % (self.dynamic_position, self.current_XBT, self.currentPrice, self.movingAveragePrice)))
+        events.emit(events.INFO, "status", self.todayDate + self.clockTime, ": dynamic_position = %d, start_XBt = %.8f, currentPrice = %.2f, averagePrice = %.2f", self.dynamic_position, self.current_XBT, self.currentPrice, self.movingAveragePrice)
         if self.firstTime:
             self.initBitcoinPrice = self.currentQuote[0]["bidPrice"]
             self.initNumOfXBT = self.current_XBT
@@ -1305,11 +1302,10 @@ class OrderManager:
             self.updatePositionLimit()
             
             #self.firstTime = False
-        Is_newDay = self.is_newDay(tradeline)
+        Is_newDay = self.is_newDay()
         if Is_newDay:
             self.currentTradeBucketed = self.exchange.bitmex.tradeBucketed(self.exchange.symbol, 1440, self.todayDate)
-            self.highPriceQueue.append(self.todayHighPrice)
-            self.lowPriceQueue.append(self.todayLowPrice)
+            self.appendDayHighLow(self.todayHighPrice, self.todayLowPrice)
             self.prevClosePrice = self.currentPrice
             self.prevHighPrice = self.todayHighPrice
             self.prevLowPrice = self.todayLowPrice
@@ -1331,7 +1327,7 @@ class OrderManager:
         self.recordbenifit2()
 
 
-    def handle_trade_R_Breaker_backtest(self, tradeline = " "):
+    def handle_trade_R_Breaker_backtest(self, tick):
         #logger.info('Debug by Lu: handle_trade_R_Breaker is called')   
         buy_orders = []
         sell_orders = []
@@ -1341,11 +1337,11 @@ class OrderManager:
         if self.firstTime:
             self.todayHighPrice = 0
             self.todayLowPrice = 10000
-            self.initBitcoinPrice = getTradeHis.getPrevClosePriceFromLine(tradeline)
+            self.initBitcoinPrice = tick.closePrice
             self.firstTime = False
         
-        if self.is_newDay(tradeline):
-            self.prevClosePrice = getTradeHis.getPrevClosePriceFromLine(tradeline)
+        if self.is_newDay(tick):
+            self.prevClosePrice = tick.closePrice
             self.prevHighPrice = self.todayHighPrice
             self.prevLowPrice = self.todayLowPrice
             self.buy_setup = self.prevLowPrice - self.f1 * (self.prevHighPrice - self.prevClosePrice)
@@ -1354,8 +1350,8 @@ class OrderManager:
             self.sell_enter = (1 + self.f2)/2 * (self.prevHighPrice + self.prevLowPrice) - self.f2 * self.prevLowPrice
             self.buy_break = self.sell_setup + self.f3 * (self.sell_setup - self.buy_setup)
             self.sell_break = self.buy_setup - self.f3 * (self.sell_setup - self.buy_setup)
-            print('prevClosePrice: %.2f, prevHighPrice: %.2f, prevLowPrice: %.2f' %(self.prevClosePrice, self.prevHighPrice,self.prevLowPrice))
-            print('buy_break: %.2f, sell_setup: %.2f, sell_enter: %.2f, buy_enter: %.2f, buy_setup: %.2f, sell_break: %.2f' %(self.buy_break, self.sell_setup, self.sell_enter, self.buy_enter, self.buy_setup, self.sell_break))
+            events.emit(events.DEBUG, "levels", self.eventTime(), ": prevClosePrice: %.2f, prevHighPrice: %.2f, prevLowPrice: %.2f", self.prevClosePrice, self.prevHighPrice,self.prevLowPrice)
+            events.emit(events.DEBUG, "levels", self.eventTime(), ": buy_break: %.2f, sell_setup: %.2f, sell_enter: %.2f, buy_enter: %.2f, buy_setup: %.2f, sell_break: %.2f", self.buy_break, self.sell_setup, self.sell_enter, self.buy_enter, self.buy_setup, self.sell_break)
             
             self.todayHighPrice = self.prevClosePrice
             self.todayLowPrice = self.prevClosePrice
@@ -1368,10 +1364,10 @@ class OrderManager:
             #self.sell_break = self.prevLowPrice - 2 * (self.prevHighPrice - self.Pivot)
             #logger.info('Debug_by_Lu: buy_break: %.2f, sell_setup: %.2f, sell_enter: %.2f, buy_enter: %.2f, buy_setup: %.2f, sell_break: %.2f' %(self.buy_break, self.sell_setup, self.sell_enter, self.buy_enter, self.buy_setup, self.sell_break))
                 
-        lastAskPrice = getTradeHis.getbidPriceFromLine(tradeline)
-        lastBidPrice = getTradeHis.getaskPriceFromLine(tradeline)
-        lastAskSize = getTradeHis.getaskSizeFromLine(tradeline)
-        lastBidSize = getTradeHis.getbidSizeFromLine(tradeline)
+        lastAskPrice = tick.bidPrice
+        lastBidPrice = tick.askPrice
+        lastAskSize = tick.askSize
+        lastBidSize = tick.bidSize
         if abs(lastAskPrice - lastBidPrice) > settings.RESONABLE_PRICE_GAP:
             #数据无效,filter the unresonable pricegap
             return 0
@@ -1660,7 +1656,7 @@ class OrderManager:
 
     def exit(self):
         logger.info("Shutting down. All open orders will be cancelled.")
-        self.graficdata2.close()
+        self.closeResults()
         try:
             self.exchange.cancel_all_orders()
             self.exchange.bitmex.exit()
@@ -1689,81 +1685,87 @@ class OrderManager:
             self.handle_trade()  # this function will replace the place_orders()
             sleep(settings.LOOP_INTERVAL)
             #self.place_orders()  # Creates desired orders and converges to existing orders
-        self.graficdata2.close()
+        self.closeResults()
             
-    def recordbenifit(self, file):
-        #file.write(str("%.2f" % self.baseBenifit))
-        file.write(str("%.2f" % self.prevClosePrice))
-        file.write(" ")
-        file.write(str("%.2f" % self.totalUSDbenifit))
-        file.write(" ")
-        file.write(str("%d" % self.dynamic_position))
-        file.write(" ")
-        file.write(str("%.2f" % self.movingAveragePrice))
-        file.write(" ")
-        file.write(str("%.2f" % self.baseBenifit))
-        file.write("\n")
+    def recordbenifit(self, results):
+        """One record of the day to a ResultWriter of GRAFIC_COLUMNS"""
+        results.append(self.prevClosePrice, self.totalUSDbenifit, self.dynamic_position, self.movingAveragePrice, self.baseBenifit)
             
     def recordbenifit2(self):
-        #file.write(str("%.2f" % self.baseBenifit))
-        self.graficdata2.write(str("%.2f" % self.currentPrice))
-        self.graficdata2.write(" ")
-        self.graficdata2.write(str("%.2f" % self.totalUSDbenifit))
-        self.graficdata2.write(" ")
-        self.graficdata2.write(str("%d" % self.dynamic_position))
-        self.graficdata2.write(" ")
-        self.graficdata2.write(str("%.2f" % self.movingAveragePrice))
-        self.graficdata2.write(" ")
-        self.graficdata2.write(str("%.2f" % self.baseBenifit))
-        self.graficdata2.write(" ")
-        self.graficdata2.write(self.todayDate + self.clockTime)
-        self.graficdata2.write(" ")
-        self.graficdata2.write(str("%.2f" % (self.currentPrice * self.current_XBT)))
-        self.graficdata2.write("\n")
+        self.graficdata2.append(self.currentPrice, self.totalUSDbenifit, self.dynamic_position, self.movingAveragePrice,
+                                self.baseBenifit, self.todayDate + self.clockTime, self.currentPrice * self.current_XBT)
+    
+    def eventTime(self):
+        """The time of the events of the strategy: the day in a backtest, the day and clock time live"""
+        if settings.IS_BACKTESTING:
+            return self.prevDayBacktest
+        return self.todayDate + self.clockTime
     
+    def recordTrade(self, time, pos, price = None):
+        """pos bought (> 0) or sold (< 0) at price, the ask or bid price by default, after the trade is done"""
+        if price is None:
+            price = self.lastAskPrice if pos > 0 else self.lastBidPrice
+        self.trades.append(time, pos, price, self.dynamic_position, self.totalprofit)
+    
+    def closeResults(self):
+        self.graficdata2.close()
+        self.trades.close()
+    
+    def backtestHandler(self):
+        """The backtest tick handler of settings.STRATEGY, it records the trades of a tick if RECORD_RESULTS"""
+        if settings.STRATEGY == "R_Breaker":
+            handler = self.handle_trade_R_Breaker_backtest
+        elif settings.STRATEGY == "Turtle":
+            handler = self.handle_trade_Turtle_backtest
+        elif settings.STRATEGY == "MovingAverage":
+            #handler = self.handle_movingaverage_backtest
+            handler = self.handle_movingaverage_5_backtest
+        else:
+            return None
+        if not self.trades.enabled:
+            return handler
+        def handleTick(tick):
+            position = self.dynamic_position
+            handler(tick)
+            if self.dynamic_position != position:
+                self.recordTrade(tick.timestamp, self.dynamic_position - position)
+        return handleTick
+
+    def markToMarket(self):
+        """USD benifit in percent with the open position valued at the current price"""
+        # R-Breaker doesn't keep currentPrice
+        price = self.currentPrice or (self.lastAskPrice + self.lastBidPrice) / 2
+        if self.initBitcoinPrice == 0 or price == 0:
+            return 0.0
+        nowBitcoin = settings.START_BTCOIN + self.totalprofit
+        if self.dynamic_position != 0 and self.startPrice_profit != 0:
+            pricealpha = (price - self.startPrice_profit) / self.startPrice_profit
+            nowBitcoin += pricealpha / (1+pricealpha) * self.dynamic_position / self.startPrice_profit
+        return (nowBitcoin * price) / (settings.START_BTCOIN * self.initBitcoinPrice) * 100 - 100.0
+
     def run_backtesting(self):
         logger.info("Start backtesting from date: " + settings.START_DATE + " to date: " + settings.END_DATE)
-        recorddata = open(settings.BACKTESTFILE,"r")
-        graficdata = open("grafic.txt", "w")
-        dateindex = settings.START_DATE
-        number_per_day = 1440 // settings.BACKTEST_PERIOD
-        line = " " 
-        while True:
-            line = recorddata.readline()
-            date = getTradeHis.getDateFromLine(line)
-            if date == dateindex:
-                break
-        while True:
-            for i in range(0,number_per_day):
-                line = recorddata.readline()
-                if not line:
-                    break
-                if settings.STRATEGY == "R_Breaker":
-                    self.handle_trade_R_Breaker_backtest(line)
-                if settings.STRATEGY == "Turtle":
-                    self.handle_trade_Turtle_backtest(line)
-                if settings.STRATEGY == "MovingAverage":
-                    #self.handle_movingaverage_backtest(line)
-                    self.handle_movingaverage_5_backtest(line)
-                    
-            dateindex = getTradeHis.getNextDay(dateindex)
+        days = backtestDays(settings.BACKTESTFILE)
+        graficdata = resultwriter.ResultWriter(resultwriter.resultFile("grafic"), resultwriter.GRAFIC_COLUMNS)
+        handle_tick = self.backtestHandler()
+        tick = None
+        for date, ticks in days:
+            for tick in ticks:
+                handle_tick(tick)
             # write the benifit comparision
-            
             self.recordbenifit(graficdata)
     
             if self.bankrupt:
                 print("you are bankrupt now!!!!!!")
                 break
-
-            if getTradeHis.is_datefinished(dateindex,settings.END_DATE):
-                self.lastDaysettlement(line)
+        else:
+            if tick is not None:
+                self.lastDaysettlement(tick)
                 self.recordbenifit(graficdata)
-                print("back testing is finished!")
-                print("盈利交易次数为:%d, 亏损交易次数为%d" %(self.numberPostiveTrade,self.numberNegativTrade))
-                break 
-        recorddata.close()
+            print("back testing is finished!")
+            print("盈利交易次数为:%d, 亏损交易次数为%d" %(self.numberPostiveTrade,self.numberNegativTrade))
         graficdata.close()
-        self.graficdata2.close()
+        self.closeResults()
             
     def restart(self):
         sleep(180) #wait 3 minute
@@ -1788,6 +1790,13 @@ def cost(instrument, quantity, price):
 def margin(instrument, quantity, price):
     return cost(instrument, quantity, price) * instrument["initMargin"]
 
+def backtestDays(datafilename):
+    """(date, ticks) of every day from START_DATE to END_DATE in a data file"""
+    if settings.BACKTEST_TICKSTORE:
+        # binary columns, parsed once and opened through numpy.memmap
+        return tickstore.openStore(datafilename).iterDays(settings.START_DATE, settings.END_DATE)
+    return getTradeHis.iterDaysFromFile(datafilename, settings.START_DATE, settings.END_DATE)
+
 def drange(x, y, jump):
   while x < y:
     yield float(x)
@@ -1808,31 +1817,27 @@ def run():
     except (KeyboardInterrupt, SystemExit):
         sys.exit()
 
-def findBestParameterForRBreaker():
-    logger.info("start to find the best parameter for R breaker")
-    bestfinalBenifit = -1000.0
-    bestf1 = 0.3
-    bestf2 = 0.01
-    bestf3 = 0.2
-    om = OrderManager()
-    
+def findBestParameter(strategy = None):
+    """Search the SEARCH_SPACE of a strategy, SEARCH_STRATEGY by default"""
+    strategy = strategy or settings.SEARCH_STRATEGY
+    logger.info("start to find the best parameter for %s" % strategy)
+    # every combination is a fresh run on its own core
+    grid = sweep.spaceGrid(settings.SEARCH_SPACE[strategy])
+    started = time.time()
     try:
-        om.init()
-        for f1 in drange(0.20,0.50,0.02):
-            for f2 in drange(0, 0.20, 0.02):
-                for f3 in drange(0.10,0.40,0.02):
-                    om.f1 = f1
-                    om.f2 = f2
-                    om.f3 = f3
-                    om.run_backtesting()
-                    thistimebenifit = om.finalUSDBenifit
-                    if(thistimebenifit > bestfinalBenifit ):
-                        bestfinalBenifit = thistimebenifit
-                        bestf1 = f1
-                        bestf2 = f2
-                        bestf3 = f3       
+        results = sweep.successiveHalving(grid, strategy, rungs = settings.SEARCH_RUNGS,
+                                          maxDrawdown = settings.SEARCH_MAX_DRAWDOWN)
     except (KeyboardInterrupt, SystemExit):
         sys.exit()
-    print("best parameter found. f1 = %.2f, f2 = %.2f, f3 = %.2f, benifit = %.2f%%" % (bestf1, bestf2, bestf3, bestfinalBenifit))    
-
+    sweep.printTable(results)
+    print("%d parameter sets searched in %.1fs" % (len(grid), time.time() - started))
+    if settings.SEARCH_EXPORT:
+        sweep.export(results, settings.SEARCH_EXPORT)
+    if not results:
+        return
+    best = results[0]
+    print("best parameter found. %s, benifit = %.2f%%" % (", ".join("%s = %g" % (name, best["params"][name])
+          for name in sorted(best["params"])), best["finalUSDBenifit"]))
 
+def findBestParameterForRBreaker():
+    findBestParameter("R_Breaker")
@@ -0,0 +1,137 @@
+"""Performance figures of an equity curve
+
+An equity curve is the USD benifit in percent of every point of a run, like the equity of a
+fastbacktest result or the totalUSDbenifit column of grafic2; the wealth at a point is then
+1 + equity / 100 of what the run started with. Everything here is computed on whole arrays in
+O(n): the drawdowns against the running peak, the returns from one point to the next.
+
+periodsPerYear is the number of points of a year: 365 for daily curves, more for grafic2.
+
+equity can also be a (points x runs) array, one curve per column, like the equity of a batch
+engine; every figure is then an array with one entry per run, computed for all runs at once.
+"""
+from __future__ import absolute_import
+import numpy as np
+
+# figures where the smaller value is the better run, the others rank the largest first
+LOWER_IS_BETTER = ("maxDrawdown", "drawdownDuration")
+
+
+def _figure(value, kind = float):
+    """A figure of one curve as a plain number, those of many curves as an array"""
+    return kind(value) if np.ndim(value) == 0 else value
+
+
+def wealth(equity):
+    """Wealth of every point as a multiple of the start, it can't fall below nothing"""
+    return np.maximum(1 + np.asarray(equity, dtype = float) / 100, 0)
+
+
+def returns(equity):
+    """Return from every point to the next, 0 after the wealth is gone"""
+    w = wealth(equity)
+    if len(w) < 2:
+        return np.zeros((0,) + w.shape[1:])
+    previous = w[:-1]
+    return np.divide(w[1:] - previous, previous, out = np.zeros(previous.shape), where = previous > 0)
+
+
+def drawdowns(equity):
+    """Fall of every point below the highest wealth before it, as a fraction"""
+    w = wealth(equity)
+    peak = np.maximum.accumulate(w) if len(w) else w
+    return np.divide(peak - w, peak, out = np.ones(w.shape), where = peak > 0)
+
+
+def maxDrawdown(equity):
+    """Largest fall from a peak, as a fraction"""
+    falls = drawdowns(equity)
+    if not len(falls):
+        return _figure(np.zeros(falls.shape[1:]))
+    return _figure(falls.max(axis = 0))
+
+
+def drawdownDuration(equity):
+    """Most points in a row below the last peak"""
+    w = wealth(equity)
+    if not len(w):
+        return _figure(np.zeros(w.shape[1:], np.int64), int)
+    atPeak = w >= np.maximum.accumulate(w)
+    index = np.arange(len(w)).reshape((-1,) + (1,) * (w.ndim - 1))
+    lastPeak = np.maximum.accumulate(np.where(atPeak, index, -1))
+    return _figure((index - lastPeak).max(axis = 0), int)
+
+
+def annualReturn(equity, periodsPerYear = 365):
+    """Compound return per year"""
+    w = wealth(equity)
+    if len(w) < 2:
+        return _figure(np.zeros(w.shape[1:]))
+    return _figure(w[-1] ** (periodsPerYear / (len(w) - 1)) - 1)
+
+
+def _excessReturns(equity, periodsPerYear, riskFree):
+    return returns(equity) - riskFree / periodsPerYear
+
+
+# a smaller variation of the returns is the rounding of a flat curve, not risk
+MIN_RISK = 1e-12
+
+
+def _ratio(excess, risk, periodsPerYear):
+    """Yearly mean excess return over risk, 0 where there is no risk"""
+    risk = np.broadcast_to(risk, excess.shape[1:])
+    mean = excess.mean(axis = 0) if len(excess) else np.zeros(excess.shape[1:])
+    return _figure(np.divide(mean, risk, out = np.zeros(risk.shape), where = risk > MIN_RISK) * np.sqrt(periodsPerYear))
+
+
+def sharpe(equity, periodsPerYear = 365, riskFree = 0.0):
+    """Yearly Sharpe ratio, riskFree is the yearly risk free rate; 0 without any variation"""
+    excess = _excessReturns(equity, periodsPerYear, riskFree)
+    return _ratio(excess, excess.std(axis = 0) if len(excess) else 0.0, periodsPerYear)
+
+
+def sortino(equity, periodsPerYear = 365, riskFree = 0.0):
+    """Yearly Sortino ratio, like sharpe() but only the losses count as risk"""
+    excess = _excessReturns(equity, periodsPerYear, riskFree)
+    downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2, axis = 0)) if len(excess) else 0.0
+    return _ratio(excess, downside, periodsPerYear)
+
+
+def calmar(equity, periodsPerYear = 365):
+    """Yearly return over the max drawdown, infinite if the curve never fell"""
+    drawdown = np.asarray(maxDrawdown(equity))
+    yearly = np.asarray(annualReturn(equity, periodsPerYear))
+    neverFell = np.where(yearly > 0, np.inf, 0.0)
+    return _figure(np.divide(yearly, drawdown, out = neverFell, where = drawdown != 0))
+
+
+def excessOverBase(equity, base):
+    """(ahead, behind, win ratio, best, worst) of equity against the base benifit.
+
+    ahead and behind count the points where the strategy is ahead of the base and behind it, the win
+    ratio is ahead in percent of both. best is the largest lead and worst the largest lag in percent
+    points, both 0 if there is none.
+    """
+    equity = np.asarray(equity, dtype = float)
+    base = np.asarray(base, dtype = float)
+    if equity.ndim > base.ndim:
+        # one base for all the runs
+        base = base.reshape(base.shape + (1,) * (equity.ndim - base.ndim))
+    diff = equity - base
+    ahead = np.count_nonzero(diff > 0, axis = 0)
+    behind = np.count_nonzero(diff < 0, axis = 0)
+    winRatio = np.divide(ahead * 100.0, ahead + behind, out = np.zeros(np.shape(ahead)), where = ahead + behind > 0)
+    best = np.maximum(diff.max(axis = 0), 0.0) if len(diff) else np.zeros(diff.shape[1:])
+    worst = np.maximum(-diff.min(axis = 0), 0.0) if len(diff) else np.zeros(diff.shape[1:])
+    return _figure(ahead, int), _figure(behind, int), _figure(winRatio), _figure(best), _figure(worst)
+
+
+def performance(equity, base = None, periodsPerYear = 365, riskFree = 0.0):
+    """All figures of an equity curve by name, with base (the base benifit) also those against it"""
+    figures = dict(maxDrawdown = maxDrawdown(equity), drawdownDuration = drawdownDuration(equity),
+                   annualReturn = annualReturn(equity, periodsPerYear), sharpe = sharpe(equity, periodsPerYear, riskFree),
+                   sortino = sortino(equity, periodsPerYear, riskFree), calmar = calmar(equity, periodsPerYear))
+    if base is not None:
+        ahead, behind, figures["winRatio"], figures["bestExcess"], figures["worstExcess"] = excessOverBase(equity, base)
+    return figures
@@ -0,0 +1,108 @@
+"""Backtest of a basket of symbols in one pass
+
+Every symbol of settings.CONTRACTS gets its own OrderManager, so its own strategy state and its own
+START_BTCOIN, and reads its own data file (BACKTESTFILES, BACKTESTFILE for the symbols without an
+entry). The tick streams of all symbols are merged by timestamp with heapq.merge and handed to the
+manager of their symbol, so the whole basket is one scan over the data.
+
+Each symbol writes its days to grafic-<symbol> like run_backtesting() does, its grafic2 and trades
+files get the symbol too. The portfolio writes one line per day to portfolio.txt: the date, the
+USD benifit of the basket in percent and that of every symbol, each with its open position marked
+to its current price.
+"""
+from __future__ import absolute_import
+import heapq
+from operator import itemgetter
+from market_maker.settings import settings
+from market_maker import market_maker
+from market_maker import resultwriter
+
+
+def dataFile(symbol):
+    return settings.BACKTESTFILES.get(symbol, settings.BACKTESTFILE)
+
+
+def _stream(days, k):
+    for date, ticks in days:
+        for tick in ticks:
+            yield tick.timestamp, k, tick
+
+
+def portfolioBenifit(managers):
+    """USD benifit of the basket in percent, the symbols weighted by the USD they started with"""
+    startUSD = [settings.START_BTCOIN * om.initBitcoinPrice for om in managers]
+    if not sum(startUSD):
+        return 0.0
+    return sum(om.markToMarket() * usd for om, usd in zip(managers, startUSD)) / sum(startUSD)
+
+
+def run_backtesting(symbols = None):
+    """Backtest settings.STRATEGY on every symbol at once, returns the OrderManagers by symbol"""
+    symbols = symbols or settings.CONTRACTS
+    logger = market_maker.logger
+    logger.info("Start backtesting %s from date: %s to date: %s" % (", ".join(symbols), settings.START_DATE, settings.END_DATE))
+    managers = []
+    for symbol in symbols:
+        om = market_maker.OrderManager()
+        om.init(symbol)
+        managers.append(om)
+    handlers = [om.backtestHandler() for om in managers]
+    grafics = [resultwriter.ResultWriter(resultwriter.resultFile("grafic-" + symbol), resultwriter.GRAFIC_COLUMNS)
+               for symbol in symbols]
+    portfoliodata = open("portfolio.txt", "w")
+
+    def recordPortfolio(date):
+        portfoliodata.write("%s %.2f %s\n" % (date, portfolioBenifit(managers), " ".join("%.2f" % om.markToMarket() for om in managers)))
+
+    streams = [_stream(market_maker.backtestDays(dataFile(symbol)), k) for k, symbol in enumerate(symbols)]
+    days = [None] * len(symbols)
+    lastTicks = [None] * len(symbols)
+    stopped = [False] * len(symbols)
+    date = None
+    for timestamp, k, tick in heapq.merge(*streams, key = itemgetter(0, 1)):
+        if tick.date != date:
+            if date is not None:
+                recordPortfolio(date)
+            date = tick.date
+        if stopped[k]:
+            continue
+        om = managers[k]
+        if tick.date != days[k]:
+            if days[k] is not None:
+                # the day of this symbol is over, as in run_backtesting()
+                om.recordbenifit(grafics[k])
+                if om.bankrupt:
+                    print("%s: you are bankrupt now!!!!!!" % symbols[k])
+                    stopped[k] = True
+                    continue
+            days[k] = tick.date
+        handlers[k](tick)
+        lastTicks[k] = tick
+
+    for k, om in enumerate(managers):
+        if stopped[k] or lastTicks[k] is None:
+            continue
+        om.recordbenifit(grafics[k])
+        if om.bankrupt:
+            print("%s: you are bankrupt now!!!!!!" % symbols[k])
+            continue
+        om.lastDaysettlement(lastTicks[k])
+        om.recordbenifit(grafics[k])
+        print("%s: back testing is finished!" % symbols[k])
+        print("盈利交易次数为:%d, 亏损交易次数为%d" %(om.numberPostiveTrade, om.numberNegativTrade))
+    if date is not None:
+        recordPortfolio(date)
+    for grafic in grafics:
+        grafic.close()
+    portfoliodata.close()
+    for om in managers:
+        om.closeResults()
+    return dict(zip(symbols, managers))
+
+
+def run():
+    settings.IS_BACKTESTING = True
+    managers = run_backtesting()
+    for symbol, om in managers.items():
+        print("%s: total profit %.8f XBT, %.2f%% in USD" % (symbol, om.totalprofit, om.finalUSDBenifit))
+    print("portfolio: %.2f%% in USD" % portfolioBenifit(list(managers.values())))
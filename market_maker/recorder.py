@@ -0,0 +1,271 @@
+"""Paged, concurrent recorder of the backtest data
+
+GetHisTradeDatas.run_loop() asks for one day of quotes and its daily trade bucket at a time. The
+recorder asks for pages of several days instead, as many quote buckets as one request returns
+(RECORD_PAGE_COUNT), and runs the requests of all pages of all symbols on a small thread pool
+(RECORD_THREADS). Every request first takes a token from a TokenBucket that refills at the rate
+limit of BitMEX (RECORD_REQUESTS_PER_MINUTE), so the pool never runs into a 429.
+
+The pages come back in order and each one is written to the data file of its symbol with one
+write(). The lines are those of GetHisTradeDatas.writeLineintoFile(): a quote bucket and the close
+of the daily trade bucket that starts its day.
+
+A run only fetches what the data file misses: the days between START_DATE and END_DATE that are
+not in it or have fewer than a day of buckets. Those pages are appended, so bringing a long
+history up to date costs the requests of the new days. Every page that is on disk is noted in a
+checkpoint next to the file (backtestingdata.csv -> backtestingdata.ckpt); after a crash the
+next run cuts off what was written after it and fetches the rest. Days that were patched in
+behind later ones are put back in date order at the end, into a new file that replaces the old
+one in one rename.
+"""
+from __future__ import absolute_import
+import os
+import json
+import bisect
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from market_maker import bitmex, dataindex
+from market_maker.settings import settings
+
+
+class TokenBucket:
+    """Hands out at most rate tokens per second, and up to capacity at once after a pause"""
+    def __init__(self, rate, capacity = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Wait for a token and take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def dayRange(startdate, enddate):
+    """The dates from startdate up to enddate, without enddate like run_loop()"""
+    return np.arange(np.datetime64(startdate, "D"), np.datetime64(enddate, "D")).astype(str).tolist()
+
+
+def pages(days, period, pageCount):
+    """Split days into lists of consecutive days whose quote buckets fit into one request"""
+    perPage = max(1, pageCount // (1440 // period))
+    return [days[i:i + perPage] for i in range(0, len(days), perPage)]
+
+
+def runs(days):
+    """Split sorted dates into lists of consecutive days"""
+    result = []
+    for day in days:
+        if result and str(np.datetime64(result[-1][-1], "D") + 1) == day:
+            result[-1].append(day)
+        else:
+            result.append([day])
+    return result
+
+
+def dataFile(symbol):
+    return settings.BACKTESTFILES.get(symbol, settings.BACKTESTFILE)
+
+
+def checkpointPath(datafilename):
+    return os.path.splitext(datafilename)[0] + ".ckpt"
+
+
+def _today():
+    return str(np.datetime64(int(time.time()), "s").astype("datetime64[D]"))
+
+
+class DataFile:
+    """A data file that grows by whole pages, with its date index and its checkpoint.
+
+    The checkpoint holds the size of the file after the last page that was written completely
+    (None once the run finished) and the days that were fetched after they had ended but have
+    fewer buckets than a day (settled), BitMEX has no more of them.
+    """
+    def __init__(self, filename, number_per_day):
+        self.filename = filename
+        self.number_per_day = number_per_day
+        self.checkpoint = dict(size = None, settled = [])
+        if os.path.isfile(checkpointPath(filename)):
+            with open(checkpointPath(filename)) as checkpointfile:
+                self.checkpoint.update(json.load(checkpointfile))
+        self._recover()
+        self.index = dataindex.openIndex(filename)
+        self.file = open(filename, "ab")
+
+    def _truncate(self, size):
+        with open(self.filename, "r+b") as datafile:
+            datafile.truncate(size)
+
+    def _recover(self):
+        if not os.path.isfile(self.filename):
+            open(self.filename, "wb").close()
+            return
+        size = os.path.getsize(self.filename)
+        if self.checkpoint["size"] is not None and size > self.checkpoint["size"]:
+            # a page that was cut short by a crash
+            size = self.checkpoint["size"]
+            self._truncate(size)
+        if size:
+            # and a line that was cut short
+            with open(self.filename, "rb") as datafile:
+                datafile.seek(max(0, size - 4096))
+                tail = datafile.read()
+            if not tail.endswith(b"\n"):
+                self._truncate(size - len(tail) + tail.rfind(b"\n") + 1 if b"\n" in tail else 0)
+
+    def _saveCheckpoint(self):
+        # written aside and renamed, a crash leaves the old or the new checkpoint
+        path = checkpointPath(self.filename)
+        with open(path + ".tmp", "w") as checkpointfile:
+            json.dump(self.checkpoint, checkpointfile)
+        os.replace(path + ".tmp", path)
+
+    def missing(self, startdate, enddate):
+        """The days from startdate up to enddate that are not complete in the file"""
+        settled = set(self.checkpoint["settled"])
+        # a day at the end that is not complete yet is cut off and fetched again as a whole
+        entries = self.index.entries
+        while entries and startdate <= entries[-1][0] < enddate and entries[-1][2] < self.number_per_day and \
+                entries[-1][0] not in settled:
+            date, offset, count = entries.pop()
+            self.index.seen.discard(date)
+            self.index.offset = offset
+            self._truncate(offset)
+        counts = dict((date, count) for date, offset, count in entries)
+        return [day for day in dayRange(startdate, enddate) if counts.get(day, 0) < self.number_per_day and day not in settled]
+
+    def append(self, lines, days):
+        """Write the lines of a page and note it in the checkpoint"""
+        self.file.write("".join(lines).encode())
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        counts = {}
+        for line in lines:
+            self.index.addLine(line)
+            counts[line[:10]] = counts.get(line[:10], 0) + 1
+        today = _today()
+        self.checkpoint["settled"] += [day for day in days if day < today and counts.get(day, 0) < self.number_per_day]
+        self.checkpoint["size"] = self.index.offset
+        self._saveCheckpoint()
+
+    def ordered(self):
+        dates = [date for date, offset, count in self.index.entries]
+        return all(a < b for a, b in zip(dates, dates[1:]))
+
+    def compact(self):
+        """Rewrite the file in date order, the last fetch of a day wins"""
+        latest = dict((date, (offset, count)) for date, offset, count in self.index.entries)
+        index = dataindex.IndexWriter(self.filename)
+        with open(self.filename, "rb") as source, open(self.filename + ".tmp", "wb") as target:
+            for date in sorted(latest):
+                offset, count = latest[date]
+                source.seek(offset)
+                while count:
+                    line = source.readline()
+                    if line.strip():
+                        target.write(line)
+                        index.addLine(line.decode(), len(line))
+                        count -= 1
+        os.replace(self.filename + ".tmp", self.filename)
+        self.index = index
+
+    def close(self):
+        self.file.close()
+        if not self.ordered():
+            self.compact()
+        self.index.save()
+        self.checkpoint["size"] = None
+        self._saveCheckpoint()
+
+
+class PagedRecorder:
+    def __init__(self, api, symbols, period = None, pageCount = None, threads = None, requestsPerMinute = None):
+        self.api = api
+        self.symbols = symbols
+        self.period = period or settings.BACKTEST_PERIOD
+        self.number_per_day = 1440 // self.period
+        self.pageCount = pageCount or settings.RECORD_PAGE_COUNT
+        self.threads = threads or settings.RECORD_THREADS
+        requestsPerMinute = requestsPerMinute or settings.RECORD_REQUESTS_PER_MINUTE
+        self.bucket = TokenBucket(requestsPerMinute / 60.0, settings.RECORD_BURST)
+        files = [dataFile(symbol) for symbol in symbols]
+        if len(set(files)) < len(files):
+            raise ValueError("the symbols %s share a data file, give them their own in BACKTESTFILES" % ", ".join(symbols))
+
+    def fetchPage(self, symbol, days):
+        """The lines of the days of one page"""
+        self.bucket.take()
+        quotes = self.api.quoteBucketed(symbol, self.period, days[0], count = len(days) * self.number_per_day)
+        self.bucket.take()
+        # one daily bucket more, so the last day of the page has the one that starts it
+        trades = self.api.tradeBucketed(symbol, 1440, days[0], count = len(days) + 1)
+        return pageLines(quotes, trades, days)
+
+    def record(self, startdate, enddate):
+        """Fetch the days from startdate up to enddate that the data file of a symbol misses"""
+        dataFiles = dict((symbol, DataFile(dataFile(symbol), self.number_per_day)) for symbol in self.symbols)
+        symbolPages = []
+        for symbol in self.symbols:
+            missing = dataFiles[symbol].missing(startdate, enddate)
+            print("%s: %d of %d days to fetch" % (symbol, len(missing), len(dayRange(startdate, enddate))))
+            symbolPages.append([page for days in runs(missing) for page in pages(days, self.period, self.pageCount)])
+        # the pages of the symbols take turns, so every file grows from the start on
+        jobs = [(symbol, page[i]) for i in range(max([len(page) for page in symbolPages] + [0]))
+                for symbol, page in zip(self.symbols, symbolPages) if i < len(page)]
+        try:
+            with ThreadPoolExecutor(max_workers = self.threads) as executor:
+                for (symbol, days), lines in zip(jobs, executor.map(lambda job: self.fetchPage(*job), jobs)):
+                    dataFiles[symbol].append(lines, days)
+                    print("%s %s - %s: %d lines" % (symbol, days[0], days[-1], len(lines)))
+        finally:
+            for symbol in self.symbols:
+                dataFiles[symbol].close()
+
+
+def pageLines(quotes, trades, days):
+    """The data lines of the days from quote buckets and daily trade buckets.
+
+    Every quote bucket of a day gets the close of the first daily trade bucket from the start of
+    its day on, like tradeBucketed(symbol, 1440, day)[0] in run_loop(). Days without such a bucket
+    are left out.
+    """
+    starts = [bucket["timestamp"][:10] for bucket in trades]
+    lines = []
+    wanted = set(days)
+    for quote in quotes:
+        date = quote["timestamp"][:10]
+        if date not in wanted:
+            continue
+        k = bisect.bisect_left(starts, date)
+        if k == len(starts):
+            continue
+        lines.append("%s %s %s %s %s %s\n" % (quote["timestamp"], quote["bidSize"], quote["bidPrice"], quote["askPrice"],
+                                              quote["askSize"], trades[k]["close"]))
+    return lines
+
+
+def connect(symbol = None):
+    return bitmex.BitMEX(base_url=settings.REAL_BASE_URL, symbol=symbol or settings.SYMBOL, login=settings.REAL_LOGIN,
+                         password=settings.REAL_PASSWORD, otpToken=settings.OTPTOKEN, apiKey=settings.REAL_API_KEY,
+                         apiSecret=settings.REAL_API_SECRET, orderIDPrefix=settings.REAL_ORDERID_PREFIX, shouldWSAuth=False)
+
+
+def run(symbols = None):
+    symbols = symbols or settings.RECORD_SYMBOLS or [settings.SYMBOL]
+    recorder = PagedRecorder(connect(symbols[0]), symbols)
+    started = time.time()
+    recorder.record(settings.START_DATE, settings.END_DATE)
+    print("data recording finish! %.1fs" % (time.time() - started))
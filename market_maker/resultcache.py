@@ -0,0 +1,90 @@
+"""On-disk cache of sweep results
+
+Every finished run is stored in an SQLite file as soon as it comes back, keyed by a hash of
+the data file, the date range, the strategy, its parameters and the settings its engine reads
+(fastbacktest.ENGINE_SETTINGS). Other settings, like the logging or the plots, don't touch the cache. A sweep only runs
+the parameter sets that are not in the cache yet, so re-running a search costs nothing for the
+combinations that were already done, and a search that crashed picks up where it stopped.
+
+The runs table can be queried directly:
+
+    sqlite3 sweepcache.db "select params, result from runs where strategy = 'R_Breaker'"
+
+The cache keeps at most `size` runs and drops the least recently used ones beyond that.
+"""
+from __future__ import absolute_import
+import json
+import time
+import hashlib
+import sqlite3
+from market_maker.settings import settings
+from market_maker import fastbacktest
+
+# bump when a change to the engines changes their results, so old entries are not used any more
+VERSION = 4
+
+
+def _settingsVector(strategy, params):
+    """The parameters of a run and the settings its engine reads, as (name, value) pairs"""
+    p = fastbacktest.getParams(params)
+    return sorted(params.items()) + [(name, p[name]) for name in fastbacktest.ENGINE_SETTINGS[strategy]]
+
+
+def runKey(store, strategy, startdate, enddate, params):
+    """Hash of everything a fastbacktest run depends on; store is the opened TickStore of the data"""
+    data = [VERSION, strategy, startdate, enddate, store.meta["sourceSize"], store.meta["sourceMtime"],
+            store.meta["rows"], _settingsVector(strategy, params)]
+    return hashlib.sha1(json.dumps(data).encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, filename, size = 100000):
+        self.filename = filename
+        self.size = size
+        self.db = sqlite3.connect(filename)
+        self.db.execute("pragma journal_mode = wal")
+        self.db.execute("pragma synchronous = normal")
+        self.db.execute("create table if not exists runs (key text primary key, strategy text, datafile text, "
+                        "startdate text, enddate text, params text, result text, lastUsed real)")
+        self.db.execute("create index if not exists runs_lastUsed on runs (lastUsed)")
+        self.db.commit()
+
+    def __len__(self):
+        return self.db.execute("select count(*) from runs").fetchone()[0]
+
+    def get(self, key):
+        """The cached summary of a run, or None"""
+        row = self.db.execute("select result from runs where key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.db.execute("update runs set lastUsed = ? where key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, strategy, datafile, startdate, enddate, result):
+        """Store one finished run, it is on disk when put() returns"""
+        self.db.execute("insert or replace into runs values (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (key, strategy, datafile, startdate, enddate, json.dumps(result["params"], sort_keys = True),
+                         json.dumps(result), time.time()))
+        self.db.commit()
+
+    def evict(self):
+        """Drop the least recently used runs beyond size"""
+        extra = len(self) - self.size
+        if extra > 0:
+            self.db.execute("delete from runs where key in (select key from runs order by lastUsed limit ?)", (extra,))
+        self.db.commit()
+
+    def clear(self):
+        self.db.execute("delete from runs")
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+def openCache():
+    """The ResultCache of the settings, or None if RESULT_CACHE is not set"""
+    if not settings.RESULT_CACHE:
+        return None
+    return ResultCache(settings.RESULT_CACHE, settings.RESULT_CACHE_SIZE or 100000)
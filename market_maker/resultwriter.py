@@ -0,0 +1,161 @@
+"""Buffered writer for the results of a run
+
+A ResultWriter takes typed records, keeps them in numpy arrays and writes them out CHUNK records
+at a time, instead of a handful of small file.write() calls for every record. Files go either
+to a binary columnar .res file (RESULTS_BINARY) or to the text format of grafic.txt/grafic2.txt,
+one record per line.
+
+A .res file is a header line
+
+    MMRESULTS 1 [["price", "<f8"], ["totalUSDbenifit", "<f8"], ...]
+
+followed by chunks: the number of records of the chunk as a little endian uint32, then every
+column of the chunk, one after the other. readResults() reads both formats back as columns.
+
+With RECORD_RESULTS off (the sweep workers) a writer writes nothing and opens no file.
+"""
+from __future__ import absolute_import
+import os
+import json
+import warnings
+import numpy as np
+from market_maker.settings import settings
+from market_maker.utils.dotdict import dotdict
+
+MAGIC = b"MMRESULTS"
+FORMAT_VERSION = 1
+CHUNK = 65536
+
+# (name, dtype, text format) of the records of recordbenifit(), recordbenifit2() and of a trade
+GRAFIC_COLUMNS = [("price", "<f8", "%.2f"), ("totalUSDbenifit", "<f8", "%.2f"), ("position", "<i8", "%d"),
+                  ("movingAveragePrice", "<f8", "%.2f"), ("baseBenifit", "<f8", "%.2f")]
+GRAFIC2_COLUMNS = GRAFIC_COLUMNS + [("time", "S32", "%s"), ("USD", "<f8", "%.2f")]
+# the sizes filled by the backtest can be fractions of a contract
+TRADE_COLUMNS = [("time", "S32", "%s"), ("pos", "<f8", "%.10g"), ("price", "<f8", "%.2f"), ("position", "<f8", "%.10g"),
+                 ("totalprofit", "<f8", "%.8f")]
+
+
+def resultFile(name, binary = None):
+    """File name of the results called name, e.g. grafic2.res or grafic2.txt"""
+    binary = settings.RESULTS_BINARY if binary is None else binary
+    return name + (".res" if binary else ".txt")
+
+
+def _header(columns):
+    return b"%s %d %s\n" % (MAGIC, FORMAT_VERSION, json.dumps([[name, dtype] for name, dtype, fmt in columns]).encode())
+
+
+class ResultWriter:
+    def __init__(self, filename, columns, append = False, chunk = CHUNK, enabled = None):
+        self.filename = filename
+        self.columns = columns
+        self.chunk = chunk
+        self.enabled = settings.RECORD_RESULTS if enabled is None else enabled
+        self.binary = filename.endswith(".res")
+        self.file = None
+        self.size = 0
+        if not self.enabled:
+            return
+        self.buffers = [np.zeros(chunk, dtype) for name, dtype, fmt in columns]
+        exists = append and os.path.isfile(filename) and os.path.getsize(filename) > 0
+        self.file = open(filename, "ab" if append else "wb")
+        if self.binary:
+            if not exists:
+                self.file.write(_header(columns))
+            else:
+                with open(filename, "rb") as resultfile:
+                    if resultfile.readline() != _header(columns):
+                        raise ValueError("%s holds other columns, can't append to it" % filename)
+        else:
+            self.line = " ".join(fmt for name, dtype, fmt in columns) + "\n"
+
+    def append(self, *values):
+        """Add one record, the values in the order of the columns"""
+        if not self.enabled:
+            return
+        for buffer, value in zip(self.buffers, values):
+            buffer[self.size] = value
+        self.size += 1
+        if self.size == self.chunk:
+            self.flush()
+
+    def extend(self, *columns):
+        """Add many records, an array of the values of every column"""
+        if not self.enabled:
+            return
+        count = len(columns[0])
+        done = 0
+        while done < count:
+            take = min(self.chunk - self.size, count - done)
+            for buffer, column in zip(self.buffers, columns):
+                buffer[self.size:self.size + take] = column[done:done + take]
+            self.size += take
+            done += take
+            if self.size == self.chunk:
+                self.flush()
+
+    def flush(self):
+        if self.file is None:
+            return
+        if self.size:
+            if self.binary:
+                self.file.write(np.uint32(self.size).astype("<u4").tobytes())
+                for buffer in self.buffers:
+                    self.file.write(buffer[:self.size].tobytes())
+            else:
+                rows = zip(*[buffer[:self.size].tolist() if buffer.dtype.kind != "S" else
+                             [value.decode() for value in buffer[:self.size].tolist()] for buffer in self.buffers])
+                self.file.write("".join(self.line % row for row in rows).encode())
+            self.size = 0
+        self.file.flush()
+
+    def close(self):
+        if self.file is None:
+            return
+        self.flush()
+        self.file.close()
+        self.file = None
+
+
+def _readBinary(resultfile):
+    header = resultfile.readline().split(b" ", 2)
+    if int(header[1]) != FORMAT_VERSION:
+        raise ValueError("%s: unknown results format %s" % (resultfile.name, header[1].decode()))
+    columns = [(name, np.dtype(dtype)) for name, dtype in json.loads(header[2].decode())]
+    chunks = dict((name, []) for name, dtype in columns)
+    while True:
+        count = resultfile.read(4)
+        if len(count) < 4:
+            break
+        count = int(np.frombuffer(count, "<u4")[0])
+        for name, dtype in columns:
+            data = resultfile.read(count * dtype.itemsize)
+            if len(data) < count * dtype.itemsize:
+                # a chunk cut short by a crash, keep what is complete
+                return columns, chunks
+            chunks[name].append(np.frombuffer(data, dtype))
+    return columns, chunks
+
+
+def readResults(filename, columns = GRAFIC2_COLUMNS):
+    """The columns of a result file as arrays, by name, the text columns as str.
+
+    columns names the columns of a text file, a binary file names its own.
+    """
+    with open(filename, "rb") as resultfile:
+        if resultfile.read(len(MAGIC)) == MAGIC:
+            resultfile.seek(0)
+            names, chunks = _readBinary(resultfile)
+            lengths = [len(chunks[name]) for name, dtype in names]
+            result = dotdict()
+            for name, dtype in names:
+                # every column up to the last complete chunk
+                column = np.concatenate(chunks[name][:min(lengths)]) if min(lengths) else np.zeros(0, dtype)
+                result[name] = column.astype("U32") if dtype.kind == "S" else column
+            return result
+    dtypes = [(name, "U32" if np.dtype(dtype).kind == "S" else dtype) for name, dtype, fmt in columns]
+    with warnings.catch_warnings():
+        # an empty file is no error, just no records
+        warnings.simplefilter("ignore", UserWarning)
+        records = np.loadtxt(filename, dtype = dtypes, ndmin = 1, encoding = "utf-8")
+    return dotdict((name, records[name]) for name, dtype in dtypes)
@@ -0,0 +1,310 @@
+"""Parallel parameter sweeps over the array backtest engines
+
+Every parameter set is one fastbacktest run, so it starts from a fresh strategy state. The runs are
+spread over a ProcessPoolExecutor with one worker per core; each worker opens the tick store once
+and reads its columns through numpy.memmap, so all workers share the same pages of the data. The
+indicators the runs share are computed once and shared the same way (see indicatorcache.py).
+
+Finished runs go to the result cache (see resultcache.py) one by one, and a sweep only runs what is
+not cached yet.
+"""
+from __future__ import absolute_import
+import os
+import csv
+import math
+import time
+import sqlite3
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from market_maker.settings import settings
+from market_maker.utils.dotdict import dotdict
+from market_maker import fastbacktest, tickstore, resultcache, indicatorcache, metrics, getTradeHis
+from market_maker.utils import events
+
+# filled by _initWorker() in every worker process
+_worker = {}
+# most parameter sets a batch engine runs at once
+BATCH_SETS = 2000
+
+
+def parameterGrid(**ranges):
+    """All combinations of the given settings, e.g. parameterGrid(ATRN=[5, 10], ADDTIME=[2, 4])"""
+    names = sorted(ranges)
+    return [dict(zip(names, values)) for values in itertools.product(*[list(ranges[name]) for name in names])]
+
+
+def _values(spec):
+    """Values of a SEARCH_SPACE entry: a list, or a (start, stop, step) range like drange()"""
+    if not isinstance(spec, tuple):
+        return list(spec)
+    start, stop, step = spec
+    values = []
+    while start < stop:
+        values.append(float(start))
+        start += step
+    return values
+
+
+def spaceGrid(space):
+    """parameterGrid() of a declarative space, e.g. {"ATRN": [5, 10], "ZHIYINGUSD": (500, 2000, 500)}"""
+    return parameterGrid(**dict((name, _values(spec)) for name, spec in space.items()))
+
+
+def _initWorker(strategy, datafilename):
+    # the runs of a sweep only give back their summaries
+    settings.RECORD_RESULTS = False
+    events.setSink(events.NullSink())
+    _worker["store"] = tickstore.loadStore(tickstore.storePath(datafilename))
+    # one cache for every window, the series of the whole store stay in memory
+    _worker["indicators"] = indicatorcache.openCache(_worker["store"])
+    _worker["engine"] = fastbacktest.ENGINES[strategy]
+    _worker["batchEngine"] = fastbacktest.BATCH_ENGINES[strategy][0] if strategy in fastbacktest.BATCH_ENGINES else None
+    _worker["window"] = None
+
+
+def _windowTicks(startdate, enddate):
+    # the jobs of a window come one after the other, they all share its columns
+    if _worker["window"] != (startdate, enddate):
+        _worker["window"] = (startdate, enddate)
+        _worker["ticks"] = fastbacktest.loadTicks(_worker["store"], startdate, enddate, copy = False)
+        if _worker["indicators"] is not None:
+            _worker["indicators"].setWindow(startdate, enddate)
+            _worker["ticks"].indicators = _worker["indicators"]
+    return _worker["ticks"]
+
+
+# figures of metrics.performance() a sweep keeps for every run, the daily equity gives them
+CURVE_FIGURES = ("maxDrawdown", "drawdownDuration", "sharpe", "sortino", "calmar")
+
+
+def curveFigures(equity):
+    return metrics.performance(equity, periodsPerYear = 365, riskFree = settings.RISK_FREE_RATE)
+
+
+def summary(params, result):
+    """The figures of a run that a sweep keeps"""
+    run = dict(params = params, finalUSDBenifit = result.finalUSDBenifit, totalprofit = result.totalprofit,
+               numberPostiveTrade = result.numberPostiveTrade, numberNegativTrade = result.numberNegativTrade,
+               bankrupt = result.bankrupt, pruned = bool(result.pruned))
+    figures = curveFigures(result.equity)
+    run.update((name, figures[name]) for name in CURVE_FIGURES)
+    return run
+
+
+def _runWorker(job):
+    params, startdate, enddate, curve = job
+    try:
+        result = _worker["engine"](_windowTicks(startdate, enddate), params)
+    except ValueError as e: # e.g. a NaN ATR in CalcUnit()
+        return dict(params = params, error = str(e))
+    run = summary(params, result)
+    if curve:
+        run.update(dates = result.dates, equity = np.asarray(result.equity, dtype = float))
+    return run
+
+
+def _runBatch(batch):
+    if len(batch) == 1 or _worker["batchEngine"] is None:
+        return [_runWorker(job) for job in batch]
+    paramsList = [params for params, startdate, enddate, curve in batch]
+    params, startdate, enddate, curve = batch[0]
+    try:
+        result = _worker["batchEngine"](_windowTicks(startdate, enddate), paramsList)
+    except ValueError as e:
+        return [dict(params = params, error = str(e)) for params in paramsList]
+    runs = [summary(params, dotdict(finalUSDBenifit = float(result.finalUSDBenifit[k]), totalprofit = float(result.totalprofit[k]),
+                                    numberPostiveTrade = int(result.numberPostiveTrade[k]),
+                                    numberNegativTrade = int(result.numberNegativTrade[k]),
+                                    bankrupt = bool(result.bankrupt[k]), pruned = bool(result.pruned[k]),
+                                    equity = result.equity[:, k]))
+            for k, params in enumerate(paramsList)]
+    if curve:
+        for k, run in enumerate(runs):
+            run.update(dates = result.dates, equity = np.ascontiguousarray(result.equity[:, k]))
+    return runs
+
+
+def _batches(jobs, todo, strategy, workers):
+    """Split the jobs todo into lists that one run of the batch engine of strategy can take"""
+    if strategy not in fastbacktest.BATCH_ENGINES:
+        return [[i] for i in todo]
+    batchParams = fastbacktest.BATCH_ENGINES[strategy][1]
+    groups = {}
+    for i in todo:
+        params, startdate, enddate, curve = jobs[i]
+        shared = tuple(sorted((name, value) for name, value in params.items() if name not in batchParams))
+        groups.setdefault((startdate, enddate, curve, shared), []).append(i)
+    batches = []
+    for group in groups.values():
+        # enough batches to keep every worker busy
+        pieces = max(int(math.ceil(len(group) / BATCH_SETS)), 1 if len(groups) >= workers else workers)
+        size = int(math.ceil(len(group) / pieces))
+        batches.extend(group[k:k + size] for k in range(0, len(group), size))
+    return batches
+
+
+def runJobs(jobs, strategy = None, datafilename = None, workers = None, cache = None):
+    """Run backtests given as (params, startdate, enddate, curve) and return their summaries in order.
+
+    With curve the summary also holds the dates and the equity of the run as an array; those runs bypass
+    the cache.
+    cache is a resultcache.ResultCache, None for the one of the settings or False for no cache.
+    """
+    strategy = strategy or settings.STRATEGY
+    datafilename = datafilename or settings.BACKTESTFILE
+    # convert once here, the workers only open the store
+    store = tickstore.openStore(datafilename)
+    ownCache = cache is None
+    if ownCache:
+        cache = resultcache.openCache()
+    elif cache is False:
+        cache = None
+    results = [None] * len(jobs)
+    keys = [None] * len(jobs)
+    if cache is not None:
+        for i, (params, startdate, enddate, curve) in enumerate(jobs):
+            if curve:
+                continue
+            keys[i] = resultcache.runKey(store, strategy, startdate, enddate, params)
+            cached = cache.get(keys[i])
+            if cached is not None:
+                cached["params"] = params
+                results[i] = cached
+    todo = [i for i in range(len(jobs)) if results[i] is None]
+    started = time.time()
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers = workers, initializer = _initWorker,
+                                 initargs = (strategy, datafilename)) as executor:
+            batches = _batches(jobs, todo, strategy, workers)
+            runs = executor.map(_runBatch, [[jobs[i] for i in batch] for batch in batches],
+                                chunksize = max(1, len(batches) // (workers * 4)))
+            for batch, batchResults in zip(batches, runs):
+                for i, result in zip(batch, batchResults):
+                    results[i] = result
+                    if keys[i] is not None:
+                        params, startdate, enddate, curve = jobs[i]
+                        cache.put(keys[i], strategy, datafilename, startdate, enddate, result)
+    elapsed = time.time() - started
+    print("%d backtests in %.1fs, %.1f backtests/s, %d from the cache" % (len(todo), elapsed,
+          len(todo) / elapsed if elapsed > 0 else 0.0, len(jobs) - len(todo)))
+    if cache is not None:
+        cache.evict()
+        if ownCache:
+            cache.close()
+    indicators = indicatorcache.openCache(store)
+    if indicators is not None:
+        indicators.evict()
+    return results
+
+
+def sweep(grid, strategy = None, datafilename = None, startdate = None, enddate = None, workers = None, cache = None):
+    """Run every parameter set of grid and return the summaries in the order of grid"""
+    startdate = startdate or settings.START_DATE
+    enddate = enddate or settings.END_DATE
+    return runJobs([(params, startdate, enddate, False) for params in grid], strategy, datafilename, workers, cache)
+
+
+def rank(results, key = None):
+    """Results without errors, best first by key, SEARCH_RANK_BY by default (a figure of summary()).
+    The figures of metrics.LOWER_IS_BETTER rank the smallest first"""
+    key = key or settings.SEARCH_RANK_BY
+    return sorted([r for r in results if "error" not in r], key = lambda r: r[key],
+                  reverse = key not in metrics.LOWER_IS_BETTER)
+
+
+def printTable(results, top = 20):
+    ranked = rank(results)
+    if not ranked:
+        print("no successful run")
+        return
+    names = sorted(ranked[0]["params"])
+    print("rank " + " ".join("%12s" % name for name in names) + "   benifit%  profit(XBT)  win  loss drawdown  sharpe bankrupt")
+    for i, r in enumerate(ranked[:top]):
+        print("%4d " % (i + 1) + " ".join("%12.4g" % r["params"][name] for name in names) +
+              " %10.2f %12.6f %4d %5d %7.1f%% %7.2f %s" % (r["finalUSDBenifit"], r["totalprofit"], r["numberPostiveTrade"],
+                                                           r["numberNegativTrade"], r["maxDrawdown"] * 100, r["sharpe"],
+                                                           r["bankrupt"]))
+    failed = len(results) - len(ranked)
+    if failed:
+        print("%d parameter sets failed" % failed)
+
+
+def _rows(results):
+    names = sorted(set(name for r in results for name in r["params"]))
+    fields = ["finalUSDBenifit", "totalprofit", "numberPostiveTrade", "numberNegativTrade", "bankrupt", "pruned"] + \
+             list(CURVE_FIGURES) + ["error"]
+    rows = [[r["params"].get(name) for name in names] + [r.get(field) for field in fields] for r in results]
+    return names + fields, rows
+
+
+def exportCsv(results, filename):
+    names, rows = _rows(results)
+    with open(filename, "w", newline = "") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(names)
+        writer.writerows(rows)
+
+
+def exportSqlite(results, filename, table = "results"):
+    """Write results into table of an SQLite file, replacing the table if it exists"""
+    names, rows = _rows(results)
+    db = sqlite3.connect(filename)
+    db.execute('drop table if exists "%s"' % table)
+    db.execute('create table "%s" (%s)' % (table, ", ".join('"%s"' % name for name in names)))
+    db.executemany('insert into "%s" values (%s)' % (table, ", ".join("?" * len(names))), rows)
+    db.commit()
+    db.close()
+
+
+def export(results, filename):
+    """Write results to a .csv file or, for any other extension, an SQLite file"""
+    if filename.lower().endswith(".csv"):
+        exportCsv(results, filename)
+    else:
+        exportSqlite(results, filename)
+
+
+def rungEnds(startdate, enddate, rungs = 3, eta = 3, minDays = 30):
+    """The end dates of the windows of the rungs of successiveHalving(), each longer than the one before.
+
+    A rung runs from startdate for 1/eta of the days of the next one, at least minDays; rungs whose
+    window would not grow past the one before are left out, the last one ends on enddate.
+    """
+    totalDays = int((np.datetime64(enddate, "D") - np.datetime64(startdate, "D")).astype(int))
+    ends = []
+    for rung in range(rungs):
+        days = max(minDays, int(math.ceil(totalDays / eta ** (rungs - 1 - rung))))
+        rungEnd = enddate if days >= totalDays else getTradeHis.getXDaysAfter(startdate, days)
+        if not ends or rungEnd != ends[-1]:
+            ends.append(rungEnd)
+    return ends if ends and ends[-1] == enddate else ends + [enddate]
+
+
+def successiveHalving(grid, strategy = None, datafilename = None, startdate = None, enddate = None, rungs = 3, eta = 3,
+                      maxDrawdown = None, minDays = 30, workers = None):
+    """Search grid by successive halving and return the runs of the last rung, best first.
+
+    Every parameter set is first screened on a short window from startdate. Only the best 1/eta of
+    each rung, without the bankrupt ones and those whose drawdown passes maxDrawdown (a fraction),
+    is run again on an eta times longer window; the last rung covers startdate to enddate. With
+    rungs=3 and eta=3 that is about a third of the CPU time of running the whole grid. A period
+    shorter than minDays * eta ** (rungs - 1) has fewer rungs, see rungEnds(). The runs get
+    maxDrawdown as STOP_DRAWDOWN, so the engines stop a run on the day its drawdown passes it.
+    """
+    startdate = startdate or settings.START_DATE
+    enddate = enddate or settings.END_DATE
+    candidates = grid
+    for rung, rungEnd in enumerate(rungEnds(startdate, enddate, rungs, eta, minDays)):
+        results = sweep([dict(params, STOP_DRAWDOWN = maxDrawdown) for params in candidates], strategy, datafilename,
+                        startdate, rungEnd, workers)
+        for params, r in zip(candidates, results):
+            r["params"] = params
+        alive = [r for r in rank(results) if not r["bankrupt"] and not r["pruned"] and
+                 (maxDrawdown is None or r["maxDrawdown"] <= maxDrawdown)]
+        print("rung %d: %d parameter sets on %s - %s, %d pruned" % (rung + 1, len(candidates), startdate, rungEnd,
+                                                                     len(candidates) - len(alive)))
+        if rungEnd == enddate or not alive:
+            return alive
+        candidates = [r["params"] for r in alive[:max(1, int(math.ceil(len(candidates) / eta)))]]
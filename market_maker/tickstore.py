@@ -0,0 +1,484 @@
+"""Binary columnar tick store for the backtest data
+
+The recorder writes one text line per bucket:
+
+    2017-08-01T00:00:00.000Z 28547 2854.7 2859 28448 2854.7
+    timestamp                bidSize bidPrice askPrice askSize prevClosePrice
+
+convertFile() parses such a file once, in ascending time order whatever the order of the file
+(see datasort.py), and stores every field as its own .npy column in a "<datafile>.ticks" directory. TickStore opens the columns with numpy.memmap, so opening
+years of data costs nothing and no line is ever parsed again.
+
+With TICKSTORE_COMPRESSION the columns are stored compressed instead, in chunks of
+TICKSTORE_CHUNK_DAYS days in one chunks.bin (zlib, or zstd with the zstandard package). meta.json
+holds the index of the chunks: their time range, rows and place in the file. ChunkedTickStore only
+reads and decompresses the chunks of the days a backtest asks for, on a few threads, and keeps the
+last TICKSTORE_CHUNK_CACHE of them, so a long history takes a fraction of the disk of the text file
+and every sweep worker only unpacks its window.
+
+Whether that is faster than the plain columns depends on the disk: compression only pays when
+reading the bytes it saves takes longer than decompressing. benchmark() (tickbench.py) converts a
+data file both ways and times reading a window from a cold page cache and from a warm one, next to
+reading it from the text file itself.
+"""
+from __future__ import absolute_import
+import os
+import json
+import time
+import zlib
+import shutil
+import collections
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from market_maker.settings import settings
+from market_maker import getTradeHis, datasort, dataindex
+
+try:
+    # only for TICKSTORE_COMPRESSION = "zstd"
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COLUMNS = [
+    ("timestamp", np.int64),   # epoch seconds
+    ("bidSize", np.int64),
+    ("bidPrice", np.float64),
+    ("askPrice", np.float64),
+    ("askSize", np.int64),
+    ("closePrice", np.float64),
+    ("noneMask", np.uint8),
+]
+
+# bits of the noneMask column, one per field that was "None" in the text file
+NONE_BIDSIZE = 1
+NONE_BIDPRICE = 2
+NONE_ASKPRICE = 4
+NONE_ASKSIZE = 8
+NONE_CLOSEPRICE = 16
+NONE_QUOTE = NONE_BIDSIZE | NONE_BIDPRICE | NONE_ASKPRICE | NONE_ASKSIZE # what IsThereANone() checks
+
+CHUNK_LINES = 100000
+# bump when convertFile() stores other ticks of the same file, so older stores are converted again
+VERSION = 2
+SECONDS_PER_DAY = 86400
+
+
+def storePath(datafilename):
+    return os.path.splitext(datafilename)[0] + ".ticks"
+
+def dateToEpoch(date = "2017-08-01"):
+    return int(np.datetime64(date, "s").astype(np.int64))
+
+def parseLines(lines):
+    """Parse recorder lines into column arrays.
+
+    Prices and sizes follow the getTradeHis.get*FromLine() rules: a missing price falls back to
+    the other side of the book (-1 if both are missing) and a missing size is 0.
+    """
+    n = len(lines)
+    timestamps = []
+    bidSize = np.zeros(n, np.int64)
+    bidPrice = np.zeros(n, np.float64)
+    askPrice = np.zeros(n, np.float64)
+    askSize = np.zeros(n, np.int64)
+    closePrice = np.zeros(n, np.float64)
+    noneMask = np.zeros(n, np.uint8)
+    for i in range(n):
+        fields = lines[i].split()
+        timestamps.append(fields[0][:19])
+        mask = 0
+        if fields[1] == "None":
+            mask |= NONE_BIDSIZE
+        else:
+            bidSize[i] = int(fields[1])
+        if fields[4] == "None":
+            mask |= NONE_ASKSIZE
+        else:
+            askSize[i] = int(fields[4])
+        bid = fields[2]
+        ask = fields[3]
+        if bid == "None":
+            mask |= NONE_BIDPRICE
+            bid = ask
+        if ask == "None":
+            mask |= NONE_ASKPRICE
+            ask = fields[2]
+        bidPrice[i] = -1 if bid == "None" else float(bid)
+        askPrice[i] = -1 if ask == "None" else float(ask)
+        if fields[5] == "None":
+            mask |= NONE_CLOSEPRICE
+            closePrice[i] = np.nan
+        else:
+            closePrice[i] = float(fields[5])
+        noneMask[i] = mask
+    timestamp = np.array(timestamps, dtype="datetime64[s]").astype(np.int64)
+    return {"timestamp": timestamp, "bidSize": bidSize, "bidPrice": bidPrice, "askPrice": askPrice,
+            "askSize": askSize, "closePrice": closePrice, "noneMask": noneMask}
+
+def _readChunks(lines):
+    chunk = []
+    for line in lines:
+        if not line.strip():
+            continue
+        chunk.append(line)
+        if len(chunk) == CHUNK_LINES:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def checkCompression(compression):
+    if compression not in ("", "zlib", "zstd"):
+        raise ValueError("unknown tick store compression %r" % compression)
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("tick store compression \"zstd\" needs the zstandard package")
+
+def compress(data, compression):
+    checkCompression(compression)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level = 3).compress(data)
+    return zlib.compress(data, 6)
+
+def decompress(data, compression):
+    checkCompression(compression)
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def _removeOtherFiles(storename, compression):
+    # a store holds either the plain columns or chunks.bin
+    names = [name + ".npy" for name, dtype in COLUMNS] if compression else ["chunks.bin"]
+    for name in names:
+        if os.path.isfile(os.path.join(storename, name)):
+            os.remove(os.path.join(storename, name))
+
+class _ChunkWriter:
+    """Writes parsed rows in time order to chunks.bin, a compressed chunk per chunkDays days"""
+    def __init__(self, storename, compression, chunkDays):
+        self.file = open(os.path.join(storename, "chunks.bin"), "wb")
+        self.compression = compression
+        self.chunkSeconds = chunkDays * SECONDS_PER_DAY
+        self.number = None # of the chunk that is still open
+        self.pieces = []
+        self.index = [] # [first timestamp, last timestamp, rows, offset, length] per chunk
+
+    def add(self, parsed):
+        numbers = parsed["timestamp"] // self.chunkSeconds
+        cuts = [0] + (np.flatnonzero(np.diff(numbers)) + 1).tolist() + [len(numbers)]
+        for first, last in zip(cuts[:-1], cuts[1:]):
+            if self.number is not None and numbers[first] != self.number:
+                self.flush()
+            self.number = numbers[first]
+            self.pieces.append(dict((name, parsed[name][first:last]) for name, dtype in COLUMNS))
+
+    def flush(self):
+        if not self.pieces:
+            return
+        columns = dict((name, np.concatenate([piece[name] for piece in self.pieces]).astype(dtype)) for name, dtype in COLUMNS)
+        timestamp = columns["timestamp"]
+        # the steps between the timestamps are nearly all the same, they compress to almost nothing
+        columns["timestamp"] = np.diff(timestamp, prepend = 0)
+        data = compress(b"".join(columns[name].tobytes() for name, dtype in COLUMNS), self.compression)
+        self.index.append([int(timestamp[0]), int(timestamp[-1]), len(timestamp), self.file.tell(), len(data)])
+        self.file.write(data)
+        self.pieces = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+def convertFile(datafilename, storename = None, compression = None):
+    """Convert a recorder text file into a columnar tick store and return the opened store.
+
+    compression is TICKSTORE_COMPRESSION if not given, "" for plain columns.
+    """
+    compression = settings.TICKSTORE_COMPRESSION if compression is None else compression
+    # before anything of an existing store is overwritten
+    checkCompression(compression)
+    if storename is None:
+        storename = storePath(datafilename)
+    if not os.path.isdir(storename):
+        os.makedirs(storename)
+
+    order, rows = datasort.lineOrder(datafilename)
+    meta = {
+        "source": os.path.abspath(datafilename),
+        "sourceSize": os.path.getsize(datafilename),
+        "sourceMtime": os.path.getmtime(datafilename),
+        "rows": rows,
+        "version": VERSION,
+    }
+    _removeOtherFiles(storename, compression)
+    if compression:
+        writer = _ChunkWriter(storename, compression, settings.TICKSTORE_CHUNK_DAYS)
+        for chunk in _readChunks(datasort.sortedLines(datafilename, order)):
+            writer.add(parseLines(chunk))
+        writer.close()
+        bounds = [bound for first, last, count, offset, length in writer.index for bound in (first, last)]
+        meta["ascending"] = bounds == sorted(bounds)
+        meta["rows"] = sum(count for first, last, count, offset, length in writer.index)
+        meta["compression"] = compression
+        meta["chunks"] = writer.index
+        with open(os.path.join(storename, "meta.json"), "w") as metafile:
+            json.dump(meta, metafile)
+        return loadStore(storename)
+
+    columns = {}
+    for name, dtype in COLUMNS:
+        columns[name] = np.lib.format.open_memmap(os.path.join(storename, name + ".npy"), mode="w+",
+                                                  dtype=dtype, shape=(rows,))
+    row = 0
+    for chunk in _readChunks(datasort.sortedLines(datafilename, order)):
+        parsed = parseLines(chunk)
+        for name, dtype in COLUMNS:
+            columns[name][row:row + len(chunk)] = parsed[name]
+        row += len(chunk)
+
+    for name in columns:
+        columns[name].flush()
+    if row < rows:
+        # sortedLines() keeps one line of a timestamp that was recorded more than once
+        for name, dtype in COLUMNS:
+            column = np.array(columns.pop(name)[:row])
+            np.save(os.path.join(storename, name + ".npy"), column)
+            columns[name] = column
+        meta["rows"] = rows = row
+    timestamp = columns["timestamp"]
+    meta["ascending"] = bool(rows < 2 or np.all(timestamp[1:] >= timestamp[:-1]))
+    del columns, timestamp
+    with open(os.path.join(storename, "meta.json"), "w") as metafile:
+        json.dump(meta, metafile)
+    return TickStore(storename)
+
+def isUpToDate(datafilename, storename = None):
+    if storename is None:
+        storename = storePath(datafilename)
+    metaname = os.path.join(storename, "meta.json")
+    if not os.path.isfile(metaname):
+        return False
+    if not os.path.isfile(datafilename):
+        return True # the store is all we have
+    with open(metaname, "r") as metafile:
+        meta = json.load(metafile)
+    return meta["sourceSize"] == os.path.getsize(datafilename) and meta["sourceMtime"] == os.path.getmtime(datafilename)
+
+def openStore(datafilename):
+    """Open the tick store of a data file, converting the text file first if needed"""
+    storename = storePath(datafilename)
+    if isUpToDate(datafilename, storename):
+        store = loadStore(storename)
+        # a store of an unsorted file from before the conversion sorted, one of an older VERSION or one
+        # that is not compressed the way TICKSTORE_COMPRESSION says is converted again
+        if not os.path.isfile(datafilename) or (store.ascending and store.meta.get("version") == VERSION and
+                                                store.compression == settings.TICKSTORE_COMPRESSION):
+            return store
+    return convertFile(datafilename, storename)
+
+def loadStore(storename):
+    """Open a converted tick store, compressed or not"""
+    with open(os.path.join(storename, "meta.json"), "r") as metafile:
+        meta = json.load(metafile)
+    return ChunkedTickStore(storename, meta) if meta.get("compression") else TickStore(storename, meta)
+
+
+class TickStore:
+    # row of the whole store the columns start at
+    firstRow = 0
+
+    def __init__(self, storename, meta = None):
+        self.storename = storename
+        if meta is None:
+            with open(os.path.join(storename, "meta.json"), "r") as metafile:
+                meta = json.load(metafile)
+        self.meta = meta
+        self.ascending = self.meta["ascending"]
+        self.compression = self.meta.get("compression", "")
+        self._openColumns()
+
+    def _openColumns(self):
+        for name, dtype in COLUMNS:
+            setattr(self, name, np.load(os.path.join(self.storename, name + ".npy"), mmap_mode="r"))
+
+    def __len__(self):
+        """Rows of the columns, for a ChunkedTickStore those of the last window(); meta["rows"] has the whole store"""
+        return len(self.timestamp)
+
+    def window(self, startdate, enddate):
+        """Row range [first, last) holding the ticks of the days startdate <= day < enddate"""
+        if not self.ascending:
+            raise ValueError("%s is not in ascending time order" % self.storename)
+        bounds = np.searchsorted(self.timestamp, [dateToEpoch(startdate), dateToEpoch(enddate)])
+        return int(bounds[0]), int(bounds[1])
+
+    def dayBounds(self, first, last):
+        """Start rows of every day in the row range [first, last), followed by last"""
+        days = self.timestamp[first:last] // SECONDS_PER_DAY
+        starts = np.flatnonzero(np.diff(days)) + 1
+        return [first] + (starts + first).tolist() + [last]
+
+    def ticks(self, first, last):
+        """getTradeHis.Tick records for the rows [first, last)"""
+        timestamp = np.datetime_as_string(self.timestamp[first:last].astype("datetime64[s]")).tolist()
+        return list(map(getTradeHis.Tick, timestamp, self.bidSize[first:last].tolist(),
+                        self.bidPrice[first:last].tolist(), self.askPrice[first:last].tolist(),
+                        self.askSize[first:last].tolist(), self.closePrice[first:last].tolist(),
+                        (self.noneMask[first:last] & NONE_QUOTE).astype(bool).tolist()))
+
+    def iterDays(self, startdate, enddate):
+        """Yield (date, ticks) for every day in [startdate, enddate), like getTradeHis.iterDaysFromFile()"""
+        first, last = self.window(startdate, enddate)
+        bounds = self.dayBounds(first, last)
+        for i in range(len(bounds) - 1):
+            if bounds[i] == bounds[i + 1]:
+                continue
+            ticks = self.ticks(bounds[i], bounds[i + 1])
+            yield ticks[0].date, ticks
+
+
+class ChunkedTickStore(TickStore):
+    """A compressed tick store. Its columns hold the chunks of the last window(), not the whole store"""
+    def _openColumns(self):
+        self.chunks = self.meta["chunks"]
+        self.loaded = None
+        # decompressed chunks by number, the least recently used go first
+        self.cache = collections.OrderedDict()
+        self.cacheSize = settings.TICKSTORE_CHUNK_CACHE or 0
+        self.executor = None
+        self.executorPid = None
+        for name, dtype in COLUMNS:
+            setattr(self, name, np.zeros(0, dtype))
+
+    def _readChunks(self, numbers):
+        """The columns of the chunks of numbers, from the cache or decompressed on the threads of the store"""
+        missing = [k for k in numbers if k not in self.cache]
+        if missing:
+            # one pool for the store, started again in a forked process that has none of its threads
+            if self.executor is None or self.executorPid != os.getpid():
+                self.executor = ThreadPoolExecutor(max_workers = os.cpu_count() or 1)
+                self.executorPid = os.getpid()
+            # zlib and zstd let go of the GIL while they decompress
+            for k, part in zip(missing, self.executor.map(self._readChunk, missing)):
+                self.cache[k] = part
+        for k in numbers:
+            self.cache.move_to_end(k)
+        parts = [self.cache[k] for k in numbers]
+        while len(self.cache) > max(self.cacheSize, len(numbers)):
+            self.cache.popitem(last = False)
+        return parts
+
+    def _readChunk(self, k):
+        first, last, rows, offset, length = self.chunks[k]
+        with open(os.path.join(self.storename, "chunks.bin"), "rb") as chunkfile:
+            chunkfile.seek(offset)
+            data = decompress(chunkfile.read(length), self.compression)
+        columns = {}
+        position = 0
+        for name, dtype in COLUMNS:
+            columns[name] = np.frombuffer(data, dtype, rows, position)
+            position += rows * np.dtype(dtype).itemsize
+        columns["timestamp"] = np.cumsum(columns["timestamp"])
+        return columns
+
+    def window(self, startdate, enddate):
+        """Row range [first, last) holding the ticks of the days startdate <= day < enddate, in the
+        columns of the chunks of those days that window() loads"""
+        if not self.ascending:
+            raise ValueError("%s is not in ascending time order" % self.storename)
+        start, end = dateToEpoch(startdate), dateToEpoch(enddate)
+        needed = [k for k, chunk in enumerate(self.chunks) if chunk[1] >= start and chunk[0] < end]
+        if needed != self.loaded:
+            parts = self._readChunks(needed)
+            for name, dtype in COLUMNS:
+                setattr(self, name, np.concatenate([part[name] for part in parts]) if parts else np.zeros(0, dtype))
+            self.loaded = needed
+            self.firstRow = sum(chunk[2] for chunk in self.chunks[:needed[0]]) if needed else 0
+        bounds = np.searchsorted(self.timestamp, [start, end])
+        return int(bounds[0]), int(bounds[1])
+
+
+def _files(path):
+    """path, or the files of a store directory"""
+    if not os.path.isdir(path):
+        return [path]
+    return [os.path.join(path, name) for name in sorted(os.listdir(path)) if os.path.isfile(os.path.join(path, name))]
+
+
+def dropCache(*paths):
+    """Tell the kernel to drop the cached pages of files and stores, the next read comes from the disk"""
+    for path in paths:
+        for filename in _files(path):
+            with open(filename, "rb") as cachedfile:
+                os.posix_fadvise(cachedfile.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _size(*paths):
+    return sum(os.path.getsize(filename) for path in paths for filename in _files(path))
+
+
+def _timeReads(read, paths, repeat):
+    """(cold, warm) best time of repeat calls of read() in seconds, cold right after dropCache() of
+    paths and None where the page cache can't be dropped"""
+    cold = []
+    warm = []
+    for i in range(repeat):
+        for times in (cold, warm) if hasattr(os, "posix_fadvise") else (warm,):
+            if times is cold:
+                dropCache(*paths)
+            started = time.time()
+            read()
+            times.append(time.time() - started)
+    return min(cold) if cold else None, min(warm)
+
+
+def benchmark(datafilename, startdate, enddate, compressions = None, repeat = 3):
+    """{kind: (bytes on disk, cold read, warm read)} of the ticks of [startdate, enddate) of a data file.
+
+    "text" reads the days from the data file and its index with getTradeHis.iterDaysFromFile(), the
+    other kinds load them from a store of that compression ("" for the plain columns), converted in
+    a directory next to the file and opened afresh for every read, so no chunk is decompressed yet.
+    A cold read comes right after dropCache(), a warm one from the page cache. The times are the
+    best of repeat reads in seconds, a cold read is None where the page cache can't be dropped.
+    """
+    if compressions is None:
+        compressions = ["", "zlib"] + (["zstd"] if zstandard is not None else [])
+    textfile = datasort.normalizedFile(datafilename)
+    if not dataindex.isUpToDate(textfile):
+        dataindex.buildIndex(textfile)
+    paths = [textfile, dataindex.indexPath(textfile)]
+
+    def readText():
+        for date, ticks in getTradeHis.iterDaysFromFile(textfile, startdate, enddate):
+            pass
+    result = {"text": (_size(*paths),) + _timeReads(readText, paths, repeat)}
+    directory = os.path.splitext(datafilename)[0] + ".bench"
+    try:
+        for compression in compressions:
+            storename = os.path.join(directory, compression or "plain")
+            convertFile(datafilename, storename, compression)
+
+            def readStore():
+                store = loadStore(storename)
+                first, last = store.window(startdate, enddate)
+                for name, dtype in COLUMNS:
+                    # reading the memmap of a plain store is what reads its pages
+                    np.array(getattr(store, name)[first:last])
+            result[compression] = (_size(storename),) + _timeReads(readStore, [storename], repeat)
+    finally:
+        shutil.rmtree(directory, ignore_errors = True)
+    return result
+
+
+def runBenchmark():
+    print("reading %s - %s of %s" % (settings.START_DATE, settings.END_DATE, settings.BACKTESTFILE))
+    for kind, (size, cold, warm) in benchmark(settings.BACKTESTFILE, settings.START_DATE, settings.END_DATE).items():
+        print("%-6s %8.1f MB  cold %s  warm %.3fs" % (kind or "plain", size / 1e6,
+                                                      "%.3fs" % cold if cold is not None else "n/a", warm))
+
+
+def run():
+    store = convertFile(settings.BACKTESTFILE)
+    print("%d ticks written to %s" % (store.meta["rows"], store.storename))
+    if store.compression:
+        size = sum(length for first, last, rows, offset, length in store.chunks)
+        print("%s, %d chunks, %.1f MB of %.1f MB text" % (store.compression, len(store.chunks), size / 1e6,
+                                                          store.meta["sourceSize"] / 1e6))
@@ -0,0 +1,133 @@
+"""Structured events of the strategy code
+
+The strategies report what they do (a trade, the unit of the day, a tick the price filter skipped)
+as events instead of printing them. An event is a typed record: its level, its kind, the time of
+the strategy and the message as a %-template with its arguments. The message is only formatted
+when a sink takes the event, so an event below the level of the sink costs one call and one
+comparison.
+
+The sink of the process decides where the events go:
+
+    PrintSink  - the terminal, the same lines the strategies used to print (the default)
+    FileSink   - one JSON object per line
+    MemorySink - a list, e.g. to look at the trades of a backtest in a test
+    NullSink   - nowhere, the sweep workers use it
+
+EVENT_LEVEL and EVENT_SINK in settings choose the sink the process starts with. It is opened on the
+first event that goes to it, so importing this module opens no file.
+"""
+from __future__ import absolute_import
+import sys
+import json
+import collections
+from market_maker.settings import settings
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "OFF": OFF}
+
+
+class Event(collections.namedtuple("Event", "level kind time text args")):
+    __slots__ = ()
+
+    @property
+    def message(self):
+        return self.text % self.args if self.args else self.text
+
+    def asdict(self):
+        return dict(level = self.level, kind = self.kind, time = self.time, message = self.message, args = list(self.args))
+
+
+class NullSink:
+    level = OFF
+
+    def write(self, event):
+        pass
+
+    def close(self):
+        pass
+
+
+class PrintSink(NullSink):
+    def __init__(self, level = INFO, stream = None):
+        self.level = level
+        self.stream = stream
+
+    def write(self, event):
+        (self.stream or sys.stdout).write(event.time + event.message + "\n")
+
+
+class FileSink(NullSink):
+    def __init__(self, filename, level = INFO):
+        self.level = level
+        self.file = open(filename, "a")
+
+    def write(self, event):
+        # numpy numbers that json doesn't know go as floats
+        self.file.write(json.dumps(event.asdict(), ensure_ascii = False, default = float) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class MemorySink(NullSink):
+    def __init__(self, level = DEBUG):
+        self.level = level
+        self.events = []
+
+    def write(self, event):
+        self.events.append(event)
+
+    def ofKind(self, kind):
+        return [event for event in self.events if event.kind == kind]
+
+
+def settingsLevel():
+    """The level of EVENT_LEVEL, INFO if it is not set"""
+    return LEVELS[settings.EVENT_LEVEL or "INFO"]
+
+
+def openSink(name = None, level = None):
+    """The sink of EVENT_SINK: "" for the terminal, "none" or a file name"""
+    name = settings.EVENT_SINK if name is None else name
+    level = settingsLevel() if level is None else level
+    if name == "none":
+        return NullSink()
+    if name:
+        return FileSink(name, level)
+    return PrintSink(level)
+
+
+# the sink of the process, None until the first emit() opens the sink of the settings
+sink = None
+# the level of sink, read by every emit()
+level = settingsLevel()
+
+
+def setSink(newSink):
+    """Send the events to newSink from now on, None for the sink of the settings; returns the sink before"""
+    global sink, level
+    oldSink = sink
+    sink = newSink
+    level = settingsLevel() if newSink is None else newSink.level
+    return oldSink
+
+
+def _settingsSink():
+    global sink, level
+    sink = openSink()
+    level = sink.level
+    return sink
+
+
+def enabled(eventLevel):
+    """Whether events of eventLevel go anywhere, to skip work that is only needed for them"""
+    return eventLevel >= level
+
+
+def emit(eventLevel, kind, time, text, *args):
+    """Report an event at time, text % args is its message"""
+    if eventLevel >= level:
+        (sink or _settingsSink()).write(Event(eventLevel, kind, time, text, args))
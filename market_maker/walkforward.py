@@ -0,0 +1,100 @@
+"""Walk-forward optimization
+
+The period START_DATE - END_DATE is cut into rolling windows: the parameter search runs on
+WALKFORWARD_INSAMPLE_DAYS (in-sample), and its best parameter set is then traded on the following
+WALKFORWARD_OUTSAMPLE_DAYS (out-of-sample). The next window starts one out-of-sample period later.
+The out-of-sample equity curves, each starting from START_BTCOIN, are compounded into one curve.
+
+All in-sample runs of all windows go to the process pool as one batch, and so do the out-of-sample
+runs. Every in-sample run lands in the result cache, so a walk-forward that is run again, or on a
+longer period, only runs the windows it hasn't seen. The windows overlap, and the workers keep one
+indicator cache for all of them: the accepted ticks and the daily highs and lows are computed once for
+the whole data file and each window takes its slice (see indicatorcache.py).
+"""
+from __future__ import absolute_import
+import numpy as np
+from market_maker.settings import settings
+from market_maker import sweep, getTradeHis
+
+
+def windows(startdate, enddate, inSampleDays, outSampleDays):
+    """(inSampleStart, inSampleEnd, outSampleEnd) of every window, the out-of-sample part starts at inSampleEnd"""
+    result = []
+    start = startdate
+    while getTradeHis.getXDaysAfter(start, inSampleDays) < enddate:
+        end = getTradeHis.getXDaysAfter(start, inSampleDays)
+        result.append((start, end, min(getTradeHis.getXDaysAfter(end, outSampleDays), enddate)))
+        start = getTradeHis.getXDaysAfter(start, outSampleDays)
+    return result
+
+
+def stitch(curves):
+    """Compound the equity curves (USD benifit in percent) of consecutive runs into one curve"""
+    wealth = 1.0
+    stitched = []
+    for equity in curves:
+        if not len(equity):
+            continue
+        growth = 1 + np.asarray(equity) / 100
+        stitched.extend(((wealth * growth - 1) * 100).tolist())
+        wealth *= growth[-1]
+    return stitched
+
+
+def walkForward(grid, strategy = None, datafilename = None, startdate = None, enddate = None, inSampleDays = None,
+                outSampleDays = None, key = None, workers = None):
+    """Run the walk-forward, returns the windows and the stitched out-of-sample dates and equity.
+
+    Every window is a dict with its dates, the best in-sample run by key (see sweep.rank()) and the
+    out-of-sample run of its parameters; both runs are None if no parameter set finished in-sample.
+    """
+    startdate = startdate or settings.START_DATE
+    enddate = enddate or settings.END_DATE
+    inSampleDays = inSampleDays or settings.WALKFORWARD_INSAMPLE_DAYS
+    outSampleDays = outSampleDays or settings.WALKFORWARD_OUTSAMPLE_DAYS
+    cuts = windows(startdate, enddate, inSampleDays, outSampleDays)
+    # the in-sample searches don't depend on each other
+    jobs = [(params, inStart, inEnd, False) for inStart, inEnd, outEnd in cuts for params in grid]
+    inSample = sweep.runJobs(jobs, strategy, datafilename, workers)
+    result = []
+    for i, (inStart, inEnd, outEnd) in enumerate(cuts):
+        ranked = sweep.rank(inSample[i * len(grid):(i + 1) * len(grid)], key)
+        result.append(dict(inSampleStart = inStart, inSampleEnd = inEnd, outSampleEnd = outEnd,
+                           inSample = ranked[0] if ranked else None, outSample = None))
+    searched = [window for window in result if window["inSample"] is not None]
+    jobs = [(window["inSample"]["params"], window["inSampleEnd"], window["outSampleEnd"], True) for window in searched]
+    for window, run in zip(searched, sweep.runJobs(jobs, strategy, datafilename, workers, cache = False)):
+        window["outSample"] = run
+    runs = [window["outSample"] for window in result if window["outSample"] is not None and "error" not in window["outSample"]]
+    dates = [date for run in runs for date in run["dates"]]
+    return result, dates, stitch([run["equity"] for run in runs])
+
+
+def printWindows(result):
+    for window in result:
+        line = "%s - %s -> %s  " % (window["inSampleStart"], window["inSampleEnd"], window["outSampleEnd"])
+        inSample, outSample = window["inSample"], window["outSample"]
+        if inSample is None:
+            print(line + "no parameter set finished in-sample")
+            continue
+        params = ", ".join("%s = %g" % (name, inSample["params"][name]) for name in sorted(inSample["params"]))
+        if "error" in outSample:
+            print(line + "%s  in-sample %.2f%%  out-of-sample failed: %s" % (params, inSample["finalUSDBenifit"],
+                                                                          outSample["error"]))
+        else:
+            print(line + "%s  in-sample %.2f%%  out-of-sample %.2f%%" % (params, inSample["finalUSDBenifit"],
+                                                                       outSample["finalUSDBenifit"]))
+
+
+def run():
+    strategy = settings.SEARCH_STRATEGY
+    grid = sweep.spaceGrid(settings.SEARCH_SPACE[strategy])
+    result, dates, equity = walkForward(grid, strategy)
+    printWindows(result)
+    with open("walkforward.txt", "w") as curvefile:
+        for date, value in zip(dates, equity):
+            curvefile.write("%s %.2f\n" % (date, value))
+    if equity:
+        figures = sweep.curveFigures(equity)
+        print("out-of-sample: %.2f%% in USD, max drawdown %.1f%%, sharpe %.2f, sortino %.2f, calmar %.2f" % (
+              equity[-1], figures["maxDrawdown"] * 100, figures["sharpe"], figures["sortino"], figures["calmar"]))
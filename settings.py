@@ -139,15 +139,99 @@ START_BTCOIN = 0.5
 R_BREAKER_F1 = 0.35
 R_BREAKER_F2 = 0.07
 R_BREAKER_F3 = 0.25
+# parameter search of findbestparameter.py, each setting takes a list of values or a (start, stop, step) range
+SEARCH_STRATEGY = "R_Breaker"
+SEARCH_SPACE = {
+    "R_Breaker": {"R_BREAKER_F1": (0.20, 0.50, 0.02), "R_BREAKER_F2": (0, 0.20, 0.02), "R_BREAKER_F3": (0.10, 0.40, 0.02)},
+    "Turtle": {"DonchianN": [3, 5, 10, 20], "ATRN": [3, 5, 10, 20], "ADDTIME": [2, 4, 6, 10],
+               "ZHIYINGUSD": [500.0, 1000.0, 2000.0]},
+    "MovingAverage": {"AVERGAGEDAY": [10, 20, 30], "AVERAGENUMPERIORD": [10, 20, 40], "ATRN": [5, 10],
+                      "ADDTIME": [4, 10], "ZHIYINGUSD": [1000.0, 2000.0]},
+}
+# screen on 1/3, 1/9... of the period first (successive halving), 1 runs the whole grid
+SEARCH_RUNGS = 3
+# drop parameter sets whose drawdown passes this fraction during the search, None keeps them all
+SEARCH_MAX_DRAWDOWN = None
+# stop a backtest at the end of the first day its drawdown passes this fraction, None runs it to the end;
+# the search sets it to SEARCH_MAX_DRAWDOWN, so those runs stop using CPU as soon as they are out
+STOP_DRAWDOWN = None
+# finished runs of a search are kept here and not run again, "" turns the cache off
+RESULT_CACHE = "sweepcache.db"
+RESULT_CACHE_SIZE = 100000 # runs, the least recently used go first
+# walkforward.py: search on this many days, trade the best parameters on the next WALKFORWARD_OUTSAMPLE_DAYS
+WALKFORWARD_INSAMPLE_DAYS = 90
+WALKFORWARD_OUTSAMPLE_DAYS = 30
+# compute the indicators of a search once and share them between the runs
+INDICATOR_CACHE = True
+INDICATOR_CACHE_SIZE = 2000 # series, the least recently used go first
+# write the results of the last rung of a search to this .csv or SQLite file, "" for none
+SEARCH_EXPORT = ""
+# the figure a search ranks its runs by: "finalUSDBenifit", "sharpe", "sortino", "calmar", ...;
+# "maxDrawdown" and "drawdownDuration" rank the smallest first
+SEARCH_RANK_BY = "finalUSDBenifit"
+# yearly risk free rate of the Sharpe and Sortino ratios
+RISK_FREE_RATE = 0.0325
+# analyze.py: rank the runs of the search space by this figure ("" for SEARCH_RANK_BY) and show
+# the best of it over two parameters, ANALYTICS_AXES (the first two of the space if empty)
+ANALYTICS_FIGURE = ""
+ANALYTICS_AXES = []
+# draw that heatmap to heatmap.html like draw.py, needs plotly
+ANALYTICS_PLOT = True
 
 #data record and backtest
 START_DATE = "2017-08-01"
 END_DATE = "2017-08-05"
 BACKTESTFILE = "backtestingdata" + START_DATE + END_DATE + ".csv"
+# data of every symbol of CONTRACTS for portfoliobacktest.py, symbols without an entry use BACKTESTFILE
+BACKTESTFILES = {}
+# datarecord.py records these symbols, each into its file of BACKTESTFILES; [] for SYMBOL into BACKTESTFILE
+RECORD_SYMBOLS = []
+# quote buckets per request, the most BitMEX returns at once
+RECORD_PAGE_COUNT = 1000
+# requests running at once
+RECORD_THREADS = 4
+# the REST rate limit of BitMEX, and how many requests may go out at once after a pause
+RECORD_REQUESTS_PER_MINUTE = 60
+RECORD_BURST = 5
+# importdumps.py: the public BitMEX dumps of trades and quotes to import, gzipped CSV files
+IMPORT_TRADE_FILES = "dumps/trade/*.csv.gz"
+IMPORT_QUOTE_FILES = "dumps/quote/*.csv.gz"
+# the bars of these periods (min) of RECORD_SYMBOLS go to e.g. import/XBTUSD-5m.csv, every trade and
+# quote to import/XBTUSD-trades.res and import/XBTUSD-quotes.res
+IMPORT_PERIODS = [1, 5, 60, 1440]
+IMPORT_DIRECTORY = "import"
+# rows of a dump read at once
+IMPORT_CHUNK_ROWS = 200000
+# read BACKTESTFILE through its binary tick store (converted once, see tickconvert.py)
+BACKTEST_TICKSTORE = True
+# data files that are not in time order are sorted in runs of this many lines, held in memory
+SORT_CHUNK_LINES = 2000000
+# store the tick store compressed, in chunks of TICKSTORE_CHUNK_DAYS days: "zlib", "zstd" (needs the
+# zstandard package) or "" for plain columns; a backtest only decompresses the days it runs on.
+# It saves disk, but only reads faster where the disk is slower than decompressing: see tickbench.py
+TICKSTORE_COMPRESSION = ""
+TICKSTORE_CHUNK_DAYS = 7
+# decompressed chunks a compressed store keeps, for the next windows that overlap the last ones
+TICKSTORE_CHUNK_CACHE = 16
+# write grafic, grafic2 and the trades as binary .res files instead of text (see resultwriter.py)
+RESULTS_BINARY = True
+# write those files at all, the workers of a search never do
+RECORD_RESULTS = True
+# draw.py draws at most this many points per line: the highest, the lowest, those of PLOT_FULL_RANGES
+# and the rest picked so the shape of the line stays (LTTB)
+PLOT_POINTS = 5000
+# every point between these times, even where they alone are more, e.g. [("2017-09-01", "2017-09-08")]
+PLOT_FULL_RANGES = []
+# events of the strategies (trades, the daily unit, skipped ticks) at this level and above:
+# "DEBUG", "INFO", "WARNING" or "OFF"
+EVENT_LEVEL = "INFO"
+# where the events go: "" for the terminal, "none", or a file that gets one JSON object per event
+EVENT_SINK = ""
 
 # Turle 
 DonchianN = 5 #number of backtime
 ATRN = 5
+ATR_WILDER = False # smooth the ATR like Wilder instead of the mean over ATRN days
 ADDTIME = 10
 ZHIYINGUSD = 1000.0
 
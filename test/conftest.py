@@ -0,0 +1,39 @@
+"""Fixtures of the tests, run them from the top directory with python -m pytest test"""
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# market_maker.settings reads ../settings.py from the working directory and takes sys.argv[1] for a symbol
+_cwd, _argv = os.getcwd(), sys.argv
+os.chdir(ROOT)
+sys.argv = sys.argv[:1]
+from market_maker.settings import settings
+os.chdir(_cwd)
+sys.argv = _argv
+
+DATAFILE = os.path.join(ROOT, "backtestingdata2017.csv")
+
+
+@pytest.fixture(scope = "session")
+def datafile(tmp_path_factory):
+    """2017-09-25 - 2017-10-17 of backtestingdata2017.csv, ascending and with every timestamp once"""
+    lines = {}
+    for line in open(DATAFILE):
+        if "2017-09-25" <= line[:10] < "2017-10-18":
+            lines[line[:19]] = line
+    filename = str(tmp_path_factory.mktemp("data") / "slice.csv")
+    with open(filename, "w") as slicefile:
+        slicefile.write("".join(lines[key] for key in sorted(lines)))
+    return filename
+
+
+@pytest.fixture
+def setSettings(monkeypatch):
+    """Override settings for one test"""
+    def setter(**values):
+        for name, value in values.items():
+            monkeypatch.setitem(settings, name, value)
+    return setter
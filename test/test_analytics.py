@@ -0,0 +1,24 @@
+"""Ranking and heatmaps of many runs"""
+import numpy as np
+from market_maker.utils.dotdict import dotdict
+from market_maker import analytics
+
+NAN = float("nan")
+
+
+def test_rank_runs_puts_the_failed_runs_last():
+    figures = dotdict(sharpe = np.array([0.5, NAN, 2.0, 1.0]), maxDrawdown = np.array([0.3, NAN, 0.1, 0.2]),
+                      drawdownDuration = np.array([4.0, NAN, 9.0, 2.0]))
+    assert analytics.rankRuns(figures, "sharpe").tolist() == [2, 3, 0, 1]
+    assert analytics.rankRuns(figures, "maxDrawdown").tolist() == [2, 3, 0, 1]
+    assert analytics.rankRuns(figures, "drawdownDuration").tolist() == [3, 0, 2, 1]
+
+
+def test_heatmap_takes_the_best_run_of_a_cell():
+    runs = dotdict(names = ["x", "y", "z"], params = np.array([[1, 1, 0], [1, 1, 1], [2, 1, 0], [2, 2, 0]], float))
+    values = np.array([0.3, 0.1, NAN, 0.2])
+    xs, ys, grid = analytics.heatmap(runs, values, "x", "y")
+    assert xs.tolist() == [1, 2] and ys.tolist() == [1, 2]
+    assert np.array_equal(grid, [[0.3, NAN], [NAN, 0.2]], equal_nan = True)
+    xs, ys, grid = analytics.heatmap(runs, values, "x", "y", lowerIsBetter = True)
+    assert np.array_equal(grid, [[0.1, NAN], [NAN, 0.2]], equal_nan = True)
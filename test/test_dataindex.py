@@ -0,0 +1,75 @@
+"""The date index of the data files and the readers that seek with it"""
+import os
+import pytest
+from market_maker import dataindex, getTradeHis
+
+LINES = ["2017-08-01T00:00:00.000Z 28547 2854.7 2859 28448 2854.7\n",
+         "2017-08-01T12:00:00.000Z 28000 2860.1 2861 20000 2854.7\n",
+         "2017-08-02T00:00:00.000Z 27000 2870.5 2871 21000 2860.0\n",
+         "2017-08-02T12:00:00.000Z 26000 2880.5 2881 22000 2860.0\n",
+         "2017-08-03T00:00:00.000Z 25000 2890.5 2891 23000 2880.0\n"]
+
+
+def write(filename, lines):
+    with open(filename, "w", newline = "\n") as datafile:
+        datafile.write("".join(lines))
+    return filename
+
+
+def fields(days):
+    return [(date, [(tick.timestamp, tick.bidSize, tick.bidPrice, tick.askPrice, tick.askSize, tick.closePrice)
+                    for tick in ticks]) for date, ticks in days]
+
+
+def test_index_entries(tmp_path):
+    filename = write(str(tmp_path / "data.csv"), LINES)
+    writer = dataindex.buildIndex(filename)
+    assert [entry[0] for entry in writer.entries] == ["2017-08-01", "2017-08-02", "2017-08-03"]
+    assert dataindex.loadIndex(filename)["2017-08-02"] == (len(LINES[0]) + len(LINES[1]), 2)
+    assert dataindex.isUpToDate(filename)
+    assert dataindex.isAscending(filename)
+
+
+def test_blank_lines_inside_a_day(tmp_path):
+    filename = write(str(tmp_path / "data.csv"), LINES[:1] + ["\n"] + LINES[1:3] + ["\r\n", "\n"] + LINES[3:])
+    dataindex.buildIndex(filename)
+    days = list(getTradeHis.iterDaysFromFile(filename, "2017-08-01", "2017-08-04"))
+    assert fields(days) == fields(getTradeHis.scanDaysFromFile(filename, "2017-08-01", "2017-08-04"))
+    assert [len(ticks) for date, ticks in days] == [2, 2, 1]
+
+
+def test_edit_of_the_same_size_makes_the_index_stale(tmp_path):
+    filename = write(str(tmp_path / "data.csv"), LINES)
+    dataindex.buildIndex(filename)
+    # a line moves from one day to the other, the file keeps its size
+    stat = os.stat(filename)
+    write(filename, LINES[:1] + [LINES[1].replace("2017-08-01T12", "2017-08-02T01")] + LINES[2:])
+    os.utime(filename, (stat.st_atime, stat.st_mtime + 1))
+    assert os.path.getsize(filename) == stat.st_size
+    assert not dataindex.isUpToDate(filename)
+    assert dataindex.loadIndex(filename) is None
+    days = list(getTradeHis.iterDaysFromFile(filename, "2017-08-01", "2017-08-04"))
+    assert [len(ticks) for date, ticks in days] == [1, 3, 1]
+
+
+@pytest.mark.parametrize("header", ["# 100\n", "# 100 ascending\n"])
+def test_older_index_formats_are_rebuilt(tmp_path, header):
+    filename = write(str(tmp_path / "data.csv"), LINES)
+    with open(dataindex.indexPath(filename), "w") as indexfile:
+        indexfile.write(header + "2017-08-01 0 2\n")
+    assert not dataindex.isUpToDate(filename)
+    assert len(dataindex.openIndex(filename).entries) == 3
+
+
+def test_open_index_goes_on_with_appended_lines(tmp_path):
+    filename = write(str(tmp_path / "data.csv"), LINES[:3])
+    dataindex.buildIndex(filename)
+    writer = dataindex.openIndex(filename)
+    with open(filename, "a", newline = "\n") as datafile:
+        datafile.write("".join(LINES[3:]))
+    for line in LINES[3:]:
+        writer.addLine(line)
+    writer.save()
+    assert dataindex.isUpToDate(filename)
+    assert dataindex.loadIndex(filename) == dict((date, (offset, count)) for date, offset, count in
+                                                 dataindex.buildIndex(filename).entries)
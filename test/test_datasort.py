@@ -0,0 +1,65 @@
+"""Time order of the data files: ascending, descending and unsorted, with repeated timestamps"""
+import random
+import pytest
+from market_maker import datasort, dataindex, tickstore
+
+
+def line(day, hour, price = 2854.7):
+    return "2017-08-%02dT%02d:00:00.000Z 28547 %s 2859 28448 2854.7\n" % (day, hour, price)
+
+
+# every bucket once, in time order
+TICKS = [line(day, hour) for day in (1, 2, 3) for hour in (0, 6, 12, 18)]
+# a bucket recorded three times and one recorded twice, the last one of each in the file counts
+AGAIN = [line(2, 6, 1.0), line(2, 6, 2.0), line(3, 0, 1.0)]
+
+
+def write(filename, lines):
+    with open(filename, "w", newline = "\n") as datafile:
+        datafile.write("".join(lines))
+    return filename
+
+
+def withRepeats(lines):
+    """lines with the buckets of AGAIN recorded before their last recording"""
+    result = []
+    for kept in lines:
+        result += [again for again in AGAIN if again[:19] == kept[:19]] + [kept]
+    return result
+
+
+@pytest.mark.parametrize("order, lines", [
+    (datasort.ASCENDING, TICKS), (datasort.ASCENDING, withRepeats(TICKS)),
+    (datasort.DESCENDING, TICKS[::-1]), (datasort.DESCENDING, withRepeats(TICKS[::-1])),
+    (datasort.UNSORTED, TICKS[6:] + TICKS[:6]), (datasort.UNSORTED, withRepeats(random.Random(1).sample(TICKS, len(TICKS))))])
+def test_sorted_lines_keep_the_last_line_of_a_timestamp(tmp_path, setSettings, order, lines):
+    setSettings(SORT_CHUNK_LINES = 4)
+    filename = write(str(tmp_path / "data.csv"), lines[:3] + ["\n"] + lines[3:])
+    assert datasort.lineOrder(filename) == (order, len(lines))
+    assert list(datasort.sortedLines(filename)) == TICKS
+
+
+def test_reversed_lines(tmp_path):
+    filename = write(str(tmp_path / "data.csv"), TICKS[:5] + ["\r\n"] + TICKS[5:-1] + [TICKS[-1].rstrip("\n")])
+    assert list(datasort.reversedLines(filename, blockSize = 50)) == TICKS[::-1]
+
+
+def test_normalized_file(tmp_path):
+    ascending = write(str(tmp_path / "ascending.csv"), TICKS)
+    assert datasort.normalizedFile(ascending) == ascending
+    # repeated timestamps are normalized like any other disorder
+    repeated = write(str(tmp_path / "repeated.csv"), withRepeats(TICKS))
+    target = datasort.normalizedFile(repeated)
+    assert target == datasort.sortedPath(repeated)
+    assert open(target).readlines() == TICKS
+    assert dataindex.isUpToDate(target) and dataindex.isAscending(target)
+
+
+@pytest.mark.parametrize("compression", ["", "zlib"])
+def test_tick_store_holds_every_timestamp_once(tmp_path, compression):
+    filename = write(str(tmp_path / "data.csv"), withRepeats(TICKS[::-1]))
+    store = tickstore.convertFile(filename, compression = compression)
+    assert store.meta["rows"] == len(TICKS) and store.ascending
+    first, last = store.window("2017-08-01", "2017-08-04")
+    assert first == 0 and last == len(TICKS)
+    assert [tick.bidPrice for tick in store.ticks(first, last)] == [2854.7] * len(TICKS)
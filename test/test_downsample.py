@@ -0,0 +1,44 @@
+"""Points of the charts picked within the budget"""
+import numpy as np
+import pytest
+from market_maker import downsample
+
+# a slow wave with a spike that no bucket mean would show
+SERIES = np.sin(np.arange(1000) / 50.0)
+SERIES[637] = 10.0
+
+
+@pytest.mark.parametrize("budget", [5, 20, 100, 999])
+def test_lttb_keeps_the_ends_and_the_spike(budget):
+    indices = downsample.lttb(SERIES, budget)
+    assert len(indices) <= budget
+    assert indices[0] == 0 and indices[-1] == len(SERIES) - 1 and 637 in indices
+    assert (np.diff(indices) > 0).all()
+
+
+@pytest.mark.parametrize("budget", [-1, 0, 1, 2, 3])
+def test_lttb_small_budgets(budget):
+    indices = downsample.lttb(SERIES, budget)
+    assert len(indices) == max(budget, 0) and list(indices[:1]) in ([], [0])
+    assert list(downsample.lttb(SERIES[:2], budget)) == [0, 1][:max(budget, 0)]
+
+
+def test_short_series_is_kept():
+    assert list(downsample.lttb(SERIES[:10], 10)) == list(range(10))
+    assert list(downsample.downsample(SERIES[:10], 20)) == list(range(10))
+
+
+@pytest.mark.parametrize("budget", [5, 10, 50])
+def test_downsample_takes_the_extremes_and_ranges_out_of_the_budget(budget):
+    keep = np.zeros(len(SERIES), bool)
+    keep[100:103] = True
+    indices = downsample.downsample(SERIES, budget, keep)
+    assert len(indices) <= budget
+    assert {int(np.argmax(SERIES)), int(np.argmin(SERIES)), 100, 101, 102} <= set(indices.tolist())
+
+
+def test_ranges_longer_than_the_budget_are_kept_in_full():
+    keep = np.zeros(len(SERIES), bool)
+    keep[200:300] = True
+    indices = downsample.downsample(SERIES, 50, keep)
+    assert set(range(200, 300)) <= set(indices.tolist()) and len(indices) == 102
@@ -0,0 +1,77 @@
+"""Import of the public BitMEX trade and quote dumps"""
+import gzip
+import numpy as np
+import pytest
+from market_maker import dumpimport, resultwriter, dataindex
+
+TRADES = {
+    "20170801": [("2017-08-01D10:00:00.000000000", "XBTUSD", "Buy", "100", "2800"),
+                 ("2017-08-01D12:00:00.000000000", "ETHUSD", "Buy", "7", "200"),
+                 ("2017-08-01D23:59:59.500000000", "XBTUSD", "Sell", "50", "2810.5")],
+    "20170802": [("2017-08-02D00:00:00.000000000", "XBTUSD", "Buy", "10", "2811"),
+                 ("2017-08-02D08:00:00.000000000", "XBTUSD", "Sell", "20", "2850")],
+}
+QUOTES = {
+    "20170731": [("2017-07-31D23:00:00.000000000", "XBTUSD", "1", "2790", "2791", "2")],
+    "20170801": [("2017-08-01D23:01:00.000000000", "XBTUSD", "10", "2805", "2806", "20"),
+                 ("2017-08-01D23:02:00.000000000", "ETHUSD", "5", "199", "201", "5"),
+                 ("2017-08-01D23:59:00.000000000", "XBTUSD", "11", "2809", "", "0")],
+    "20170802": [("2017-08-02D00:00:00.000000000", "XBTUSD", "12", "2810", "2811", "22"),
+                 ("2017-08-02D01:05:00.000000000", "XBTUSD", "13", "2820", "2821", "23")],
+}
+
+
+def dumps(directory, kind, days, header):
+    filenames = []
+    for day, rows in days.items():
+        filename = str(directory / ("%s-%s.csv.gz" % (kind, day)))
+        with gzip.open(filename, "wt", newline = "") as dumpfile:
+            dumpfile.write(header + "\n" + "".join(",".join(row) + "\n" for row in rows))
+        filenames.append(filename)
+    return filenames
+
+
+@pytest.fixture
+def imported(tmp_path, setSettings):
+    setSettings(IMPORT_CHUNK_ROWS = 2)
+    trades = dumps(tmp_path, "trade", TRADES, "timestamp,symbol,side,size,price")
+    quotes = dumps(tmp_path, "quote", QUOTES, "timestamp,symbol,bidSize,bidPrice,askPrice,askSize")
+    directory = str(tmp_path / "import")
+    counts = dumpimport.importDumps(trades, quotes, ["XBTUSD"], [60, 1440], directory)
+    return directory, counts
+
+
+def test_bars_take_the_close_of_the_day_before(imported):
+    directory, counts = imported
+    # no bar of 2017-07-31 or 2017-08-01, there is no close of a day before them;
+    # the trade at midnight is the close of 2017-08-01
+    assert open(dumpimport.barFile(directory, "XBTUSD", 60)).readlines() == [
+        "2017-08-02T00:00:00.000Z 12 2810.0 2811.0 22 2811.0\n",
+        "2017-08-02T01:00:00.000Z 12 2810.0 2811.0 22 2811.0\n",
+        "2017-08-02T02:00:00.000Z 13 2820.0 2821.0 23 2811.0\n"]
+    assert open(dumpimport.barFile(directory, "XBTUSD", 1440)).readlines() == [
+        "2017-08-02T00:00:00.000Z 12 2810.0 2811.0 22 2811.0\n",
+        "2017-08-03T00:00:00.000Z 13 2820.0 2821.0 23 2850.0\n"]
+    assert counts == {"XBTUSD": {60: 3, 1440: 2}}
+    assert dataindex.isUpToDate(dumpimport.barFile(directory, "XBTUSD", 60))
+
+
+def test_trades_and_quotes_are_kept(imported):
+    directory, counts = imported
+    trades = resultwriter.readResults(directory + "/XBTUSD-trades.res")
+    assert trades.size.tolist() == [100, -50, 10, -20]
+    assert trades.price.tolist() == [2800.0, 2810.5, 2811.0, 2850.0]
+    quotes = resultwriter.readResults(directory + "/XBTUSD-quotes.res")
+    assert quotes.bidSize.tolist() == [1, 10, 11, 12, 13]
+    assert quotes.askPrice[2] != quotes.askPrice[2]
+
+
+def test_day_closes():
+    closes = dumpimport.DayCloses()
+    day = dumpimport.MICROSECONDS_PER_DAY
+    assert closes.before(5 * day) is None
+    closes.add(np.array([day + 1, day + 2, 3 * day + 1]), np.array([1.0, 2.0, float("nan")]))
+    assert closes.before(day + 5) is None
+    assert closes.before(2 * day) == 2.0
+    # no trade with a price on the 4th day, the close before it counts
+    assert closes.before(4 * day + 5) == 2.0
@@ -0,0 +1,42 @@
+"""The event sink of the settings, opened on the first event"""
+import json
+import importlib
+import pytest
+from market_maker.utils import events
+
+
+@pytest.fixture
+def freshEvents(setSettings):
+    """events as if it was imported with the settings of the test, and again with the old ones after it"""
+    def reload():
+        return importlib.reload(events)
+    yield reload
+    importlib.reload(events)
+
+
+def test_sink_opens_on_the_first_event(tmp_path, setSettings, freshEvents):
+    filename = tmp_path / "events.json"
+    setSettings(EVENT_SINK = str(filename), EVENT_LEVEL = "INFO")
+    module = freshEvents()
+    assert module.sink is None and not filename.exists()
+    module.emit(module.DEBUG, "skipped", "2017-10-01", "below the level")
+    assert not filename.exists()
+    module.emit(module.INFO, "trade", "2017-10-01", "buy %d at %.1f", 3, 4100.5)
+    module.sink.close()
+    assert [json.loads(line)["message"] for line in open(str(filename))] == ["buy 3 at 4100.5"]
+
+
+def test_unset_level_is_info(setSettings, freshEvents):
+    setSettings(EVENT_LEVEL = None, EVENT_SINK = "none")
+    module = freshEvents()
+    assert module.level == module.INFO and module.enabled(module.INFO) and not module.enabled(module.DEBUG)
+    assert module.openSink("", None).level == module.INFO
+
+
+def test_set_sink(freshEvents):
+    module = freshEvents()
+    memory = module.MemorySink()
+    assert module.setSink(memory) is None
+    module.emit(module.DEBUG, "unit", "2017-10-01", "unit %d", 5)
+    assert [event.message for event in memory.ofKind("unit")] == ["unit 5"]
+    assert module.setSink(None) is memory and module.level == module.settingsLevel()
@@ -0,0 +1,67 @@
+"""The array engines against the backtest handlers of OrderManager"""
+import numpy as np
+import pytest
+from market_maker import market_maker, fastbacktest, tickstore
+
+START = "2017-09-26"
+END = "2017-10-17"
+FIGURES = ("totalprofit", "finalUSDBenifit", "numberPostiveTrade", "numberNegativTrade", "dynamic_position", "bankrupt")
+
+CASES = [
+    ("MovingAverage", {}),
+    ("MovingAverage", {"AVERAGENUMPERIORD": 7, "AVERGAGEDAY": 3}),
+    ("MovingAverage", {"ADDTIME": 2, "ZHIYINGUSD": 1}),
+    ("R_Breaker", {}),
+    ("R_Breaker", {"R_BREAKER_F1": 0.1, "R_BREAKER_F2": 0.3, "R_BREAKER_F3": 0.05}),
+    ("R_Breaker", {"R_BREAKER_F1": 0.05, "R_BREAKER_F2": 0.5, "R_BREAKER_F3": 0.01, "ZHISHUN_PROZENT": 0.01}),
+    ("Turtle", {}),
+    ("Turtle", {"DonchianN": 3, "ATRN": 3, "ADDTIME": 1, "ZHIYINGUSD": 2}),
+    ("Turtle", {"DonchianN": 4, "ATRN": 4, "ADDTIME": 2, "ZHIYINGUSD": 5}),
+]
+
+
+def runHandler(strategy, params, datafile, tmp_path, monkeypatch, setSettings):
+    monkeypatch.chdir(tmp_path)
+    setSettings(IS_BACKTESTING = True, STRATEGY = strategy, BACKTESTFILE = datafile, START_DATE = START, END_DATE = END,
+                RESULTS_BINARY = False, RECORD_RESULTS = True, **params)
+    om = market_maker.OrderManager()
+    om.init()
+    om.run_backtesting()
+    return om
+
+
+@pytest.mark.parametrize("strategy, params", CASES)
+def test_engine_matches_handler(strategy, params, datafile, tmp_path, monkeypatch, setSettings):
+    om = runHandler(strategy, params, datafile, tmp_path, monkeypatch, setSettings)
+    result = fastbacktest.ENGINES[strategy](fastbacktest.loadTicks(tickstore.openStore(datafile), START, END), params)
+    assert tuple(getattr(result, name) for name in FIGURES) == tuple(getattr(om, name) for name in FIGURES)
+    grafic = open(str(tmp_path / "grafic.txt")).read().splitlines()
+    lines = ["%.2f %.2f %d %.2f %.2f" % record for record in zip(result.prevClosePrice, result.totalUSDbenifit, result.position,
+                                                              result.movingAveragePrice, result.baseBenifit)]
+    assert lines == grafic
+
+
+def test_engine_raises_like_handler(datafile, tmp_path, monkeypatch, setSettings):
+    # an ATR shorter than the channel has no value on the first days
+    params = {"DonchianN": 3, "ATRN": 2, "ADDTIME": 4}
+    with pytest.raises(ValueError):
+        runHandler("Turtle", params, datafile, tmp_path, monkeypatch, setSettings)
+    with pytest.raises(ValueError):
+        fastbacktest.runTurtle(fastbacktest.loadTicks(tickstore.openStore(datafile), START, END), params)
+
+
+def test_engine_dates(datafile):
+    result = fastbacktest.runMovingAverage(fastbacktest.loadTicks(tickstore.openStore(datafile), START, END))
+    assert result.dates[0] == START
+    assert result.dates[-1] == "2017-10-16"
+
+
+def test_rbreaker_batch_matches_single_runs(datafile):
+    ticks = fastbacktest.loadTicks(tickstore.openStore(datafile), START, END)
+    paramsList = [{"R_BREAKER_F1": f1, "R_BREAKER_F2": f2, "R_BREAKER_F3": f3, "ZHISHUN_PROZENT": stop}
+                  for f1 in (0.05, 0.1, 0.3) for f2 in (0.1, 0.5) for f3 in (0.01, 0.2) for stop in (0.01, 0.05)]
+    batch = fastbacktest.runRBreakerBatch(ticks, paramsList)
+    for k, params in enumerate(paramsList):
+        single = fastbacktest.runRBreaker(ticks, params)
+        assert tuple(batch[name][k] for name in FIGURES) == tuple(single[name] for name in FIGURES), params
+        assert np.array_equal(batch.equity[:, k], single.equity)
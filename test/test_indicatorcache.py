@@ -0,0 +1,63 @@
+"""The indicator cache: series of the whole store sliced per window, and its LRU"""
+import os
+import shutil
+import numpy as np
+import pytest
+from market_maker import fastbacktest, tickstore, indicatorcache
+
+WINDOWS = [("2017-09-25", "2017-10-10"), ("2017-09-28", "2017-10-17"), ("2017-10-02", "2017-10-17"),
+           ("2017-10-05", "2017-10-12")]
+
+
+@pytest.fixture
+def store(datafile, tmp_path):
+    filename = str(tmp_path / "data.csv")
+    shutil.copy(datafile, filename)
+    return tickstore.openStore(filename)
+
+
+def cachedTicks(cache, startdate, enddate):
+    ticks = fastbacktest.loadTicks(cache.store, startdate, enddate, copy = False)
+    cache.setWindow(startdate, enddate)
+    ticks.indicators = cache
+    return ticks
+
+
+@pytest.mark.parametrize("step", [0.5, 5.0, 200.0])
+@pytest.mark.parametrize("kind", ["quote", "price"])
+def test_windows_slice_the_series_of_the_store(store, step, kind):
+    cache = indicatorcache.IndicatorCache(store)
+    p = fastbacktest.getParams({"RESONABLE_PRICE_STEP": step, "RESONABLE_PRICE_GAP": 5.0})
+    for startdate, enddate in WINDOWS:
+        ticks = fastbacktest.loadTicks(store, startdate, enddate)
+        mid, accepted = fastbacktest.acceptedPrices(ticks, p, kind)
+        starts, newDay = fastbacktest.dayStarts(ticks)
+        cached = cachedTicks(cache, startdate, enddate)
+        assert np.array_equal(fastbacktest.acceptedPrices(cached, p, kind)[1], accepted)
+        assert np.array_equal(fastbacktest.dayHighLow(cached, p, kind, mid, accepted, starts, newDay),
+                              fastbacktest.dayHighLow(ticks, p, kind, mid, accepted, starts, newDay))
+    # the accepted ticks and the day extremes of the store, whatever the number of windows
+    assert len(os.listdir(indicatorcache.cachePath(store))) == 2
+
+
+@pytest.mark.parametrize("strategy, params", [("MovingAverage", {}), ("Turtle", {"DonchianN": 3, "ATRN": 3})])
+def test_runs_are_the_same_with_the_cache(store, strategy, params):
+    cache = indicatorcache.IndicatorCache(store)
+    engine = fastbacktest.ENGINES[strategy]
+    for startdate, enddate in WINDOWS[:2]:
+        plain = engine(fastbacktest.loadTicks(store, startdate, enddate), params)
+        for i in range(2):
+            cached = engine(cachedTicks(cache, startdate, enddate), params)
+            assert cached.equity == plain.equity and cached.totalprofit == plain.totalprofit
+
+
+def test_evict_keeps_the_series_used_last(store):
+    cache = indicatorcache.IndicatorCache(store, size = 2)
+    for n in range(4):
+        cache.get(("series", n), lambda: np.arange(n))
+        path = cache.path(("series", n))
+        os.utime(path, (n, n))
+    indicatorcache.IndicatorCache(store).get(("series", 0), lambda: None)
+    cache.evict()
+    assert sorted(os.listdir(indicatorcache.cachePath(store))) == sorted(
+        os.path.basename(cache.path(("series", n))) for n in (0, 3))
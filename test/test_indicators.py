@@ -0,0 +1,75 @@
+"""The incremental indicators against the deques and np.mean the handlers used before them"""
+import collections
+import numpy as np
+import pytest
+from market_maker import indicators
+
+
+def days(count, seed = 0):
+    """Highs and lows of random days, some with a range of 0 or above 1000 that calcATR() skips"""
+    rng = np.random.RandomState(seed)
+    lows = rng.uniform(3000, 6000, count)
+    ranges = rng.choice([0.0, 1500.0, 50.0, 200.0, 400.0], count) * rng.uniform(0.5, 1.0, count)
+    return (lows + ranges).tolist(), lows.tolist()
+
+
+def calcATR(highPriceQueue, lowPriceQueue, N):
+    """calcATR() of the handlers before indicators.py"""
+    TR_List = []
+    for i in range(0, N):
+        TR = highPriceQueue[i] - lowPriceQueue[i]
+        if TR > 0 and TR < 1000.0:
+            TR_List.append(TR)
+    # np.mean of nothing, without its warning
+    return np.array(TR_List).mean() if TR_List else float("nan")
+
+
+@pytest.mark.parametrize("window", [1, 3, 20])
+def test_moving_average_is_the_mean(window):
+    average = indicators.MovingAverage(window, 4000.0)
+    prices = collections.deque(window * [4000.0], window)
+    for price in days(500)[1]:
+        prices.append(price)
+        assert average.append(price) == pytest.approx(np.mean(prices), rel = 1e-13)
+    average.fill(5000.0)
+    assert average.value == 5000.0
+
+
+@pytest.mark.parametrize("window", [1, 4, 20])
+def test_donchian_channel_is_the_max_and_min(window):
+    channel = indicators.DonchianChannel(window)
+    highPriceQueue = collections.deque(window * [0], window)
+    lowPriceQueue = collections.deque(window * [0], window)
+    for high, low in zip(*days(300)):
+        channel.append(high, low)
+        highPriceQueue.append(high)
+        lowPriceQueue.append(low)
+        # getPreNMaxMinPrice() started from 0 and 10000
+        assert max(channel.upper, 0) == max(max(highPriceQueue), 0)
+        assert min(channel.lower, 10000) == min(min(lowPriceQueue), 10000)
+
+
+@pytest.mark.parametrize("N, length", [(5, 5), (3, 5), (1, 4), (20, 20), (20, 55)])
+def test_average_true_range_is_calcATR(N, length):
+    ATR = indicators.AverageTrueRange(N, length)
+    highPriceQueue = collections.deque(length * [0], length)
+    lowPriceQueue = collections.deque(length * [0], length)
+    for high, low in zip(*days(400)):
+        highPriceQueue.append(high)
+        lowPriceQueue.append(low)
+        expected = calcATR(highPriceQueue, lowPriceQueue, N)
+        value = ATR.append(high - low)
+        if np.isnan(expected):
+            assert np.isnan(value)
+        else:
+            assert value == pytest.approx(expected, rel = 1e-12)
+
+
+def test_wilder_starts_from_the_mean_and_smooths():
+    ATR = indicators.AverageTrueRange(2, 2, wilder = True)
+    assert np.isnan(ATR.append(0.0))
+    assert ATR.append(10.0) == 10.0
+    # the window holds 2 valid true ranges, their mean starts the smoothing
+    assert ATR.append(20.0) == 15.0
+    assert ATR.append(0.0) == 15.0
+    assert ATR.append(35.0) == 25.0
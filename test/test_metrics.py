@@ -0,0 +1,69 @@
+"""Figures of equity curves, worked out by hand"""
+import math
+import numpy as np
+import pytest
+from market_maker import metrics
+
+# wealth 1, .8, .9, .6, .7, 1.1: the fall to .6 is 40% of the start, the last point a new peak
+FALL = [0, -20, -10, -40, -30, 10]
+# wealth .5, .6, .4, .45: never back at the start, the fall counts from the peak of .6
+BELOW_START = [-50, -40, -60, -55]
+
+
+def test_max_drawdown():
+    assert metrics.maxDrawdown(FALL) == pytest.approx(0.4)
+    assert metrics.maxDrawdown(BELOW_START) == pytest.approx(0.2 / 0.6)
+    assert metrics.maxDrawdown([0, 10, 20]) == 0.0
+    assert metrics.maxDrawdown([]) == 0.0
+
+
+def test_drawdown_duration():
+    assert metrics.drawdownDuration(FALL) == 4
+    assert metrics.drawdownDuration(BELOW_START) == 2
+    assert metrics.drawdownDuration([0, 10, 20]) == 0
+
+
+@pytest.mark.parametrize("figure", [metrics.sharpe, metrics.sortino])
+def test_flat_curve_has_no_ratio(figure):
+    assert figure([5, 5, 5, 5]) == 0.0
+    assert figure([5]) == 0.0
+    assert figure([]) == 0.0
+
+
+def test_sharpe_and_sortino():
+    # returns -10% and 0: mean -5%, deviation 5%, downside deviation sqrt(1% / 2)
+    assert metrics.sharpe([0, -10, -10]) == pytest.approx(-math.sqrt(365))
+    assert metrics.sortino([0, -10, -10]) == pytest.approx(-0.05 / math.sqrt(0.005) * math.sqrt(365))
+    # returns 10% and 0: no losses, no downside risk
+    assert metrics.sharpe([0, 10, 10], periodsPerYear = 4) == pytest.approx(2.0)
+    assert metrics.sortino([0, 10, 10]) == 0.0
+    # every return 0.02 / 365 below a risk free rate of 2% is no variation
+    assert metrics.sharpe([5, 5, 5, 5], riskFree = 0.02) == 0.0
+
+
+def test_calmar():
+    assert metrics.calmar([0, 10, 20]) == math.inf
+    assert metrics.calmar([0, 0, 0]) == 0.0
+    # 10% in 2 points of a 2 point year over a 40% fall
+    assert metrics.calmar([0, -40, 10], periodsPerYear = 2) == pytest.approx(0.1 / 0.4)
+
+
+def test_excess_over_base():
+    equity = [1, 3, 2, 5]
+    base = [2, 2, 2, 2]
+    ahead, behind, winRatio, best, worst = metrics.excessOverBase(equity, base)
+    assert (ahead, behind, best, worst) == (2, 1, 3.0, 1.0)
+    assert winRatio == pytest.approx(200 / 3.0)
+    assert metrics.excessOverBase(base, base) == (0, 0, 0.0, 0.0, 0.0)
+
+
+def test_runs_in_columns_give_the_figures_of_single_curves():
+    curves = [FALL, [0, 10, 20, 20, 5, 5], [5] * 6]
+    base = [0, 1, 2, 3, 4, 5]
+    equity = np.array(curves, dtype = float).T
+    for name in ("maxDrawdown", "drawdownDuration", "sharpe", "sortino", "calmar"):
+        columns = getattr(metrics, name)(equity)
+        assert list(columns) == [getattr(metrics, name)(curve) for curve in curves]
+    columns = metrics.excessOverBase(equity, base)
+    for k, curve in enumerate(curves):
+        assert tuple(figure[k] for figure in columns) == metrics.excessOverBase(curve, base)
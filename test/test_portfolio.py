@@ -0,0 +1,29 @@
+"""The basket backtest against the backtest of one symbol"""
+import pytest
+from market_maker import market_maker, portfolio
+
+START = "2017-09-26"
+END = "2017-10-17"
+SYMBOLS = ["XBTUSD", "XBTZ17"]
+
+
+@pytest.fixture
+def backtest(datafile, tmp_path, monkeypatch, setSettings):
+    monkeypatch.chdir(tmp_path)
+    setSettings(IS_BACKTESTING = True, STRATEGY = "R_Breaker", BACKTESTFILE = datafile, START_DATE = START,
+                END_DATE = END, RESULTS_BINARY = False, RECORD_RESULTS = True)
+
+
+def test_every_symbol_runs_like_its_own_backtest(datafile, tmp_path, setSettings, backtest):
+    om = market_maker.OrderManager()
+    om.init()
+    om.run_backtesting()
+    assert om.numberPostiveTrade + om.numberNegativTrade > 0
+    setSettings(BACKTESTFILES = {symbol: datafile for symbol in SYMBOLS}, BACKTESTFILE = "missing.csv")
+    managers = portfolio.run_backtesting(SYMBOLS)
+    for symbol in SYMBOLS:
+        assert (managers[symbol].totalprofit, managers[symbol].finalUSDBenifit) == (om.totalprofit, om.finalUSDBenifit)
+    days = sorted(set(line[:10] for line in open(datafile) if START <= line[:10] < END))
+    lines = open(str(tmp_path / "portfolio.txt")).read().splitlines()
+    assert [line.split()[0] for line in lines] == days
+    assert float(lines[-1].split()[1]) == pytest.approx(om.finalUSDBenifit, abs = 0.01)
@@ -0,0 +1,167 @@
+"""The paged recorder against a fake BitMEX api"""
+import time
+import threading
+import numpy as np
+import pytest
+from market_maker import recorder, dataindex
+
+PERIOD = 60
+GAP_DAY = "2017-08-05" # BitMEX has no quotes of its 03:00 bucket
+
+
+class FakeApi:
+    """quote/bucketed and trade/bucketed like BitMEX: the buckets from startdate on, at most count"""
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _times(self, startdate, binSize, count):
+        start = np.datetime64(startdate + "T00:00:00")
+        return [str(start + np.timedelta64(binSize * k, "m")) + ".000Z" for k in range(min(count, 1000))]
+
+    def quoteBucketed(self, symbol, binSize, startdate, reverse = 'false', count = None):
+        with self.lock:
+            self.calls.append(("quote", symbol, startdate, count))
+        quotes = []
+        for timestamp in self._times(startdate, binSize, count):
+            if timestamp.startswith(GAP_DAY + "T03"):
+                continue
+            price = quotePrice(timestamp)
+            quotes.append(dict(timestamp = timestamp, bidSize = 10, bidPrice = price, askPrice = price + 0.5, askSize = 20))
+        return quotes
+
+    def tradeBucketed(self, symbol, binSize, startdate, count = None):
+        with self.lock:
+            self.calls.append(("trade", symbol, startdate, count))
+        return [dict(timestamp = timestamp, close = closePrice(timestamp[:10]))
+                for timestamp in self._times(startdate, binSize, count)]
+
+
+def quotePrice(timestamp):
+    return 2800 + int(timestamp[8:10]) * 10 + int(timestamp[11:13]) / 2.0
+
+
+def closePrice(date):
+    return 2700 + int(date[8:10])
+
+
+def expected(startdate, enddate):
+    """The lines of the days, one request a day like GetHisTradeDatas.run_loop()"""
+    api = FakeApi()
+    lines = []
+    for day in recorder.dayRange(startdate, enddate):
+        close = api.tradeBucketed("XBTUSD", 1440, day, count = 1)[0]["close"]
+        lines += ["%s %s %s %s %s %s\n" % (quote["timestamp"], quote["bidSize"], quote["bidPrice"], quote["askPrice"],
+                                           quote["askSize"], close)
+                  for quote in api.quoteBucketed("XBTUSD", PERIOD, day, count = 1440 // PERIOD)]
+    return lines
+
+
+@pytest.fixture
+def files(tmp_path, setSettings):
+    files = {"XBTUSD": str(tmp_path / "xbt.csv"), "ETHUSD": str(tmp_path / "eth.csv")}
+    setSettings(BACKTESTFILES = files, RECORD_BURST = 100)
+    return files
+
+
+def record(startdate, enddate, symbols = ("XBTUSD",)):
+    api = FakeApi()
+    recorder.PagedRecorder(api, list(symbols), period = PERIOD, pageCount = 100, threads = 3,
+                           requestsPerMinute = 60000).record(startdate, enddate)
+    return api
+
+
+def test_record_writes_the_lines_of_run_loop(files):
+    api = record("2017-08-01", "2017-08-20", ("XBTUSD", "ETHUSD"))
+    for filename in files.values():
+        assert open(filename).readlines() == expected("2017-08-01", "2017-08-20")
+        assert dataindex.isUpToDate(filename)
+        assert sorted(dataindex.loadIndex(filename)) == recorder.dayRange("2017-08-01", "2017-08-20")
+    # 4 days of 24 buckets a page, a quote and a trade request per page
+    assert len(api.calls) == 2 * 2 * 5
+
+
+def test_resume_fetches_only_the_new_days(files):
+    record("2017-08-01", "2017-08-10")
+    api = record("2017-08-01", "2017-08-15")
+    assert sorted(set(call[2] for call in api.calls)) == ["2017-08-10", "2017-08-14"]
+    assert open(files["XBTUSD"]).readlines() == expected("2017-08-01", "2017-08-15")
+
+
+def test_days_recorded_later_are_put_in_order(files):
+    record("2017-08-10", "2017-08-15")
+    record("2017-08-01", "2017-08-15")
+    assert open(files["XBTUSD"]).readlines() == expected("2017-08-01", "2017-08-15")
+    assert dataindex.isUpToDate(files["XBTUSD"])
+
+
+def test_short_day_is_settled_and_not_fetched_again(files):
+    record("2017-08-03", "2017-08-07")
+    dataFile = recorder.DataFile(files["XBTUSD"], 1440 // PERIOD)
+    assert dataFile.checkpoint["settled"] == [GAP_DAY]
+    assert dataFile.missing("2017-08-01", "2017-08-08") == ["2017-08-01", "2017-08-02", "2017-08-07"]
+    dataFile.close()
+
+
+def test_short_last_day_is_cut_off_and_fetched_again(files):
+    record("2017-08-01", "2017-08-04")
+    lines = open(files["XBTUSD"]).readlines()
+    with open(files["XBTUSD"], "w") as datafile:
+        datafile.write("".join(lines[:-5]))
+    dataFile = recorder.DataFile(files["XBTUSD"], 1440 // PERIOD)
+    assert dataFile.missing("2017-08-01", "2017-08-04") == ["2017-08-03"]
+    dataFile.close()
+    assert open(files["XBTUSD"]).readlines() == lines[:48]
+
+
+def test_crash_cuts_off_what_came_after_the_checkpoint(files):
+    record("2017-08-01", "2017-08-03")
+    lines = open(files["XBTUSD"]).readlines()
+    dataFile = recorder.DataFile(files["XBTUSD"], 1440 // PERIOD)
+    dataFile.append(expected("2017-08-03", "2017-08-04"), ["2017-08-03"])
+    # the next page was cut short by a crash, the run never closed the file
+    dataFile.file.write(b"".join(line.encode() for line in expected("2017-08-04", "2017-08-05")[:3]) + b"2017-08-04T03")
+    dataFile.file.close()
+    assert recorder.DataFile(files["XBTUSD"], 1440 // PERIOD).missing("2017-08-01", "2017-08-06") == \
+        ["2017-08-04", "2017-08-05"]
+    assert open(files["XBTUSD"]).readlines() == lines + expected("2017-08-03", "2017-08-04")
+
+
+def test_page_lines():
+    trades = [dict(timestamp = "2017-08-01T00:00:00.000Z", close = 1.0), dict(timestamp = "2017-08-03T00:00:00.000Z", close = 3.0)]
+    quotes = [dict(timestamp = "2017-08-0%dT00:00:00.000Z" % day, bidSize = 1, bidPrice = 2, askPrice = 3, askSize = 4)
+              for day in (1, 2, 3, 4)]
+    # the 2nd takes the bucket of the 3rd like tradeBucketed(symbol, 1440, day)[0], the 4th has none
+    assert recorder.pageLines(quotes, trades, ["2017-08-01", "2017-08-02", "2017-08-03", "2017-08-04"]) == [
+        "2017-08-01T00:00:00.000Z 1 2 3 4 1.0\n", "2017-08-02T00:00:00.000Z 1 2 3 4 3.0\n",
+        "2017-08-03T00:00:00.000Z 1 2 3 4 3.0\n"]
+    assert recorder.pageLines(quotes, trades, ["2017-08-03"]) == ["2017-08-03T00:00:00.000Z 1 2 3 4 3.0\n"]
+
+
+def test_pages_and_runs():
+    days = recorder.dayRange("2017-08-30", "2017-09-03")
+    assert days == ["2017-08-30", "2017-08-31", "2017-09-01", "2017-09-02"]
+    assert recorder.pages(days, 60, 50) == [days[:2], days[2:]]
+    assert recorder.runs(["2017-08-01", "2017-08-02", "2017-08-04"]) == [["2017-08-01", "2017-08-02"], ["2017-08-04"]]
+
+
+def test_token_bucket_paces_the_threads():
+    bucket = recorder.TokenBucket(100.0, 5)
+    started = time.monotonic()
+
+    def take():
+        for i in range(5):
+            bucket.take()
+    threads = [threading.Thread(target = take) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 5 tokens at once, the other 10 at 100 a second
+    assert time.monotonic() - started >= 0.09
+
+
+def test_symbols_need_their_own_files(setSettings):
+    setSettings(BACKTESTFILES = {}, BACKTESTFILE = "data.csv")
+    with pytest.raises(ValueError):
+        recorder.PagedRecorder(FakeApi(), ["XBTUSD", "ETHUSD"])
@@ -0,0 +1,38 @@
+"""The keys and the LRU of the result cache"""
+from market_maker import resultcache
+
+
+class Store:
+    meta = {"sourceSize": 1000, "sourceMtime": 1.5, "rows": 10}
+
+
+def key(params = None):
+    return resultcache.runKey(Store(), "Turtle", "2017-09-26", "2017-10-17", params or {"DonchianN": 3})
+
+
+def test_key_ignores_other_settings(setSettings):
+    before = key()
+    setSettings(EVENT_LEVEL = "DEBUG", PLOT_POINTS = 10, RECORD_THREADS = 7, API_KEY = "x", API_SECRET = "y",
+                AVERAGENUMPERIORD = 99, R_BREAKER_F1 = 0.9)
+    assert key() == before
+
+
+def test_key_follows_engine_settings_and_params(setSettings):
+    before = key()
+    assert key({"DonchianN": 4}) != before
+    assert key({"DonchianN": 3, "ADDTIME": 1}) != before
+    setSettings(START_BTCOIN = 7)
+    assert key() != before
+
+
+def test_lru(tmp_path):
+    cache = resultcache.ResultCache(str(tmp_path / "runs.sqlite"), size = 2)
+    for name in "abc":
+        cache.put(name, "Turtle", "data.csv", "2017-09-26", "2017-10-17", {"params": {}, "profit": name})
+    assert cache.get("a")["profit"] == "a"
+    cache.evict()
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a")["profit"] == "a"
+    assert cache.get("d") is None
+    cache.close()
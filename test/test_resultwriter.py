@@ -0,0 +1,81 @@
+"""Result files written and read back, binary and text"""
+import numpy as np
+import pytest
+from market_maker import resultwriter
+
+COLUMNS = resultwriter.GRAFIC2_COLUMNS
+
+
+def records(count):
+    return [(4000.0 + i * 0.25, i / 3.0, i - 7, 4100.5, -1.25 * i, "2017-10-%02dT00:00:00" % (i % 28 + 1), 100.0 + i)
+            for i in range(count)]
+
+
+def check(result, written):
+    assert len(result.price) == len(written)
+    for k, (name, dtype, fmt) in enumerate(COLUMNS):
+        expected = [fmt % record[k] for record in written]
+        assert [fmt % value for value in result[name].tolist()] == expected
+
+
+@pytest.mark.parametrize("binary", [True, False])
+@pytest.mark.parametrize("count", [0, 1, 9, 10, 25])
+def test_round_trip(tmp_path, binary, count):
+    filename = resultwriter.resultFile(str(tmp_path / "grafic2"), binary)
+    writer = resultwriter.ResultWriter(filename, COLUMNS, chunk = 10, enabled = True)
+    written = records(count)
+    for record in written[:count // 2]:
+        writer.append(*record)
+    rest = written[count // 2:]
+    writer.extend(*[np.array([record[k] for record in rest]) for k in range(len(COLUMNS))])
+    writer.close()
+    check(resultwriter.readResults(filename), written)
+
+
+@pytest.mark.parametrize("binary", [True, False])
+def test_append(tmp_path, binary):
+    filename = resultwriter.resultFile(str(tmp_path / "grafic2"), binary)
+    written = records(15)
+    for part in (written[:6], written[6:]):
+        writer = resultwriter.ResultWriter(filename, COLUMNS, append = True, chunk = 4, enabled = True)
+        for record in part:
+            writer.append(*record)
+        writer.close()
+    check(resultwriter.readResults(filename), written)
+
+
+def test_binary_keeps_the_binary_values(tmp_path):
+    filename = str(tmp_path / "grafic2.res")
+    writer = resultwriter.ResultWriter(filename, COLUMNS, enabled = True)
+    writer.append(1 / 3.0, 0.1, 2 ** 40, 0.0, -0.0, "t", 1e-300)
+    writer.close()
+    result = resultwriter.readResults(filename)
+    assert result.price[0] == 1 / 3.0 and result.position[0] == 2 ** 40 and result.USD[0] == 1e-300
+
+
+def test_binary_keeps_the_complete_chunks_of_a_cut_file(tmp_path):
+    filename = str(tmp_path / "grafic2.res")
+    writer = resultwriter.ResultWriter(filename, COLUMNS, chunk = 4, enabled = True)
+    written = records(10)
+    for record in written:
+        writer.append(*record)
+    writer.close()
+    data = open(filename, "rb").read()
+    with open(filename, "wb") as resultfile:
+        resultfile.write(data[:-20])
+    check(resultwriter.readResults(filename), written[:8])
+
+
+def test_appending_other_columns_fails(tmp_path):
+    filename = str(tmp_path / "grafic.res")
+    resultwriter.ResultWriter(filename, resultwriter.GRAFIC_COLUMNS, enabled = True).close()
+    with pytest.raises(ValueError):
+        resultwriter.ResultWriter(filename, COLUMNS, append = True, enabled = True)
+
+
+def test_disabled_writer_writes_nothing(tmp_path):
+    filename = tmp_path / "grafic2.res"
+    writer = resultwriter.ResultWriter(str(filename), COLUMNS, enabled = False)
+    writer.append(*records(1)[0])
+    writer.close()
+    assert not filename.exists()
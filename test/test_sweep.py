@@ -0,0 +1,85 @@
+"""Parameter sweeps and the early stop of runs in the search"""
+import numpy as np
+import pytest
+from market_maker import fastbacktest, tickstore, metrics, sweep
+
+START = "2017-09-26"
+END = "2017-10-17"
+CASES = [
+    ("MovingAverage", {}),
+    ("R_Breaker", {"R_BREAKER_F1": 0.05, "R_BREAKER_F2": 0.5, "R_BREAKER_F3": 0.01}),
+    ("Turtle", {"DonchianN": 4, "ATRN": 4, "ADDTIME": 2, "ZHIYINGUSD": 5}),
+]
+
+
+@pytest.fixture
+def ticks(datafile):
+    return fastbacktest.loadTicks(tickstore.openStore(datafile), START, END)
+
+
+@pytest.mark.parametrize("strategy, params", CASES)
+def test_engine_stops_on_the_day_the_drawdown_passes(strategy, params, ticks):
+    engine = fastbacktest.ENGINES[strategy]
+    full = engine(ticks, params)
+    assert not full.pruned and metrics.maxDrawdown(full.equity) > 0.03
+    stopped = engine(ticks, dict(params, STOP_DRAWDOWN = 0.03))
+    days = len(stopped.equity)
+    assert stopped.pruned and days < len(full.equity)
+    assert stopped.equity == full.equity[:days]
+    assert metrics.maxDrawdown(full.equity[:days - 1]) <= 0.03 < metrics.maxDrawdown(full.equity[:days])
+    assert engine(ticks, dict(params, STOP_DRAWDOWN = 0.5)).equity == full.equity
+
+
+def test_batch_stops_each_set_on_its_own(ticks):
+    # the sets lose between 5.07% and 5.21% at most
+    paramsList = [{"R_BREAKER_F1": f1, "R_BREAKER_F2": f2, "R_BREAKER_F3": f3, "STOP_DRAWDOWN": 0.051}
+                  for f1 in (0.05, 0.1, 0.3) for f2 in (0.1, 0.5) for f3 in (0.01, 0.2)]
+    batch = fastbacktest.runRBreakerBatch(ticks, paramsList)
+    assert batch.pruned.any() and not batch.pruned.all()
+    for k, params in enumerate(paramsList):
+        single = fastbacktest.runRBreaker(ticks, params)
+        assert batch.pruned[k] == single.pruned
+        days = len(single.equity)
+        assert np.array_equal(batch.equity[:days, k], single.equity)
+        if not single.pruned:
+            assert batch.finalUSDBenifit[k] == single.finalUSDBenifit
+
+
+def test_successive_halving_prunes_like_the_full_runs(datafile, setSettings):
+    setSettings(RESULT_CACHE = "", INDICATOR_CACHE = False)
+    grid = sweep.parameterGrid(R_BREAKER_F1 = [0.05, 0.1, 0.3], R_BREAKER_F2 = [0.1, 0.5], R_BREAKER_F3 = [0.01, 0.2])
+    full = sweep.sweep(grid, "R_Breaker", datafile, START, END, workers = 2)
+    kept = [r["params"] for r in sweep.rank(full) if not r["bankrupt"] and r["maxDrawdown"] <= 0.051]
+    assert 0 < len(kept) < len(grid)
+    alive = sweep.successiveHalving(grid, "R_Breaker", datafile, START, END, rungs = 1, maxDrawdown = 0.051, workers = 2)
+    assert [r["params"] for r in alive] == kept
+
+
+def test_rank_puts_the_smallest_drawdown_first():
+    results = [{"finalUSDBenifit": 5.0, "maxDrawdown": 0.2}, {"error": "ValueError"},
+               {"finalUSDBenifit": 1.0, "maxDrawdown": 0.05}, {"finalUSDBenifit": 3.0, "maxDrawdown": 0.1}]
+    assert [r["finalUSDBenifit"] for r in sweep.rank(results, "finalUSDBenifit")] == [5.0, 3.0, 1.0]
+    assert [r["finalUSDBenifit"] for r in sweep.rank(results, "maxDrawdown")] == [1.0, 3.0, 5.0]
+
+
+def test_rungs_only_run_longer_windows():
+    # 60 days: the first two rungs would both run the 30 days of minDays
+    assert sweep.rungEnds("2017-01-01", "2017-03-02") == ["2017-01-31", "2017-03-02"]
+    assert sweep.rungEnds("2017-01-01", "2017-09-28") == ["2017-01-31", "2017-04-01", "2017-09-28"]
+    assert sweep.rungEnds("2017-01-01", "2017-01-11") == ["2017-01-11"]
+    assert sweep.rungEnds("2017-01-01", "2017-03-02", rungs = 0) == ["2017-03-02"]
+
+
+def test_successive_halving_prunes_once_per_longer_window(datafile, setSettings, monkeypatch):
+    setSettings(RESULT_CACHE = "", INDICATOR_CACHE = False)
+    windows = []
+    fullSweep = sweep.sweep
+
+    def recorded(paramsList, strategy, datafilename, startdate, enddate, workers):
+        windows.append((len(paramsList), enddate))
+        return fullSweep(paramsList, strategy, datafilename, startdate, enddate, workers)
+    monkeypatch.setattr(sweep, "sweep", recorded)
+    grid = sweep.parameterGrid(R_BREAKER_F1 = [0.05, 0.1, 0.3], R_BREAKER_F2 = [0.1, 0.5], R_BREAKER_F3 = [0.01, 0.2])
+    sweep.successiveHalving(grid, "R_Breaker", datafile, START, END, rungs = 3, minDays = 10, workers = 2)
+    assert [enddate for count, enddate in windows] == ["2017-10-06", END]
+    assert windows[0][0] == len(grid) and windows[1][0] <= len(grid) // 3
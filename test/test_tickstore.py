@@ -0,0 +1,65 @@
+"""The compressed tick store: windows of its chunks, and the read benchmark"""
+import os
+import pytest
+from market_maker import tickstore, fastbacktest
+
+
+@pytest.fixture
+def chunked(datafile, tmp_path, setSettings):
+    setSettings(TICKSTORE_CHUNK_DAYS = 2, TICKSTORE_CHUNK_CACHE = 3)
+    return tickstore.convertFile(datafile, str(tmp_path / "store"), "zlib")
+
+
+def counted(store):
+    """store counting the chunks it decompresses"""
+    read = []
+    readChunk = store._readChunk
+
+    def counter(k):
+        read.append(k)
+        return readChunk(k)
+    store._readChunk = counter
+    return read
+
+
+def test_windows_match_the_plain_store(datafile, tmp_path, chunked):
+    plain = tickstore.convertFile(datafile, str(tmp_path / "plain"), "")
+    for startdate, enddate in [("2017-09-25", "2017-10-18"), ("2017-10-02", "2017-10-05"), ("2017-09-28", "2017-10-09")]:
+        ticks = fastbacktest.loadTicks(chunked, startdate, enddate)
+        expected = fastbacktest.loadTicks(plain, startdate, enddate)
+        assert ticks.first == expected.first
+        assert (ticks.timestamp == expected.timestamp).all() and (ticks.bidPrice == expected.bidPrice).all()
+
+
+def test_len_is_the_rows_of_the_window(chunked):
+    store = tickstore.loadStore(chunked.storename)
+    assert len(store) == 0
+    store.window("2017-10-02", "2017-10-05")
+    assert 0 < len(store) < store.meta["rows"]
+    assert len(store) == sum(store.chunks[k][2] for k in store.loaded)
+
+
+def test_decompressed_chunks_are_kept(chunked):
+    store = tickstore.loadStore(chunked.storename)
+    read = counted(store)
+    store.window("2017-10-02", "2017-10-05")
+    loaded = list(store.loaded)
+    assert sorted(read) == loaded
+    store.window("2017-10-03", "2017-10-06")
+    store.window("2017-10-02", "2017-10-05")
+    assert sorted(read) == sorted(set(read)) and set(loaded) <= set(store.cache)
+    executor = store.executor
+    # the least recently used go first, the window asked for stays even when it is over the limit
+    store.window("2017-09-25", "2017-10-18")
+    assert len(store.cache) == len(store.chunks) and store.executor is executor
+    store.window("2017-10-15", "2017-10-18")
+    assert list(store.cache)[-len(store.loaded):] == store.loaded and len(store.cache) == 3
+
+
+def test_benchmark(datafile):
+    result = tickstore.benchmark(datafile, "2017-10-02", "2017-10-09", ["", "zlib"], repeat = 1)
+    assert list(result) == ["text", "", "zlib"]
+    # the text file with its index
+    assert result["text"][0] > os.path.getsize(datafile) and result["zlib"][0] < result[""][0]
+    for size, cold, warm in result.values():
+        assert warm > 0 and (cold is None) == (not hasattr(os, "posix_fadvise"))
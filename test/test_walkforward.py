@@ -0,0 +1,28 @@
+"""Walk-forward windows and their shared indicators"""
+import os
+import shutil
+from market_maker import walkforward, tickstore, indicatorcache, sweep
+
+GRID = sweep.parameterGrid(DonchianN = [3, 4], ATRN = [4], ADDTIME = [1], ZHIYINGUSD = [2])
+
+
+def test_windows():
+    assert walkforward.windows("2017-09-25", "2017-10-17", 10, 5) == [
+        ("2017-09-25", "2017-10-05", "2017-10-10"), ("2017-09-30", "2017-10-10", "2017-10-15"),
+        ("2017-10-05", "2017-10-15", "2017-10-17")]
+
+
+def test_windows_share_the_indicators_of_the_file(datafile, tmp_path, setSettings):
+    filename = str(tmp_path / "data.csv")
+    shutil.copy(datafile, filename)
+    setSettings(RESULT_CACHE = "", INDICATOR_CACHE = False)
+    plain = walkforward.walkForward(GRID, "Turtle", filename, "2017-09-25", "2017-10-17", 10, 5, workers = 2)
+    setSettings(INDICATOR_CACHE = True)
+    cached = walkforward.walkForward(GRID, "Turtle", filename, "2017-09-25", "2017-10-17", 10, 5, workers = 2)
+    assert cached[1:] == plain[1:]
+    assert [window["outSample"]["finalUSDBenifit"] for window in cached[0]] == [
+        window["outSample"]["finalUSDBenifit"] for window in plain[0]]
+    # the accepted ticks and the day extremes once, an ATR and a Donchian channel per parameter set in each
+    # of the 3 in-sample windows and for the best one in each of the 3 out-of-sample windows
+    series = os.listdir(indicatorcache.cachePath(tickstore.openStore(filename)))
+    assert len(series) == 2 + 3 * 2 * len(GRID) + 3 * 2
@@ -0,0 +1,4 @@
+#!/usr/bin/env python
+
+from market_maker import walkforward
+walkforward.run()